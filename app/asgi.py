@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+# Settings leave out sync only middleware, see MIDDLEWARE
+os.environ.setdefault("DJANGO_ASGI", "1")
 
 application = get_asgi_application()
@@ -0,0 +1,152 @@
+import mimetypes
+import posixpath
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from service.storage import ContentAddressedStorage
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+STREAM_BLOCK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class FileRange:
+    """
+    The length bytes of an open file starting at start. Keeps fileno(),
+    so WSGI servers with a sendfile file_wrapper (gunicorn) still send it
+    zero-copy, bounded by Content-Length.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single "bytes=" range, end included, None when the
+    header is missing, malformed, inverted or asks for several ranges (the
+    whole file is sent then, RFC 9110 ignores invalid ranges) and False
+    when the range can't be satisfied.
+    """
+    match = RANGE_RE.match(header.replace(" ", ""))
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        suffix = int(last)
+        if not suffix or not size:
+            return False
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return False
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def if_range_passes(request, etag, last_modified):
+    """The representation If-Range was made for is still the current one"""
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', "W/")):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def serve_media(request, path):
+    """
+    Serves files of MEDIA_ROOT with conditional GETs (ETag, Last-Modified),
+    single byte ranges and, with MEDIA_OFFLOAD_HEADER set, hands the file
+    over to the front proxy. Content-addressed blobs never change, so they
+    are cached for a year with their SHA-256 as ETag.
+    """
+    path = posixpath.normpath(path).lstrip("/")
+    fullpath = Path(safe_join(settings.MEDIA_ROOT, path))
+    try:
+        stat = fullpath.stat()
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404(f"“{path}” does not exist")
+    if fullpath.is_dir():
+        raise Http404("Directory indexes are not allowed here.")
+
+    last_modified = int(stat.st_mtime)
+    headers = HttpResponse()
+    headers["Last-Modified"] = http_date(last_modified)
+    headers["Accept-Ranges"] = "bytes"
+    if ContentAddressedStorage.is_blob(path):
+        headers["ETag"] = f'"{ContentAddressedStorage.digest(path)}"'
+        headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    else:
+        headers["ETag"] = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+    response = get_conditional_response(
+        request, etag=headers["ETag"], last_modified=last_modified, response=headers
+    )
+    if response is not headers:
+        return response
+
+    content_type, encoding = mimetypes.guess_type(str(fullpath))
+    content_type = content_type or "application/octet-stream"
+
+    if settings.MEDIA_OFFLOAD_HEADER:
+        # The proxy sends the file, ranges included
+        response = HttpResponse(content_type=content_type)
+        if settings.MEDIA_OFFLOAD_HEADER.lower() == "x-accel-redirect":
+            target = settings.MEDIA_OFFLOAD_PREFIX.rstrip("/") + "/" + path
+        else:
+            target = str(fullpath)
+        response[settings.MEDIA_OFFLOAD_HEADER] = target
+    else:
+        byte_range = None
+        if request.method in ("GET", "HEAD") and "Range" in request.headers:
+            if if_range_passes(request, headers["ETag"], last_modified):
+                byte_range = parse_range(request.headers["Range"], stat.st_size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{stat.st_size}"
+        else:
+            file = fullpath.open("rb")
+            if byte_range is None:
+                response = FileResponse(file, content_type=content_type)
+            else:
+                start, end = byte_range
+                length = end - start + 1
+                response = FileResponse(
+                    FileRange(file, start, length), content_type=content_type
+                )
+                response.status_code = 206
+                response["Content-Length"] = length
+                response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            response.block_size = STREAM_BLOCK_SIZE
+            if encoding:
+                response["Content-Encoding"] = encoding
+
+    for header, value in headers.items():
+        if header != "Content-Type":
+            response[header] = value
+    return response
@@ -52,7 +52,6 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -61,6 +60,11 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# The toolbar middleware is sync only, under ASGI it would run every request,
+# async views included, on one thread, so app/asgi.py leaves it out
+if not os.environ.get("DJANGO_ASGI"):
+    MIDDLEWARE.insert(1, "debug_toolbar.middleware.DebugToolbarMiddleware")
+
 ROOT_URLCONF = "app.urls"
 
 TEMPLATES = [
@@ -143,6 +147,27 @@ MEDIA_URL = "/media/"
 
 MEDIA_ROOT = "/vol/web/media"
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# Directory of the caches shared by the workers of a host
+CACHE_DIR = os.environ.get("CACHE_DIR", "/tmp/airport-api-cache")
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Serialized flights and their versions, LRU evicted. The versions must be
+    # seen by every worker, so it can't be a per-process LocMemCache. Use a
+    # Redis or Memcached alias when workers run on several hosts.
+    "flights": {
+        "BACKEND": "service.cache_backends.FileBasedLRUCache",
+        "LOCATION": os.path.join(CACHE_DIR, "flights"),
+        "TIMEOUT": 60 * 60,
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -153,14 +178,20 @@ REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
     "PAGE_SIZE": 6,
+    # Counted in THROTTLE_CACHE (the database in development), so limits
+    # hold across workers
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "service.throttling.AnonSlidingWindowThrottle",
+        "service.throttling.UserSlidingWindowThrottle",
+        "service.throttling.ScopedSlidingWindowThrottle",
     ],
-    "DEFAULT_THROTTLE_RATES": {"anon": "100/day", "user": "1000/day"},
-    "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
-    ),
+    "DEFAULT_THROTTLE_RATES": {
+        "anon": "100/day",
+        "user": "1000/day",
+        "flights": "120/minute",
+        "orders": "10/minute",
+    },
+    "DEFAULT_AUTHENTICATION_CLASSES": ("user.authentication.CachedJWTAuthentication",),
     "DEFAULT_PERMISSION_CLASSES": [
         "service.permissions.IsAdminOrIfAuthenticatedReadOnly",
     ],
@@ -179,8 +210,97 @@ SPECTACULAR_SETTINGS = {
     },
 }
 
+# Connection search graph of upcoming flights kept by every worker: rebuilt
+# at least this often so departed flights drop out, and bounded to this many
+# partial itineraries explored per search
+CONNECTION_GRAPH_TTL = timedelta(minutes=10)
+CONNECTION_SEARCH_MAX_PATHS = 20_000
+
+# Nearest-airport index kept by every worker: rebuilt at least this often,
+# in case a change in another worker raced with its own update
+GEO_INDEX_TTL = timedelta(minutes=10)
+
+# How long selected seats stay reserved before the order is confirmed, and
+# how many seats of a flight a user may hold, holds being renewable
+SEAT_HOLD_TTL = timedelta(minutes=10)
+MAX_HOLDS_PER_USER = 10
+
+# Serves MEDIA_URL from Django, also needed behind a proxy using the offload
+# header. On unless the SERVE_MEDIA environment variable is "false" or "0"
+SERVE_MEDIA = os.environ.get("SERVE_MEDIA", "true").lower() not in ("false", "0")
+
+# Hands media files over to the front proxy instead of streaming them:
+# "X-Accel-Redirect" (nginx, internal location MEDIA_OFFLOAD_PREFIX) or
+# "X-Sendfile" (Apache, lighttpd). None streams them, zero-copy where the
+# WSGI server supports sendfile
+MEDIA_OFFLOAD_HEADER = None
+MEDIA_OFFLOAD_PREFIX = "/protected-media/"
+
+# Stores airport images once per content under their SHA-256
+CONTENT_ADDRESSED_MEDIA = True
+
+# Processes generating airport image renditions, 0 renders them in the request
+IMAGE_PIPELINE_WORKERS = 2
+
+# Memory-mapped reference data snapshot shared by the workers of a host,
+# rebuilt when reference data changes. Unset, names are joined from the database
+REFERENCE_SNAPSHOT_PATH = os.environ.get("REFERENCE_SNAPSHOT_PATH")
+
+# Reference data changes newer than this are not served yet, a transaction
+# still open longer than it can commit a change below a served version
+REFERENCE_CHANGE_LAG = timedelta(seconds=10)
+
+# How long reference data changes are kept for deltas by
+# purge_reference_changes, older client versions fetch the whole bundle
+REFERENCE_CHANGE_RETENTION = timedelta(days=30)
+
+# "memory" serves autocomplete from an in-process index, "database" queries
+# the pg_trgm indexes (or a name prefix on other databases)
+AUTOCOMPLETE_BACKEND = "memory"
+
+# How long a replayable response is kept for an Idempotency-Key
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),  # default 5 minutes
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),  # default 1 day
     "ROTATE_REFRESH_TOKENS": False,  # will return also new refresh token
+    "TOKEN_OBTAIN_SERIALIZER": "user.serializers.UserTokenObtainPairSerializer",
 }
+
+# How long authentication trusts the cached state of a user when the change
+# was made by another process, and how many users each process keeps
+AUTH_USER_CACHE_TTL = timedelta(seconds=30)
+AUTH_USER_CACHE_SIZE = 10_000
+
+# Cache alias for the throttle counters, ex. a Redis or Memcached one shared
+# by all workers. Required in production, the "service.E001" check fails
+# without it.
+THROTTLE_CACHE = os.environ.get("THROTTLE_CACHE")
+
+# Without THROTTLE_CACHE, keep the throttle counters in the ThrottleBucket
+# table instead: a write per request, for development and tests only
+THROTTLE_DATABASE_FALLBACK = DEBUG
+
+# Threads hashing passwords for the login and register views, and how many
+# of those requests may be pending before they are answered with 503
+LOGIN_WORKERS = 4
+LOGIN_MAX_PENDING = 64
+
+# The first hasher hashes new passwords. Logins with a hash of another one, or
+# with fewer iterations, are rehashed with it in the login pool.
+PASSWORD_HASHERS = [
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+]
+
+# Processes hashing passwords of imported users, 0 hashes them inline
+USER_IMPORT_WORKERS = 2
+
+# Threads importing the users files uploaded to POST /api/user/import/,
+# 0 imports them in the request
+USER_IMPORT_THREADS = 1
+
+# Largest users file POST /api/user/import/ accepts, bigger ones are
+# imported with the import_users command
+USER_IMPORT_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
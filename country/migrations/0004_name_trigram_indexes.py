@@ -0,0 +1,38 @@
+# Generated by Django 4.2.4 on 2026-10-17 12:10
+
+from django.db import migrations
+
+TRIGRAM_INDEXES = (
+    ("country_city_name_trgm", "country_city"),
+    ("country_country_name_trgm", "country_country"),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """Indexes names for the database autocomplete backend, PostgreSQL only"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for index, table in TRIGRAM_INDEXES:
+        # Created by service 0009 on databases migrated before this one
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {index} ON {table} "
+            f"USING gin (name gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for index, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("country", "0003_city_coordinates"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -1,15 +1,17 @@
 from rest_framework import serializers
 
 from country.models import City, Country
+from service.snapshot import SnapshotNamesMixin
+from service.sparse import SparseFieldsetMixin
 
 
-class CitySerializer(serializers.ModelSerializer):
+class CitySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = City
-        fields = ("id", "name", "country", "airports")
+        fields = ("id", "name", "country", "latitude", "longitude", "airports")
 
 
-class CityListRetrieveSerializer(CitySerializer):
+class CityListRetrieveSerializer(SnapshotNamesMixin, CitySerializer):
     country = serializers.SlugRelatedField(
         many=False, read_only=True, slug_field="name"
     )
@@ -17,26 +19,36 @@ class CityListRetrieveSerializer(CitySerializer):
         many=True, read_only=True, slug_field="name"
     )
 
+    class Meta(CitySerializer.Meta):
+        expandable_fields = {
+            "country": "country.serializers.CountrySerializer",
+            "airports": "service.serializers.AirportSerializer",
+        }
+        snapshot_names = {"country": "countries", "airports": "city_airports"}
 
-class CityDetailSerializer(CitySerializer):
+
+class CityDetailSerializer(SnapshotNamesMixin, CitySerializer):
     country = serializers.SlugRelatedField(
         many=False, read_only=True, slug_field="name"
     )
 
     class Meta:
         model = City
-        fields = ("id", "name", "country")
+        fields = ("id", "name", "country", "latitude", "longitude")
+        snapshot_names = {"country": "countries"}
 
 
-class CountrySerializer(serializers.ModelSerializer):
+class CountrySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Country
         fields = ("id", "name")
 
 
-class CountryListRetrieveSerializer(CountrySerializer):
+class CountryListRetrieveSerializer(SnapshotNamesMixin, CountrySerializer):
     cities = serializers.SlugRelatedField(many=True, read_only=True, slug_field="name")
 
     class Meta:
         model = Country
         fields = ("id", "name", "cities")
+        expandable_fields = {"cities": CityDetailSerializer}
+        snapshot_names = {"cities": "country_cities"}
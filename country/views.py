@@ -1,3 +1,4 @@
+from drf_spectacular.utils import extend_schema, extend_schema_view
 from rest_framework import viewsets, mixins
 from rest_framework.permissions import IsAdminUser
 
@@ -8,9 +9,15 @@ from country.serializers import (
     CityListRetrieveSerializer,
     CountryListRetrieveSerializer,
 )
+from service.sparse import SPARSE_FIELDSET_PARAMETERS, SparseFieldsetViewMixin
 
 
+@extend_schema_view(
+    list=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS),
+    retrieve=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS),
+)
 class CountryViewSet(
+    SparseFieldsetViewMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
@@ -21,26 +28,25 @@ class CountryViewSet(
     serializer_class = CountrySerializer
     permission_classes = (IsAdminUser,)
 
-    def get_queryset(self):
-        queryset = self.queryset
-        if self.action in ("list", "retrieve"):
-            queryset = queryset.prefetch_related("cities")
-        return queryset
-
     def get_serializer_class(self):
         if self.action in ("list", "retrieve"):
             return CountryListRetrieveSerializer
         return CountrySerializer
 
 
+@extend_schema_view(
+    list=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS),
+    retrieve=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS),
+)
 class CityViewSet(
+    SparseFieldsetViewMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
     viewsets.GenericViewSet,
 ):
-    queryset = City.objects.all().select_related("country").prefetch_related("airports")
+    queryset = City.objects.all()
     serializer_class = CitySerializer
 
     def get_serializer_class(self):
@@ -10,6 +10,7 @@ from service.models import (
     Route,
     Airport,
     Crew,
+    SeatHold,
 )
 
 
@@ -30,3 +31,4 @@ admin.site.register(AirplaneType)
 admin.site.register(Route)
 admin.site.register(Airport)
 admin.site.register(Crew)
+admin.site.register(SeatHold)
@@ -0,0 +1,211 @@
+import bisect
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict, namedtuple
+from itertools import chain
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, Value
+
+from country.models import City, Country
+from service.cache import SharedVersion
+from service.models import Airport
+
+Entry = namedtuple("Entry", ["kind", "id", "name", "city", "country"])
+
+KIND_RANK = {"airport": 0, "city": 1, "country": 2}
+# Match ranks: exact name, name prefix, word prefix, fuzzy
+EXACT, PREFIX, WORD_PREFIX, FUZZY = range(4)
+
+
+def normalize(text):
+    """Casefolds, strips accents and collapses punctuation into spaces"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(re.split(r"[\W_]+", text.casefold())).strip()
+
+
+def trigrams(text):
+    """Trigrams of every word padded like pg_trgm does"""
+    return {
+        padded[i : i + 3]
+        for padded in (f"  {word} " for word in text.split())
+        for i in range(len(padded) - 2)
+    }
+
+
+class AutocompleteIndex:
+    """
+    Sorted array of normalized names and of their word suffixes
+    ("john f kennedy", "f kennedy", "kennedy"), searched with bisect,
+    plus a trigram inverted index for fuzzy matches.
+    """
+
+    max_candidates = 500
+    min_similarity = 0.5
+
+    def __init__(self, entries, version=None):
+        self.version = version
+        self.entries = list(entries)
+        keys = []
+        self._trigrams = defaultdict(list)
+        for position, entry in enumerate(self.entries):
+            name = normalize(entry.name)
+            words = name.split()
+            for word_index in range(len(words)):
+                keys.append((" ".join(words[word_index:]), word_index, position))
+            for trigram in trigrams(name):
+                self._trigrams[trigram].append(position)
+        keys.sort()
+        self._keys = [key for key, _, _ in keys]
+        self._postings = [(word_index, position) for _, word_index, position in keys]
+
+    @classmethod
+    def build(cls, version=None):
+        airports = Airport.objects.order_by().values_list(
+            "id", "name", "closest_big_city__name", "closest_big_city__country__name"
+        )
+        cities = City.objects.order_by().values_list("id", "name", "country__name")
+        countries = Country.objects.order_by().values_list("id", "name")
+        return cls(
+            chain(
+                (Entry("airport", *row) for row in airports.iterator()),
+                (
+                    Entry("city", id_, name, name, country)
+                    for id_, name, country in cities
+                ),
+                (Entry("country", id_, name, None, name) for id_, name in countries),
+            ),
+            version,
+        )
+
+    def prefix_matches(self, query):
+        """Maps entry positions to their best match rank for the query prefix"""
+        lo = bisect.bisect_left(self._keys, query)
+        hi = bisect.bisect_left(self._keys, query + "\U0010ffff", lo)
+        hi = min(hi, lo + self.max_candidates)
+        matches = {}
+        for key, (word_index, position) in zip(
+            self._keys[lo:hi], self._postings[lo:hi]
+        ):
+            if word_index:
+                rank = WORD_PREFIX
+            else:
+                rank = EXACT if key == query else PREFIX
+            matches[position] = min(rank, matches.get(position, rank))
+        return matches
+
+    def fuzzy_matches(self, query):
+        """
+        Maps entry positions to the share of query trigrams found in their
+        names, so typos and infixes of long names still match.
+        """
+        query_trigrams = trigrams(query)
+        shared = Counter(
+            position
+            for trigram in query_trigrams
+            for position in self._trigrams.get(trigram, ())
+        )
+        return {
+            position: count / len(query_trigrams)
+            for position, count in shared.items()
+            if count / len(query_trigrams) >= self.min_similarity
+        }
+
+    def search(self, query, limit=10):
+        query = normalize(query)
+        if not query:
+            return []
+        matches = {
+            position: (rank, 0) for position, rank in self.prefix_matches(query).items()
+        }
+        if len(matches) < limit and len(query) >= 3:
+            for position, similarity in self.fuzzy_matches(query).items():
+                matches.setdefault(position, (FUZZY, -similarity))
+
+        def sort_key(position):
+            rank, score = matches[position]
+            entry = self.entries[position]
+            return rank, score, KIND_RANK[entry.kind], len(entry.name), entry.name
+
+        return [
+            self.entries[position]._asdict()
+            for position in sorted(matches, key=sort_key)[:limit]
+        ]
+
+
+index_version = SharedVersion("autocomplete-index")
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Returns the process-wide index, rebuilt when any worker changed names
+    since it was built
+    """
+    global _index
+    # Read before building, a change committed meanwhile bumps it again
+    version = index_version.get()
+    index = _index
+    if index is None or index.version != version:
+        with _index_lock:
+            index = _index
+            if index is None or index.version != version:
+                index = _index = AutocompleteIndex.build(version)
+    return index
+
+
+def invalidate_index():
+    index_version.bump()
+
+
+def database_autocomplete(query, limit=10):
+    """
+    Matches names in the database: with the pg_trgm indexes on PostgreSQL,
+    with a case-insensitive prefix elsewhere.
+    """
+    sources = (
+        (
+            "airport",
+            Airport.objects.all(),
+            "closest_big_city__name",
+            "closest_big_city__country__name",
+        ),
+        ("city", City.objects.all(), "name", "country__name"),
+        ("country", Country.objects.all(), None, "name"),
+    )
+    scored = []
+    for kind, queryset, city, country in sources:
+        if connection.vendor == "postgresql":
+            from django.contrib.postgres.lookups import TrigramWordSimilar
+            from django.contrib.postgres.search import TrigramWordSimilarity
+
+            queryset = (
+                queryset.filter(TrigramWordSimilar(F("name"), query))
+                .annotate(score=TrigramWordSimilarity(query, "name"))
+                .order_by("-score")
+            )
+        else:
+            queryset = (
+                queryset.filter(name__istartswith=query)
+                .annotate(score=Value(1.0))
+                .order_by("name")
+            )
+        rows = queryset.values_list("id", "name", city or "name", country, "score")
+        for id_, name, city_name, country_name, score in rows[:limit]:
+            entry = Entry(kind, id_, name, city_name if city else None, country_name)
+            scored.append((-score, KIND_RANK[kind], len(name), entry))
+
+    scored.sort(key=lambda row: row[:3])
+    return [entry._asdict() for *_, entry in scored[:limit]]
+
+
+def autocomplete(query, limit=10):
+    """Ranked airports, cities and countries whose names match the query"""
+    if settings.AUTOCOMPLETE_BACKEND == "database":
+        return database_autocomplete(query, limit)
+    return get_index().search(query, limit)
@@ -0,0 +1,142 @@
+import logging
+import random
+import time
+from collections import defaultdict
+
+from django.db import transaction, IntegrityError, OperationalError
+from rest_framework.exceptions import ValidationError
+
+from service.exceptions import BookingConflict, SeatsTaken, SeatsUnavailable
+from service.holds import sweep_expired_holds, active_holds, release_holds
+from service.inventory import lock_flights, save_seat_map
+from service.models import Ticket, Order
+
+logger = logging.getLogger(__name__)
+
+# SQLSTATE of serialization failures and deadlocks in PostgreSQL
+RETRYABLE_PGCODES = {"40001", "40P01"}
+UNIQUE_VIOLATION = "23505"
+FOREIGN_KEY_VIOLATION = "23503"
+
+
+class BookingEngine:
+    """
+    Books the tickets of an order: locks their flights in id order, checks
+    the seats against the locked seat maps and holds of other users,
+    assigns seats to seat requests and inserts all tickets at once.
+    Serialization failures, deadlocks and seats taken by writers that don't
+    lock the flight are retried with jittered backoff, then answered with a
+    409 like other conflicts. Other integrity errors aren't retried.
+    """
+
+    max_attempts = 4
+    backoff = 0.05
+
+    def book(self, order_data, tickets_data, seat_requests=()):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return self._book(order_data, tickets_data, seat_requests)
+            except (OperationalError, IntegrityError) as error:
+                if not self.is_retryable(error):
+                    if isinstance(error, IntegrityError):
+                        raise self.integrity_error_response(error) from error
+                    raise
+                if attempt == self.max_attempts:
+                    raise BookingConflict() from error
+                delay = self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                logger.info("Booking attempt %s failed (%s), retrying", attempt, error)
+                time.sleep(delay)
+
+    @staticmethod
+    def is_retryable(error):
+        pgcode = getattr(error.__cause__, "pgcode", None)
+        if isinstance(error, IntegrityError):
+            # A seat was taken by a writer that doesn't lock the flight
+            if pgcode is not None:
+                return (
+                    pgcode == UNIQUE_VIOLATION
+                    and error.__cause__.diag.table_name == Ticket._meta.db_table
+                )
+            # SQLite names the columns of the violated constraint
+            return f"UNIQUE constraint failed: {Ticket._meta.db_table}." in str(error)
+        return pgcode in RETRYABLE_PGCODES or "locked" in str(error)
+
+    @staticmethod
+    def integrity_error_response(error):
+        """409 if a row the order references is gone meanwhile, 400 otherwise"""
+        pgcode = getattr(error.__cause__, "pgcode", None)
+        if pgcode == FOREIGN_KEY_VIOLATION or "FOREIGN KEY" in str(error):
+            return BookingConflict()
+        return ValidationError({"non_field_errors": ["The order can't be saved."]})
+
+    @transaction.atomic
+    def _book(self, order_data, tickets_data, seat_requests=()):
+        seats_by_flight = defaultdict(list)
+        for ticket_data in tickets_data:
+            seats_by_flight[ticket_data["flight"].id].append(
+                (ticket_data["row"], ticket_data["seat"])
+            )
+        flight_ids = set(seats_by_flight)
+        flight_ids.update(seat_request["flight"].id for seat_request in seat_requests)
+
+        flights = lock_flights(flight_ids)
+        seat_maps = {flight.id: flight.get_seat_map() for flight in flights}
+        locked_ids = [flight.id for flight in flights]
+        sweep_expired_holds(locked_ids)
+        holds = active_holds(locked_ids)
+        user_id = order_data["user"].id
+
+        def unavailable(flight_id, row, seat):
+            if flight_id not in seat_maps or seat_maps[flight_id].is_taken(row, seat):
+                return True
+            hold = holds.get((flight_id, row, seat))
+            return hold is not None and hold.user_id != user_id
+
+        taken_seats = [
+            {"flight": flight_id, "row": row, "seat": seat}
+            for flight_id, seats in seats_by_flight.items()
+            for row, seat in seats
+            if unavailable(flight_id, row, seat)
+        ]
+        if taken_seats:
+            raise SeatsTaken(taken_seats)
+
+        tickets_data = list(tickets_data)
+        for seat_request in seat_requests:
+            flight = seat_request["flight"]
+            blocked = set(seats_by_flight[flight.id])
+            blocked.update(
+                (row, seat)
+                for (flight_id, row, seat), hold in holds.items()
+                if flight_id == flight.id and hold.user_id != user_id
+            )
+            seats = seat_maps[flight.id].find_seats(
+                seat_request["count"], seat_request["placement"], blocked
+            )
+            if seats is None:
+                raise SeatsUnavailable(
+                    flight.id, seat_request["count"], seat_request["placement"]
+                )
+            seats_by_flight[flight.id].extend(seats)
+            tickets_data.extend(
+                {"flight": flight, "row": row, "seat": seat} for row, seat in seats
+            )
+
+        order = Order.objects.create(**order_data)
+        Ticket.objects.bulk_create(
+            [Ticket(order=order, **ticket_data) for ticket_data in tickets_data]
+        )
+        for flight_id, seats in seats_by_flight.items():
+            seat_map = seat_maps[flight_id]
+            for row, seat in seats:
+                seat_map.take(row, seat)
+            save_seat_map(flight_id, seat_map, len(seats))
+
+        # The user's holds on the booked seats turn into tickets
+        release_holds(
+            (holds[(flight_id, row, seat)].id, flight_id)
+            for flight_id, seats in seats_by_flight.items()
+            for row, seat in seats
+            if (flight_id, row, seat) in holds
+        )
+        return order
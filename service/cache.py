@@ -0,0 +1,157 @@
+import threading
+import uuid
+from datetime import datetime
+
+from django.core.cache import caches
+from django.db import transaction
+
+FLIGHT_CACHE_ALIAS = "flights"
+
+
+class FlightCache:
+    """
+    Cache of serialized flights keyed by flight id and a version.
+    Entries are never deleted, bumping a version makes them unreachable
+    and the backend evicts them as least recently used. The versions are
+    stored in the same backend, which all workers must share.
+    """
+
+    GLOBAL = "all"
+
+    def __init__(self, alias=FLIGHT_CACHE_ALIAS):
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def _version_key(name):
+        return f"flight-version:{name}"
+
+    @staticmethod
+    def _new_version():
+        # Unique rather than incremented, so an evicted version can't make
+        # entries of an older generation reachable again and two workers
+        # bumping at once can't end on the same value
+        return uuid.uuid4().hex
+
+    def _versions(self, names):
+        keys = {name: self._version_key(name) for name in names}
+        stored = self.backend.get_many(keys.values())
+        versions = {}
+        for name, key in keys.items():
+            if key not in stored:
+                self.backend.add(key, self._new_version(), timeout=None)
+                stored[key] = self.backend.get(key)
+            versions[name] = stored[key]
+        return versions
+
+    def _keys(self, flight_ids, kind):
+        versions = self._versions([self.GLOBAL, *flight_ids])
+        return {
+            flight_id: f"flight:{kind}:{flight_id}:"
+            f"{versions[self.GLOBAL]}:{versions[flight_id]}"
+            for flight_id in flight_ids
+        }
+
+    def get_many(self, flight_ids, kind):
+        """Returns cached data of the given flights as {flight_id: data}"""
+        keys = self._keys(flight_ids, kind)
+        stored = self.backend.get_many(keys.values())
+        found = {
+            flight_id: stored[key] for flight_id, key in keys.items() if key in stored
+        }
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, data_by_flight_id, kind, expire_at=None):
+        """
+        Caches {flight_id: data}. expire_at maps flight ids to when their
+        data goes stale without any write, ex. when a seat hold expires.
+        """
+        keys = self._keys(list(data_by_flight_id), kind)
+        expire_at = {
+            flight_id: moment
+            for flight_id, moment in (expire_at or {}).items()
+            if moment is not None
+        }
+        self.backend.set_many(
+            {
+                keys[flight_id]: data
+                for flight_id, data in data_by_flight_id.items()
+                if flight_id not in expire_at
+            }
+        )
+        now = datetime.now()
+        for flight_id, moment in expire_at.items():
+            timeout = max((moment - now).total_seconds(), 0)
+            self.backend.set(keys[flight_id], data_by_flight_id[flight_id], timeout)
+
+    def _bump(self, name):
+        self.backend.set(self._version_key(name), self._new_version(), timeout=None)
+
+    def bump_flight(self, flight_id):
+        self._bump(flight_id)
+
+    def bump_all(self):
+        self._bump(self.GLOBAL)
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / lookups if lookups else None,
+        }
+
+
+flight_cache = FlightCache()
+
+
+class SharedVersion:
+    """
+    Version of data every worker keeps its own copy of, ex. an in-memory
+    index. Stored in the shared flights cache, so a bump in one worker
+    makes the copies of all of them stale.
+    """
+
+    def __init__(self, name, alias=FLIGHT_CACHE_ALIAS):
+        self.key = f"version:{name}"
+        self.alias = alias
+
+    def get(self):
+        backend = caches[self.alias]
+        version = backend.get(self.key)
+        if version is None:
+            backend.add(self.key, uuid.uuid4().hex, timeout=None)
+            version = backend.get(self.key)
+        return version
+
+    def bump(self):
+        """Makes every copy stale, returns the new version"""
+        version = uuid.uuid4().hex
+        caches[self.alias].set(self.key, version, timeout=None)
+        return version
+
+
+def invalidate_flight(flight_id):
+    """
+    Bumps the flight version now and once more on commit, so a concurrent
+    request can't cache the data it read before the change was committed
+    """
+    flight_cache.bump_flight(flight_id)
+    transaction.on_commit(lambda: flight_cache.bump_flight(flight_id))
+
+
+def invalidate_all_flights():
+    flight_cache.bump_all()
+    transaction.on_commit(flight_cache.bump_all)
@@ -0,0 +1,41 @@
+import os
+
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+class FileBasedLRUCache(FileBasedCache):
+    """
+    File based cache that evicts the least recently used entries
+    instead of a random sample once MAX_ENTRIES is reached.
+    The mtime of a cache file is its last access time.
+    """
+
+    _missing = object()
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, self._missing, version)
+        if value is self._missing:
+            return default
+        try:
+            os.utime(self._key_to_file(key, version))
+        except FileNotFoundError:
+            pass
+        return value
+
+    def _cull(self):
+        filelist = self._list_cache_files()
+        num_entries = len(filelist)
+        if num_entries < self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            return self.clear()
+
+        def last_access(fname):
+            try:
+                return os.path.getmtime(fname)
+            except FileNotFoundError:
+                return 0
+
+        filelist.sort(key=last_access)
+        for fname in filelist[: int(num_entries / self._cull_frequency)]:
+            self._delete(fname)
@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+@register()
+def throttle_cache_check(app_configs, **kwargs):
+    """Throttle counters in the database are for development and tests only"""
+    if settings.THROTTLE_CACHE or settings.THROTTLE_DATABASE_FALLBACK:
+        return []
+    return [
+        Error(
+            "THROTTLE_CACHE is not set.",
+            hint="Set it to a cache alias shared by all workers, ex. Redis.",
+            id="service.E001",
+        )
+    ]
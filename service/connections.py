@@ -0,0 +1,218 @@
+import bisect
+import heapq
+import threading
+import time
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+from itertools import count, islice
+from operator import attrgetter
+
+from django.conf import settings
+from service.cache import SharedVersion
+from service.holds import with_live_holds
+from service.models import Flight
+
+Leg = namedtuple(
+    "Leg",
+    [
+        "flight_id",
+        "source_id",
+        "source",
+        "destination_id",
+        "destination",
+        "departure_time",
+        "arrival_time",
+        "distance",
+    ],
+)
+
+
+class ConnectionGraph:
+    """
+    Airport graph whose edges are upcoming flights, sorted by departure per
+    airport. version is the graph_version it was built at.
+    """
+
+    def __init__(self, legs, version=None):
+        self.version = version
+        self.built_at = time.monotonic()
+        self._legs = defaultdict(list)
+        self._departure_times = defaultdict(list)
+        for leg in sorted(legs, key=attrgetter("departure_time")):
+            self._legs[leg.source_id].append(leg)
+            self._departure_times[leg.source_id].append(leg.departure_time)
+
+    @classmethod
+    def build(cls, version=None):
+        rows = (
+            Flight.objects.filter(
+                route__source__isnull=False,
+                route__destination__isnull=False,
+                departure_time__gte=datetime.now(),
+            )
+            .order_by()
+            .values_list(
+                "id",
+                "route__source_id",
+                "route__source__name",
+                "route__destination_id",
+                "route__destination__name",
+                "departure_time",
+                "arrival_time",
+                "route__distance",
+            )
+        )
+        return cls((Leg(*row) for row in rows.iterator()), version)
+
+    def is_current(self, version):
+        """Not changed since, and young enough that departed flights are few"""
+        age = time.monotonic() - self.built_at
+        return (
+            version == self.version
+            and age < settings.CONNECTION_GRAPH_TTL.total_seconds()
+        )
+
+    def departures(self, airport_id, start, end):
+        """Flights leaving airport_id in [start, end)"""
+        times = self._departure_times.get(airport_id, [])
+        lo = bisect.bisect_left(times, start)
+        hi = bisect.bisect_left(times, end, lo)
+        return self._legs[airport_id][lo:hi]
+
+    def itineraries(
+        self,
+        source_id,
+        destination_id,
+        departure_from,
+        departure_to,
+        max_legs=2,
+        min_connection=timedelta(minutes=60),
+        max_connection=timedelta(hours=24),
+        max_paths=None,
+    ):
+        """
+        Yields leg paths to the destination that never revisit an airport,
+        best first by _itinerary_rank. Extending a path never ranks it
+        higher, so the paths are explored best first as well, and at most
+        max_paths (CONNECTION_SEARCH_MAX_PATHS) of them.
+        """
+        budget = max_paths or settings.CONNECTION_SEARCH_MAX_PATHS
+        # The counter breaks ties, paths themselves aren't compared
+        tiebreak = count()
+        heap = []
+
+        def push(path):
+            nonlocal budget
+            if not budget:
+                return False
+            budget -= 1
+            heapq.heappush(heap, (_itinerary_rank(path), next(tiebreak), path))
+            return True
+
+        for leg in self.departures(source_id, departure_from, departure_to):
+            if not push((leg,)):
+                break
+        while heap:
+            _, _, path = heapq.heappop(heap)
+            last = path[-1]
+            if last.destination_id == destination_id:
+                yield path
+                continue
+            if len(path) == max_legs:
+                continue
+            visited = {source_id, *(leg.destination_id for leg in path)}
+            for leg in self.departures(
+                last.destination_id,
+                last.arrival_time + min_connection,
+                last.arrival_time + max_connection,
+            ):
+                if leg.destination_id not in visited and not push(path + (leg,)):
+                    break
+
+
+def _itinerary_rank(path):
+    return (
+        path[-1].arrival_time - path[0].departure_time,
+        len(path),
+        sum(leg.distance for leg in path),
+    )
+
+
+graph_version = SharedVersion("connection-graph")
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def get_graph():
+    """
+    Returns the process-wide graph, rebuilt when any worker changed routes
+    or flights since, or after CONNECTION_GRAPH_TTL
+    """
+    global _graph
+    # Read before building, a change committed meanwhile bumps it again
+    version = graph_version.get()
+    graph = _graph
+    if graph is None or not graph.is_current(version):
+        with _graph_lock:
+            graph = _graph
+            if graph is None or not graph.is_current(version):
+                graph = _graph = ConnectionGraph.build(version)
+    return graph
+
+
+def invalidate_graph():
+    graph_version.bump()
+
+
+def search_connections(
+    source_id,
+    destination_id,
+    departure_from,
+    departure_to,
+    max_legs=2,
+    min_connection=timedelta(minutes=60),
+    seats=1,
+    limit=10,
+):
+    """
+    Ranks itineraries by total travel time, number of legs and distance.
+    Candidates are taken best first, 2 * limit at a time, with the seat
+    availability of their flights loaded by one query per round.
+    """
+    candidates = get_graph().itineraries(
+        source_id,
+        destination_id,
+        departure_from,
+        departure_to,
+        max_legs=max_legs,
+        min_connection=min_connection,
+    )
+    results = []
+    while len(results) < limit:
+        paths = list(islice(candidates, 2 * limit))
+        if not paths:
+            break
+        flight_ids = {leg.flight_id for path in paths for leg in path}
+        seats_available = dict(
+            with_live_holds(Flight.objects.filter(id__in=flight_ids)).values_list(
+                "id", "tickets_available"
+            )
+        )
+        for path in paths:
+            available = min(seats_available.get(leg.flight_id, 0) for leg in path)
+            if available < seats:
+                continue
+            results.append(
+                {
+                    "legs": [leg._asdict() for leg in path],
+                    "departure_time": path[0].departure_time,
+                    "arrival_time": path[-1].arrival_time,
+                    "duration": path[-1].arrival_time - path[0].departure_time,
+                    "distance": sum(leg.distance for leg in path),
+                    "seats_available": available,
+                }
+            )
+            if len(results) == limit:
+                break
+    return results
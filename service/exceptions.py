@@ -0,0 +1,52 @@
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class SeatsTaken(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Some of the requested seats are already taken."
+    default_code = "seats_taken"
+
+    def __init__(self, taken_seats):
+        super().__init__()
+        # Keeps seat numbers as integers, APIException would stringify them
+        self.detail = {"detail": self.detail, "taken_seats": taken_seats}
+
+
+class SeatsUnavailable(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Not enough free seats to place the requested group."
+    default_code = "seats_unavailable"
+
+    def __init__(self, flight_id, count, placement):
+        super().__init__()
+        self.detail = {
+            "detail": self.detail,
+            "flight": flight_id,
+            "count": count,
+            "placement": placement,
+        }
+
+
+class HoldLimitReached(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_code = "hold_limit_reached"
+
+    def __init__(self):
+        super().__init__(
+            f"A flight allows holding at most {settings.MAX_HOLDS_PER_USER} "
+            f"seats per user."
+        )
+
+
+class BookingConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The order conflicts with concurrent changes, try again."
+    default_code = "booking_conflict"
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "Idempotency-Key was already used for a different request."
+    default_code = "idempotency_key_reused"
@@ -0,0 +1,307 @@
+import heapq
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+
+from service.cache import SharedVersion
+from service.models import Airport, Route
+
+EARTH_RADIUS_KM = 6371.0088
+MAX_BULK_ROUTES = 10000
+
+
+def unit_vector(latitude, longitude):
+    """Point on the unit sphere, chord length between points grows with distance"""
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    cos_lat = math.cos(lat)
+    return cos_lat * math.cos(lon), cos_lat * math.sin(lon), math.sin(lat)
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+def km_to_chord(km):
+    return 2 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+def great_circle_distances(sources, destinations):
+    """
+    Haversine distances in km between two equally long lists of
+    (latitude, longitude). One pass in plain Python over the pairs, not
+    vectorized (numpy isn't a dependency); the radians are converted once
+    per list.
+    """
+    sources = [(math.radians(lat), math.radians(lon)) for lat, lon in sources]
+    destinations = [(math.radians(lat), math.radians(lon)) for lat, lon in destinations]
+    sin, cos, asin, sqrt = math.sin, math.cos, math.asin, math.sqrt
+    return [
+        2
+        * EARTH_RADIUS_KM
+        * asin(
+            sqrt(
+                min(
+                    1.0,
+                    sin((lat2 - lat1) / 2) ** 2
+                    + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2,
+                )
+            )
+        )
+        for (lat1, lon1), (lat2, lon2) in zip(sources, destinations)
+    ]
+
+
+class KDTree:
+    """Static 3-d tree over (vector, id) pairs"""
+
+    def __init__(self, points):
+        self._root = self._build(list(points), 0)
+
+    def _build(self, points, axis):
+        if not points:
+            return None
+        points.sort(key=lambda point: point[0][axis])
+        middle = len(points) // 2
+        next_axis = (axis + 1) % 3
+        return (
+            points[middle],
+            axis,
+            self._build(points[:middle], next_axis),
+            self._build(points[middle + 1 :], next_axis),
+        )
+
+    def nearest(self, target, k, max_distance, skip=frozenset()):
+        """Up to k (distance, id) pairs within max_distance, nearest first"""
+        heap = []  # max-heap of (-distance, id)
+
+        def bound():
+            return -heap[0][0] if len(heap) == k else max_distance
+
+        def visit(node):
+            if node is None:
+                return
+            (vector, point_id), axis, left, right = node
+            distance = math.dist(vector, target)
+            if distance <= bound() and point_id not in skip:
+                heapq.heappush(heap, (-distance, point_id))
+                if len(heap) > k:
+                    heapq.heappop(heap)
+            offset = target[axis] - vector[axis]
+            near, far = (left, right) if offset < 0 else (right, left)
+            visit(near)
+            if abs(offset) <= bound():
+                visit(far)
+
+        visit(self._root)
+        return sorted((-distance, point_id) for distance, point_id in heap)
+
+
+class AirportGeoIndex:
+    """
+    Nearest-airport index: a KD-tree over the airports when it was built
+    plus the airports changed since, which are searched linearly.
+    The tree is rebuilt once rebuild_threshold airports have changed.
+    Updates replace the change set instead of mutating it, so lookups
+    never lock.
+    """
+
+    rebuild_threshold = 64
+
+    def __init__(self, airports, version=None):
+        self.version = version
+        self.built_at = time.monotonic()
+        self._vectors = {
+            airport_id: unit_vector(*coordinates)
+            for airport_id, coordinates in airports
+        }
+        self._rebuild()
+
+    @classmethod
+    def build(cls, version=None):
+        rows = Airport.objects.order_by().values_list(
+            "id",
+            "latitude",
+            "longitude",
+            "closest_big_city__latitude",
+            "closest_big_city__longitude",
+        )
+        return cls(
+            (
+                (airport_id, coordinates)
+                for airport_id, *values in rows.iterator()
+                if (coordinates := _coordinates(*values))
+            ),
+            version,
+        )
+
+    def is_current(self, version):
+        """Not changed by another worker since, and younger than GEO_INDEX_TTL"""
+        age = time.monotonic() - self.built_at
+        return version == self.version and age < settings.GEO_INDEX_TTL.total_seconds()
+
+    def _rebuild(self):
+        tree = KDTree(
+            (vector, airport_id) for airport_id, vector in self._vectors.items()
+        )
+        self._state = tree, {}
+
+    def update(self, airport_id, coordinates):
+        """Moves, adds or (with coordinates None) removes an airport"""
+        vector = unit_vector(*coordinates) if coordinates else None
+        if vector is None:
+            self._vectors.pop(airport_id, None)
+        else:
+            self._vectors[airport_id] = vector
+        tree, changed = self._state
+        if len(changed) + 1 >= self.rebuild_threshold:
+            self._rebuild()
+        else:
+            self._state = tree, {**changed, airport_id: vector}
+
+    def nearest(self, latitude, longitude, k=5, radius_km=None):
+        """Up to k (airport id, distance in km) pairs, nearest first"""
+        target = unit_vector(latitude, longitude)
+        max_distance = 2.0 if radius_km is None else km_to_chord(radius_km)
+        tree, changed = self._state
+
+        candidates = tree.nearest(target, k, max_distance, skip=changed.keys())
+        for airport_id, vector in changed.items():
+            if vector is not None:
+                distance = math.dist(vector, target)
+                if distance <= max_distance:
+                    candidates.append((distance, airport_id))
+        return [
+            (airport_id, chord_to_km(distance))
+            for distance, airport_id in heapq.nsmallest(k, candidates)
+        ]
+
+
+def _coordinates(latitude, longitude, city_latitude, city_longitude):
+    if latitude is not None and longitude is not None:
+        return latitude, longitude
+    if city_latitude is not None and city_longitude is not None:
+        return city_latitude, city_longitude
+    return None
+
+
+index_version = SharedVersion("airport-geo")
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Returns the process-wide index, rebuilt when another worker changed
+    airports since, or after GEO_INDEX_TTL
+    """
+    global _index
+    # Read before building, a change committed meanwhile bumps it again
+    version = index_version.get()
+    index = _index
+    if index is None or not index.is_current(version):
+        with _index_lock:
+            index = _index
+            if index is None or not index.is_current(version):
+                index = _index = AirportGeoIndex.build(version)
+    return index
+
+
+def update_airports(airport_ids):
+    """
+    Reloads the coordinates of the given airports into the index of this
+    worker and makes those of the others stale. The index is updated in
+    place only when no other worker changed airports since it was built,
+    a bump racing with this one is caught by GEO_INDEX_TTL.
+    """
+    version = index_version.get()
+    new_version = index_version.bump()
+    index = _index
+    if index is None or index.version != version:
+        return
+    rows = Airport.objects.filter(id__in=airport_ids).values_list(
+        "id",
+        "latitude",
+        "longitude",
+        "closest_big_city__latitude",
+        "closest_big_city__longitude",
+    )
+    coordinates = {airport_id: _coordinates(*values) for airport_id, *values in rows}
+    with _index_lock:
+        for airport_id in airport_ids:
+            index.update(airport_id, coordinates.get(airport_id))
+        index.version = new_version
+
+
+def update_city_airports(city_id):
+    """Reloads airports of a city, those without coordinates move with it"""
+    update_airports(
+        list(
+            Airport.objects.filter(closest_big_city_id=city_id).values_list(
+                "id", flat=True
+            )
+        )
+    )
+
+
+def invalidate_index():
+    index_version.bump()
+
+
+def validate_routes(rows):
+    """
+    Validates a batch of route rows with one query for their airports.
+    Fills in missing distances from airport coordinates.
+    Returns a list of per-row error dicts, empty when the batch is valid.
+    """
+    airport_ids = {row[field] for row in rows for field in ("source", "destination")}
+    airports = Airport.objects.select_related("closest_big_city").in_bulk(airport_ids)
+
+    errors = []
+    missing_distance = []
+    for index, row in enumerate(rows):
+        row_errors = {}
+        for field in ("source", "destination"):
+            if row[field] not in airports:
+                message = serializers.PrimaryKeyRelatedField.default_error_messages[
+                    "does_not_exist"
+                ]
+                row_errors[field] = [message.format(pk_value=row[field])]
+        if not row_errors and "distance" not in row:
+            if all(
+                airports[row[field]].coordinates for field in ("source", "destination")
+            ):
+                missing_distance.append(row)
+            else:
+                row_errors["distance"] = [
+                    "Airports have no coordinates, distance is required."
+                ]
+        if row_errors:
+            errors.append({"row": index, **row_errors})
+
+    distances = great_circle_distances(
+        [airports[row["source"]].coordinates for row in missing_distance],
+        [airports[row["destination"]].coordinates for row in missing_distance],
+    )
+    for row, distance in zip(missing_distance, distances):
+        row["distance"] = round(distance)
+    return errors
+
+
+@transaction.atomic
+def create_routes(rows):
+    """Inserts validated route rows with one bulk insert"""
+    return Route.objects.bulk_create(
+        [
+            Route(
+                source_id=row["source"],
+                destination_id=row["destination"],
+                distance=row["distance"],
+            )
+            for row in rows
+        ]
+    )
@@ -0,0 +1,135 @@
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+
+from service.cache import invalidate_flight
+from service.exceptions import HoldLimitReached, SeatsTaken
+from service.inventory import lock_flights
+from service.models import SeatHold
+
+
+def live_holds(now=None):
+    """Holds not expired yet, expired ones count nowhere even before the sweep"""
+    return SeatHold.objects.filter(expires_at__gt=now or datetime.now())
+
+
+def with_live_holds(flights):
+    """
+    Annotates flights with the seats_held_now count of their live holds,
+    tickets_available and holds_expire_at, when the first of them expires
+    """
+    holds = live_holds().filter(flight=OuterRef("pk")).order_by()
+    return flights.annotate(
+        seats_held_now=Coalesce(
+            Subquery(
+                holds.values("flight").annotate(count=Count("id")).values("count")
+            ),
+            0,
+        ),
+        holds_expire_at=Subquery(holds.order_by("expires_at").values("expires_at")[:1]),
+    ).annotate(
+        tickets_available=F("airplane__rows") * F("airplane__seats_in_row")
+        - F("seats_sold")
+        - F("seats_held_now")
+    )
+
+
+def prefetch_live_holds():
+    return Prefetch("seat_holds", queryset=live_holds())
+
+
+def release_holds(holds):
+    """Deletes holds, returns how many were actually deleted"""
+    ids_by_flight = defaultdict(list)
+    for hold_id, flight_id in holds:
+        ids_by_flight[flight_id].append(hold_id)
+
+    released = 0
+    for flight_id, hold_ids in sorted(ids_by_flight.items()):
+        deleted, _ = SeatHold.objects.filter(id__in=hold_ids).delete()
+        if deleted:
+            invalidate_flight(flight_id)
+            released += deleted
+    return released
+
+
+def sweep_expired_holds(flight_ids=None, batch_size=1000):
+    """Releases expired holds, of the given flights only if flight_ids is passed"""
+    expired = SeatHold.objects.filter(expires_at__lte=datetime.now())
+    if flight_ids is not None:
+        expired = expired.filter(flight_id__in=flight_ids)
+
+    released = 0
+    while True:
+        holds = list(expired.order_by("id").values_list("id", "flight_id")[:batch_size])
+        if not holds:
+            return released
+        released += release_holds(holds)
+        if len(holds) < batch_size:
+            return released
+
+
+def active_holds(flight_ids):
+    """Maps (flight_id, row, seat) to the hold of every held seat"""
+    holds = SeatHold.objects.filter(flight_id__in=flight_ids).only(
+        "id", "flight_id", "row", "seat", "user_id"
+    )
+    return {(hold.flight_id, hold.row, hold.seat): hold for hold in holds}
+
+
+@transaction.atomic
+def hold_seats(user, flight, seats):
+    """
+    Reserves seats of a flight for the user for SEAT_HOLD_TTL.
+    Holds the user already has on these seats are extended.
+    """
+    flight_id = flight.id
+    seat_map = lock_flights([flight_id])[0].get_seat_map()
+    sweep_expired_holds([flight_id])
+    holds = active_holds([flight_id])
+
+    held = sum(hold.user_id == user.id for hold in holds.values())
+    new = sum((flight_id, row, seat) not in holds for row, seat in seats)
+    if held + new > settings.MAX_HOLDS_PER_USER:
+        raise HoldLimitReached()
+
+    def held_by_others(row, seat):
+        hold = holds.get((flight_id, row, seat))
+        return hold is not None and hold.user_id != user.id
+
+    taken_seats = [
+        {"flight": flight_id, "row": row, "seat": seat}
+        for row, seat in seats
+        if seat_map.is_taken(row, seat) or held_by_others(row, seat)
+    ]
+    if taken_seats:
+        raise SeatsTaken(taken_seats)
+
+    expires_at = datetime.now() + settings.SEAT_HOLD_TTL
+    own_holds = [
+        holds[(flight_id, row, seat)]
+        for row, seat in seats
+        if (flight_id, row, seat) in holds
+    ]
+    SeatHold.objects.filter(id__in=[hold.id for hold in own_holds]).update(
+        expires_at=expires_at
+    )
+    SeatHold.objects.bulk_create(
+        [
+            SeatHold(
+                flight_id=flight_id,
+                row=row,
+                seat=seat,
+                user=user,
+                expires_at=expires_at,
+            )
+            for row, seat in seats
+            if (flight_id, row, seat) not in holds
+        ]
+    )
+    invalidate_flight(flight_id)
+    return expires_at
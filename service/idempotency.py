@@ -0,0 +1,72 @@
+import hashlib
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.db import transaction, IntegrityError
+from rest_framework import serializers
+
+from service.exceptions import IdempotencyKeyReused
+from service.models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+
+def hash_request(request):
+    """Fingerprints the method, path and body of a request"""
+    payload = json.dumps(
+        [request.method, request.path, request.data], sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def claim_key(user, key, request_hash):
+    """
+    Claims the key for the user inside the caller's transaction.
+    Returns the record and whether its stored response should be replayed.
+    A concurrent request with the same key blocks on the unique index
+    until the first one commits, then replays its response.
+    """
+    if len(key) > IdempotencyKey._meta.get_field("key").max_length:
+        raise serializers.ValidationError({IDEMPOTENCY_HEADER: "Key is too long."})
+
+    expires_at = datetime.now() + settings.IDEMPOTENCY_KEY_TTL
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user=user, key=key, request_hash=request_hash, expires_at=expires_at
+            )
+        return record, False
+    except IntegrityError:
+        record = IdempotencyKey.objects.select_for_update().get(user=user, key=key)
+
+    if record.expires_at <= datetime.now():
+        record.request_hash = request_hash
+        record.response_status = None
+        record.response_body = None
+        record.expires_at = expires_at
+        record.save()
+        return record, False
+    if record.request_hash != request_hash:
+        raise IdempotencyKeyReused()
+    return record, True
+
+
+def store_response(record, response):
+    """Saves the response to be replayed for the key"""
+    record.response_status = response.status_code
+    record.response_body = response.data
+    record.save(update_fields=["response_status", "response_body"])
+
+
+def purge_expired_keys(batch_size=1000):
+    """Deletes expired keys in batches, returns how many were deleted"""
+    expired = IdempotencyKey.objects.filter(expires_at__lte=datetime.now())
+    purged = 0
+    while True:
+        ids = list(expired.order_by("id").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return purged
+        purged += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+        if len(ids) < batch_size:
+            return purged
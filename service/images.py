@@ -0,0 +1,133 @@
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from PIL import Image, ImageOps
+
+from service.cache import invalidate_all_flights
+from service.models import Airport
+
+logger = logging.getLogger(__name__)
+
+# Bounding boxes of the generated renditions, aspect ratio is kept
+RENDITIONS = {
+    "thumbnail": (160, 160),
+    "medium": (800, 800),
+}
+RENDITION_FORMAT = "WEBP"
+RENDITION_EXTENSION = "webp"
+RENDITIONS_DIR = "uploads/airports/renditions/"
+
+
+def render_renditions(source_path, media_root, name_prefix):
+    """
+    Writes every rendition of the image at source_path under media_root.
+    Runs in a worker process, so it only touches files, not Django.
+    """
+    renditions = {}
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        for rendition, size in RENDITIONS.items():
+            resized = image.copy()
+            resized.thumbnail(size, Image.Resampling.LANCZOS)
+            name = f"{name_prefix}-{rendition}.{RENDITION_EXTENSION}"
+            path = os.path.join(media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            resized.save(path, RENDITION_FORMAT, quality=80, method=4)
+            renditions[rendition] = {
+                "name": name,
+                "width": resized.width,
+                "height": resized.height,
+                "format": RENDITION_FORMAT.lower(),
+            }
+    return renditions
+
+
+def rendition_prefix(image_name):
+    stem = os.path.splitext(os.path.basename(image_name))[0].rstrip(".")
+    return os.path.join(RENDITIONS_DIR, stem)
+
+
+def rendition_names(image_name):
+    """Names render_renditions gives the renditions of an image"""
+    prefix = rendition_prefix(image_name)
+    return [f"{prefix}-{rendition}.{RENDITION_EXTENSION}" for rendition in RENDITIONS]
+
+
+def rendition_job(airport):
+    """Arguments of render_renditions for the current image of an airport"""
+    return (
+        default_storage.path(airport.image.name),
+        default_storage.path(""),
+        rendition_prefix(airport.image.name),
+    )
+
+
+def save_renditions(airport_id, image_name, renditions):
+    """
+    Records renditions unless the image was replaced in the meantime,
+    then deletes the files of the renditions they replace.
+    """
+    airport = Airport.objects.filter(pk=airport_id, image=image_name).first()
+    if airport is None:
+        return False
+    previous = airport.image_renditions or {}
+    Airport.objects.filter(pk=airport_id, image=image_name).update(
+        image_renditions=renditions
+    )
+    names = {rendition["name"] for rendition in renditions.values()}
+    for rendition in previous.values():
+        name = rendition["name"]
+        # Airports sharing a content-addressed image share its renditions
+        shared = Airport.objects.filter(
+            image_renditions__thumbnail__name=name
+        ) | Airport.objects.filter(image_renditions__medium__name=name)
+        if name not in names and not shared.exists():
+            default_storage.delete(name)
+    # Airports are serialized into cached flights and update() sends no signals
+    invalidate_all_flights()
+    return True
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    max_workers=settings.IMAGE_PIPELINE_WORKERS
+                )
+    return _executor
+
+
+def schedule_renditions(airport):
+    """
+    Generates renditions of the airport image in the process pool and
+    records them when done. With IMAGE_PIPELINE_WORKERS = 0 it runs inline.
+    """
+    if not airport.image:
+        return
+    job = rendition_job(airport)
+    if not settings.IMAGE_PIPELINE_WORKERS:
+        save_renditions(airport.pk, airport.image.name, render_renditions(*job))
+        return
+
+    def done(future):
+        try:
+            save_renditions(airport.pk, airport.image.name, future.result())
+        except Exception:
+            logger.exception("Renditions of airport %s failed", airport.pk)
+        finally:
+            close_old_connections()
+
+    get_executor().submit(render_renditions, *job).add_done_callback(done)
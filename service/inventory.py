@@ -0,0 +1,89 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+
+from service.cache import invalidate_flight
+from service.models import Flight, Ticket
+from service.seat_map import SeatMap
+
+
+def lock_flights(flight_ids):
+    """Locks flights in id order, so bookings spanning flights can't deadlock"""
+    return list(
+        Flight.objects.select_for_update(of=("self",))
+        .select_related("airplane")
+        .only("id", "seat_map", "airplane__rows", "airplane__seats_in_row")
+        .filter(id__in=flight_ids)
+        .order_by("id")
+    )
+
+
+def save_seat_map(flight_id, seat_map, sold_delta):
+    """Stores the seat map of a locked flight and shifts seats_sold"""
+    Flight.objects.filter(pk=flight_id).update(
+        seat_map=seat_map.to_bytes(), seats_sold=F("seats_sold") + sold_delta
+    )
+    invalidate_flight(flight_id)
+
+
+@transaction.atomic
+def update_seat_inventory(flight_id, taken=(), released=()):
+    """Marks seats as taken/released in the flight seat map and seats_sold"""
+    for flight in lock_flights([flight_id]):
+        seat_map = flight.get_seat_map()
+        for row, seat in taken:
+            seat_map.take(row, seat)
+        for row, seat in released:
+            seat_map.release(row, seat)
+        save_seat_map(flight_id, seat_map, len(taken) - len(released))
+
+
+def _fits(airplane, row, seat):
+    """Tickets outside the airplane layout aren't counted as sold seats"""
+    return 1 <= row <= airplane.rows and 1 <= seat <= airplane.seats_in_row
+
+
+@transaction.atomic
+def rebuild_seat_inventory(flight_id):
+    """Recomputes the seat map and seats_sold of a flight from its tickets"""
+    flights = lock_flights([flight_id])
+    if not flights:
+        return
+    airplane = flights[0].airplane
+    seat_map = SeatMap(airplane.rows, airplane.seats_in_row)
+    seats = Ticket.objects.filter(flight_id=flight_id).values_list("row", "seat")
+    for row, seat in seats:
+        if _fits(airplane, row, seat):
+            seat_map.take(row, seat)
+    Flight.objects.filter(pk=flight_id).update(
+        seat_map=seat_map.to_bytes(), seats_sold=seat_map.count()
+    )
+    invalidate_flight(flight_id)
+
+
+def find_drifted_flights(chunk_size=500):
+    """Yields ids of flights whose seat map or seats_sold disagree with tickets"""
+    flights = (
+        Flight.objects.select_related("airplane")
+        .only(
+            "id", "seats_sold", "seat_map", "airplane__rows", "airplane__seats_in_row"
+        )
+        .order_by("id")
+    )
+    for start in range(0, flights.count(), chunk_size):
+        chunk = {flight.id: flight for flight in flights[start : start + chunk_size]}
+        expected = defaultdict(set)
+        tickets = Ticket.objects.filter(flight_id__in=chunk).values_list(
+            "flight_id", "row", "seat"
+        )
+        for flight_id, row, seat in tickets:
+            if _fits(chunk[flight_id].airplane, row, seat):
+                expected[flight_id].add((row, seat))
+
+        for flight_id, flight in chunk.items():
+            seats = expected[flight_id]
+            if flight.seats_sold != len(seats) or (
+                set(flight.get_seat_map().taken_seats()) != seats
+            ):
+                yield flight_id
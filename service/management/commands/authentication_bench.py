@@ -0,0 +1,70 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from service.views import AirportViewSet
+from user.authentication import (
+    CachedJWTAuthentication,
+    StatelessJWTAuthentication,
+    user_cache,
+)
+from user.serializers import UserTokenObtainPairSerializer
+
+
+class Command(BaseCommand):
+    """Django command that compares JWT authentication classes"""
+
+    help = (
+        "List airports with the simplejwt, cached and stateless authentication "
+        "and report queries and latency per request"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--limit", type=int, default=6, help="Airports per page")
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        user, _ = get_user_model().objects.get_or_create(
+            email="authentication-bench@example.com"
+        )
+        token = UserTokenObtainPairSerializer.get_token(user).access_token
+        authentications = {
+            "JWTAuthentication": JWTAuthentication,
+            "CachedJWTAuthentication": CachedJWTAuthentication,
+            "StatelessJWTAuthentication": StatelessJWTAuthentication,
+        }
+        user_cache.invalidate()
+
+        for label, authentication in authentications.items():
+            view = AirportViewSet.as_view(
+                {"get": "list"},
+                authentication_classes=[authentication],
+                throttle_classes=[],
+            )
+            timings, queries = [], 0
+            for _ in range(options["requests"]):
+                request = RequestFactory().get(
+                    "/api/service/airports/",
+                    {"limit": options["limit"]},
+                    HTTP_AUTHORIZATION=f"Bearer {token}",
+                    SERVER_NAME="localhost",
+                )
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = view(request)
+                    response.render()
+                    timings.append(time.perf_counter() - started)
+                queries += len(captured)
+            self.stdout.write(
+                f"{label:>26}: {response.status_code} "
+                f"{queries / options['requests']:5.2f} queries/request "
+                f"median {statistics.median(timings) * 1000:6.2f} ms"
+            )
+        self.stdout.write(self.style.SUCCESS("Done"))
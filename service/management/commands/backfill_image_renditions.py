@@ -0,0 +1,53 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from service.images import rendition_job, render_renditions, save_renditions
+from service.models import Airport
+
+
+class Command(BaseCommand):
+    """Django command that generates missing renditions of airport images"""
+
+    help = "Generate thumbnail and medium renditions for existing airport images"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Number of worker processes, defaults to the CPU count",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate renditions of images that already have them",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        airports = Airport.objects.exclude(image="").exclude(image__isnull=True)
+        if not options["force"]:
+            airports = airports.filter(image_renditions={})
+        airports = airports.only("id", "image")
+
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            jobs = {
+                executor.submit(render_renditions, *rendition_job(airport)): airport
+                for airport in airports.iterator()
+            }
+            for future in as_completed(jobs):
+                airport = jobs[future]
+                try:
+                    save_renditions(airport.pk, airport.image.name, future.result())
+                    done += 1
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f"Airport {airport.pk}: {error}")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Generated renditions for {done} airport(s)")
+        )
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{failed} airport(s) failed"))
@@ -0,0 +1,94 @@
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, DatabaseError
+
+from service.booking import BookingEngine
+from service.exceptions import BookingConflict, SeatsTaken
+from service.models import Flight, Order
+
+
+class Command(BaseCommand):
+    """Django command that measures booking throughput under contention"""
+
+    help = (
+        "Book random seats of one flight from many threads at once "
+        "and report throughput, conflicts and latency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("flight", type=int, help="Id of the flight to book")
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--orders", type=int, default=200, help="Orders in total")
+        parser.add_argument("--seats", type=int, default=2, help="Tickets per order")
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the booked orders instead of deleting them afterwards",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        flight = Flight.objects.select_related("airplane").get(pk=options["flight"])
+        user, _ = get_user_model().objects.get_or_create(
+            email="booking-load-test@example.com"
+        )
+        seats = [
+            (row, seat)
+            for row in range(1, flight.airplane.rows + 1)
+            for seat in range(1, flight.airplane.seats_in_row + 1)
+        ]
+
+        outcomes = Counter()
+        latencies = []
+        order_ids = []
+        lock = threading.Lock()
+
+        def book(_):
+            tickets = [
+                {"flight": flight, "row": row, "seat": seat}
+                for row, seat in random.sample(seats, options["seats"])
+            ]
+            started = time.perf_counter()
+            try:
+                order = BookingEngine().book({"user": user}, tickets)
+                outcome = "booked"
+            except (SeatsTaken, BookingConflict):
+                order, outcome = None, "conflict"
+            except DatabaseError:
+                order, outcome = None, "error"
+            finally:
+                connection.close()
+            with lock:
+                outcomes[outcome] += 1
+                latencies.append(time.perf_counter() - started)
+                if order:
+                    order_ids.append(order.id)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+            list(pool.map(book, range(options["orders"])))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        self.stdout.write(
+            f"{options['orders']} orders from {options['threads']} threads "
+            f"in {elapsed:.2f}s: {options['orders'] / elapsed:.1f} orders/s"
+        )
+        self.stdout.write(
+            f"booked: {outcomes['booked']}, conflicts: {outcomes['conflict']}, "
+            f"errors: {outcomes['error']}"
+        )
+        self.stdout.write(
+            f"latency p50: {statistics.median(latencies) * 1000:.1f}ms, "
+            f"p95: {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms"
+        )
+
+        if not options["keep"]:
+            Order.objects.filter(id__in=order_ids).delete()
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from service.snapshot import write_snapshot
+
+
+class Command(BaseCommand):
+    """Django command that writes the memory-mapped reference data snapshot"""
+
+    help = (
+        "Write countries, cities, airports, airplane types and air companies "
+        "into the snapshot file workers map, replacing it atomically"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="Snapshot file, defaults to REFERENCE_SNAPSHOT_PATH",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        path = options["output"] or settings.REFERENCE_SNAPSHOT_PATH
+        if not path:
+            raise CommandError("Set REFERENCE_SNAPSHOT_PATH or pass --output")
+        version, size = write_snapshot(path)
+        self.stdout.write(
+            self.style.SUCCESS(f"Wrote version {version} ({size} bytes) to {path}")
+        )
@@ -0,0 +1,117 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from service.images import RENDITIONS_DIR
+from service.models import Airport
+from service.storage import (
+    BLOBS_DIR,
+    ContentAddressedStorage,
+    content_addressed_storage,
+)
+
+AIRPORT_UPLOADS_DIR = "uploads/airports/"
+
+
+def file_digest(name):
+    with default_storage.open(name, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+class Command(BaseCommand):
+    """Django command that moves airport images into content-addressed storage"""
+
+    help = (
+        "Store every distinct airport image once under its hash, "
+        "repoint airports to it and delete the old copies"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many files and bytes would be deduplicated",
+        )
+        parser.add_argument(
+            "--delete-orphans",
+            action="store_true",
+            help=f"Also delete files under {AIRPORT_UPLOADS_DIR} no airport uses",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        airports = (
+            Airport.objects.exclude(image="")
+            .exclude(image__isnull=True)
+            .only("id", "image")
+            .order_by("id")
+        )
+        moved = 0
+        digests = {}
+        old_names = set()
+        for airport in airports.iterator():
+            name = airport.image.name
+            if ContentAddressedStorage.is_blob(name):
+                continue
+            if not default_storage.exists(name):
+                self.stderr.write(f"Airport {airport.pk}: {name} is missing")
+                continue
+            if options["dry_run"]:
+                digests.setdefault(file_digest(name), set()).add(name)
+                continue
+            with default_storage.open(name, "rb") as file:
+                airport.image = content_addressed_storage.save(name, file)
+            airport.save(update_fields=["image"])
+            old_names.add(name)
+            moved += 1
+
+        if options["dry_run"]:
+            names = [name for group in digests.values() for name in group]
+            duplicates = [
+                name for group in digests.values() for name in list(group)[1:]
+            ]
+            size = sum(default_storage.size(name) for name in duplicates)
+            self.stdout.write(
+                f"{len(names)} file(s) would become {len(digests)} blob(s), "
+                f"saving {size} bytes"
+            )
+            return
+
+        still_used = set(
+            Airport.objects.filter(image__in=old_names).values_list("image", flat=True)
+        )
+        for name in old_names - still_used:
+            default_storage.delete(name)
+
+        orphans = self.find_orphans()
+        if options["delete_orphans"]:
+            for name in orphans:
+                default_storage.delete(name)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Moved {moved} image(s) into {BLOBS_DIR}")
+        )
+        if orphans:
+            action = "Deleted" if options["delete_orphans"] else "Found"
+            self.stdout.write(f"{action} {len(orphans)} orphaned file(s)")
+        if moved:
+            self.stdout.write(
+                "Run backfill_image_renditions --force to rename their renditions"
+            )
+
+    @staticmethod
+    def find_orphans():
+        """Files under uploads/airports/ (renditions aside) no airport points to"""
+        root = os.path.join(settings.MEDIA_ROOT, AIRPORT_UPLOADS_DIR)
+        used = set(Airport.objects.values_list("image", flat=True))
+        orphans = []
+        for directory, _, files in os.walk(root):
+            for file in files:
+                path = os.path.join(directory, file)
+                name = os.path.relpath(path, settings.MEDIA_ROOT).replace("\\", "/")
+                if not name.startswith(RENDITIONS_DIR) and name not in used:
+                    orphans.append(name)
+        return orphans
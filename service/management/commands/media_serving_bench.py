@@ -0,0 +1,102 @@
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.views.static import serve
+from PIL import Image
+
+from app.media import serve_media
+
+BENCH_DIR = "uploads/bench/"
+
+
+def static_serve(request, path):
+    return serve(request, path, document_root=settings.MEDIA_ROOT)
+
+
+def consume(response, sendfile):
+    """Bytes of the response body, sent to /dev/null like a WSGI server would"""
+    if not response.streaming:
+        return len(response.content)
+    file = getattr(response, "file_to_stream", None)
+    if not sendfile or file is None or not hasattr(file, "fileno"):
+        sent = sum(len(chunk) for chunk in response.streaming_content)
+        response.close()
+        return sent
+    # Same as gunicorn: from the current offset, bounded by Content-Length
+    offset = os.lseek(file.fileno(), 0, os.SEEK_CUR)
+    remaining = int(response["Content-Length"])
+    sent = 0
+    with open(os.devnull, "wb") as devnull:
+        while remaining:
+            count = os.sendfile(devnull.fileno(), file.fileno(), offset, remaining)
+            if not count:
+                break
+            offset += count
+            sent += count
+            remaining -= count
+    response.close()
+    return sent
+
+
+class Command(BaseCommand):
+    """Django command that compares media handlers on a large image"""
+
+    help = (
+        "Serve a generated large image through django.views.static.serve and "
+        "through the media view and report latency and bytes sent"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--megapixels", type=int, default=24, help="Size of the image"
+        )
+        parser.add_argument("--requests", type=int, default=50)
+        parser.add_argument(
+            "--no-sendfile",
+            action="store_true",
+            help="Read the media view responses in Python instead of sendfile",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        name = f"{BENCH_DIR}bench-{options['megapixels']}mp.bmp"
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            side = int((options["megapixels"] * 1_000_000) ** 0.5)
+            Image.effect_noise((side, side), 64).convert("RGB").save(path)
+        size = os.path.getsize(path)
+        self.stdout.write(f"{name}: {size / 2**20:.1f} MiB")
+
+        probe = serve_media(RequestFactory().get("/"), name)
+        probe.close()
+        scenarios = {
+            "full": {},
+            "revalidate": {"HTTP_IF_NONE_MATCH": probe["ETag"]},
+            "if-modified-since": {"HTTP_IF_MODIFIED_SINCE": probe["Last-Modified"]},
+            "last 64 KiB": {"HTTP_RANGE": "bytes=-65536"},
+        }
+        handlers = {"static.serve": static_serve, "serve_media": serve_media}
+        sendfile = not options["no_sendfile"] and hasattr(os, "sendfile")
+
+        for scenario, headers in scenarios.items():
+            for label, handler in handlers.items():
+                timings = []
+                sent = status = 0
+                for _ in range(options["requests"]):
+                    request = RequestFactory().get(f"/media/{name}", **headers)
+                    started = time.perf_counter()
+                    response = handler(request, name)
+                    sent = consume(response, sendfile and handler is serve_media)
+                    timings.append(time.perf_counter() - started)
+                    status = response.status_code
+                self.stdout.write(
+                    f"{scenario:>18} {label:>13}: {status} "
+                    f"{sent / 2**10:>10.0f} KiB "
+                    f"median {statistics.median(timings) * 1000:8.2f} ms"
+                )
+        self.stdout.write(self.style.SUCCESS("Done"))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from service.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    """Django command that deletes expired idempotency keys"""
+
+    help = "Delete idempotency keys whose replay window has expired"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of keys deleted per query",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        purged = purge_expired_keys(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} expired key(s)"))
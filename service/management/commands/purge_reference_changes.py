@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from service.reference_data import purge_changes
+
+
+class Command(BaseCommand):
+    """Django command that deletes old reference data changes"""
+
+    help = "Delete reference data changes older than REFERENCE_CHANGE_RETENTION"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of changes deleted per query",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        purged = purge_changes(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} reference change(s)"))
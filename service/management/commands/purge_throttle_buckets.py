@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from service.throttling import purge_expired_buckets
+
+
+class Command(BaseCommand):
+    """Django command that deletes expired throttle buckets"""
+
+    help = "Delete throttle buckets that no longer count towards any rate"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of buckets deleted per query",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        purged = purge_expired_buckets(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} expired bucket(s)"))
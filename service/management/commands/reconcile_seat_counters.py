@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from service.inventory import find_drifted_flights, rebuild_seat_inventory
+
+
+class Command(BaseCommand):
+    """Django command that fixes drifted flight seat maps and counters"""
+
+    help = "Recount sold seats of every flight and fix drifted seat inventory"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report drifted flights, do not update them",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        drifted_ids = list(find_drifted_flights())
+
+        if options["dry_run"]:
+            self.stdout.write(f"Flights with drifted inventory: {len(drifted_ids)}")
+            return
+
+        for flight_id in drifted_ids:
+            # Recounts under the flight row lock, so bookings can't interleave
+            rebuild_seat_inventory(flight_id)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Reconciled {len(drifted_ids)} flight(s)")
+        )
@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from service.scheduling import validate_schedule, create_schedule
+from service.serializers import FlightScheduleSerializer
+
+
+class Command(BaseCommand):
+    """Django command that creates flights in bulk from a JSON schedule"""
+
+    help = (
+        'Create flights from a JSON file with a "flights" list '
+        'and/or a "recurrence" rule, like POST /api/service/flights/bulk/'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("schedule", help="Path to the JSON schedule file")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only validate the schedule, do not create flights",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        with open(options["schedule"]) as schedule_file:
+            serializer = FlightScheduleSerializer(data=json.load(schedule_file))
+        if not serializer.is_valid():
+            raise CommandError(json.dumps(serializer.errors))
+        rows = serializer.validated_data["rows"]
+
+        errors = validate_schedule(rows)
+        for error in errors:
+            self.stderr.write(json.dumps(error, default=str))
+        if errors:
+            raise CommandError(f"{len(errors)} invalid flight(s), nothing created")
+
+        if options["dry_run"]:
+            self.stdout.write(f"Schedule of {len(rows)} flight(s) is valid")
+            return
+
+        flights = create_schedule(rows)
+        self.stdout.write(self.style.SUCCESS(f"Created {len(flights)} flight(s)"))
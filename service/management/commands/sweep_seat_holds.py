@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from service.holds import sweep_expired_holds
+
+
+class Command(BaseCommand):
+    """Django command that releases expired seat holds"""
+
+    help = "Delete expired seat holds and free their seats"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of holds deleted per query",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        released = sweep_expired_holds(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired hold(s)"))
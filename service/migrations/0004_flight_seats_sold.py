@@ -0,0 +1,32 @@
+# Generated by Django 4.2.4 on 2026-10-17 09:54
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_seats_sold(apps, schema_editor):
+    Flight = apps.get_model("service", "Flight")
+    Ticket = apps.get_model("service", "Ticket")
+    sold = (
+        Ticket.objects.filter(flight=OuterRef("pk"))
+        .values("flight")
+        .annotate(sold=Count("id"))
+        .values("sold")
+    )
+    Flight.objects.update(seats_sold=Coalesce(Subquery(sold), 0))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("service", "0003_flight_crew"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flight",
+            name="seats_sold",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_seats_sold, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.4 on 2026-10-17 09:56
+
+from django.db import migrations, models
+
+from service.seat_map import SeatMap
+
+
+def populate_seat_map(apps, schema_editor):
+    Flight = apps.get_model("service", "Flight")
+    Ticket = apps.get_model("service", "Ticket")
+    for flight in Flight.objects.select_related("airplane").iterator():
+        seat_map = SeatMap(flight.airplane.rows, flight.airplane.seats_in_row)
+        for row, seat in Ticket.objects.filter(flight=flight).values_list(
+            "row", "seat"
+        ):
+            seat_map.take(row, seat)
+        Flight.objects.filter(pk=flight.pk).update(seat_map=seat_map.to_bytes())
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("service", "0004_flight_seats_sold"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="flight",
+            name="seat_map",
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.RunPython(populate_seat_map, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.4 on 2026-10-17 09:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("service", "0005_flight_seat_map"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="flight",
+            name="service_fli_route_i_e0085a_idx",
+        ),
+        migrations.AddIndex(
+            model_name="flight",
+            index=models.Index(
+                fields=["route", "departure_time"], name="flight_route_departure_idx"
+            ),
+        ),
+    ]
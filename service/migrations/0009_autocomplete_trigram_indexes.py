@@ -0,0 +1,35 @@
+# Generated by Django 4.2.4 on 2026-10-17 10:40
+
+from django.db import migrations
+
+# City and country names are indexed by country 0004_name_trigram_indexes
+TRIGRAM_INDEXES = (("service_airport_name_trgm", "service_airport"),)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """Indexes names for the database autocomplete backend, PostgreSQL only"""
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for index, table in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {index} ON {table} "
+            f"USING gin (name gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for index, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("service", "0008_idempotency_key"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
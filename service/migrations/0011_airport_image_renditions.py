@@ -0,0 +1,17 @@
+# Generated by Django 4.2.4 on 2026-10-17 10:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("service", "0010_airport_coordinates"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="airport",
+            name="image_renditions",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
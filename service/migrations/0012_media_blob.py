@@ -0,0 +1,43 @@
+# Generated by Django 4.2.4 on 2026-10-17 10:24
+
+from django.db import migrations, models
+import service.models
+import service.storage
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("service", "0011_airport_image_renditions"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MediaBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sha256", models.CharField(max_length=64)),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("size", models.PositiveBigIntegerField()),
+                ("refcount", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="airport",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=service.storage.airport_image_storage,
+                upload_to=service.models.airport_image_file_path,
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.4 on 2026-10-17 10:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("service", "0012_media_blob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReferenceChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("countries", "countries"),
+                            ("cities", "cities"),
+                            ("airports", "airports"),
+                            ("airplane_types", "airplane types"),
+                            ("air_companies", "air companies"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("object_id", models.PositiveBigIntegerField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
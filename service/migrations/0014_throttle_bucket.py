@@ -0,0 +1,38 @@
+# Generated by Django 4.2.4 on 2026-10-17 10:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("service", "0013_reference_change"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ThrottleBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=255)),
+                ("window", models.PositiveBigIntegerField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("expires_at", models.DateTimeField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["expires_at"], name="service_thr_expires_d778da_idx"
+                    )
+                ],
+                "unique_together": {("key", "window")},
+            },
+        ),
+    ]
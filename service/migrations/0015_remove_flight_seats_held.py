@@ -0,0 +1,16 @@
+# Generated by Django 4.2.4 on 2026-10-17 12:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("service", "0014_throttle_bucket"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="flight",
+            name="seats_held",
+        ),
+    ]
@@ -3,11 +3,15 @@ import uuid
 from datetime import datetime
 
 from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator, MaxValueValidator
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.utils.text import slugify
 
 from app import settings
 from country.models import City
+from service.seat_map import SeatMap
+from service.storage import airport_image_storage
 
 
 class Crew(models.Model):
@@ -35,15 +39,54 @@ class Airport(models.Model):
     closest_big_city = models.ForeignKey(
         City, on_delete=models.SET_NULL, null=True, related_name="airports"
     )
-    image = models.ImageField(null=True, upload_to=airport_image_file_path, blank=True)
+    image = models.ImageField(
+        null=True,
+        upload_to=airport_image_file_path,
+        storage=airport_image_storage,
+        blank=True,
+    )
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
+    latitude = models.FloatField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(-90), MaxValueValidator(90)],
+    )
+    longitude = models.FloatField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(-180), MaxValueValidator(180)],
+    )
 
     class Meta:
         ordering = ("name", "closest_big_city")
 
+    @property
+    def coordinates(self):
+        """Own coordinates, or those of the closest big city, or None"""
+        if self.latitude is not None and self.longitude is not None:
+            return self.latitude, self.longitude
+        city = self.closest_big_city
+        if city and city.latitude is not None and city.longitude is not None:
+            return city.latitude, city.longitude
+        return None
+
     def __str__(self):
         return self.name
 
 
+class MediaBlob(models.Model):
+    """Content-addressed file and the number of records referencing it"""
+
+    sha256 = models.CharField(max_length=64)
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} references)"
+
+
 class Route(models.Model):
     source = models.ForeignKey(
         Airport, on_delete=models.SET_NULL, null=True, related_name="sources"
@@ -99,6 +142,16 @@ class Airplane(models.Model):
     def capacity(self):
         return self.rows * self.seats_in_row
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        airplane = super().from_db(db, field_names, values)
+        # Seat maps of its flights are laid out by it
+        airplane._loaded_layout = (
+            airplane.__dict__.get("rows"),
+            airplane.__dict__.get("seats_in_row"),
+        )
+        return airplane
+
     def __str__(self):
         return f"{self.name}, company: {self.air_company} (type: {self.airplane_type})"
 
@@ -111,14 +164,24 @@ class Flight(models.Model):
     departure_time = models.DateTimeField()
     arrival_time = models.DateTimeField()
     crew = models.ManyToManyField(Crew, related_name="flights")
+    seats_sold = models.PositiveIntegerField(default=0, editable=False)
+    seat_map = models.BinaryField(default=bytes, editable=False)
+
+    # Written by service.inventory under the flight row lock only
+    INVENTORY_FIELDS = ("seats_sold", "seat_map")
 
     class Meta:
         ordering = ["route", "-departure_time"]
         indexes = [
-            models.Index(fields=["route"]),
+            models.Index(
+                fields=["route", "departure_time"], name="flight_route_departure_idx"
+            ),
             models.Index(fields=["departure_time"]),
         ]
 
+    def get_seat_map(self):
+        return SeatMap(self.airplane.rows, self.airplane.seats_in_row, self.seat_map)
+
     @staticmethod
     def validate_departure_arrival_time(departure_time, arrival_time, error_to_raise):
         now = datetime.now()
@@ -137,13 +200,37 @@ class Flight(models.Model):
             self.departure_time, self.arrival_time, ValidationError
         )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        flight = super().from_db(db, field_names, values)
+        flight._loaded_airplane_id = flight.__dict__.get("airplane_id")
+        return flight
+
     def save(
         self, force_insert=False, force_update=False, using=None, update_fields=None
     ):
         self.full_clean()
-        return super(Flight, self).save(
+        if not self._state.adding and update_fields is None:
+            # The in-memory inventory may be older than concurrent bookings
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.name not in self.INVENTORY_FIELDS
+            ]
+        result = super(Flight, self).save(
             force_insert, force_update, using, update_fields
         )
+        loaded_airplane_id = getattr(self, "_loaded_airplane_id", None)
+        if loaded_airplane_id is not None and loaded_airplane_id != self.airplane_id:
+            # The seat map layout follows the airplane
+            from service.inventory import rebuild_seat_inventory
+
+            rebuild_seat_inventory(self.pk)
+        self._loaded_airplane_id = self.airplane_id
+        return result
 
     def __str__(self):
         return f"{str(self.route)} (departure: {self.departure_time}, arrival: {self.arrival_time})"
@@ -159,6 +246,15 @@ class Ticket(models.Model):
         unique_together = ("flight", "row", "seat")
         ordering = ("seat", "row")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        ticket = super().from_db(db, field_names, values)
+        # Seat taken in the seat map, released when the ticket is edited
+        ticket._loaded_seat = tuple(
+            ticket.__dict__.get(name) for name in ("flight_id", "row", "seat")
+        )
+        return ticket
+
     @staticmethod
     def validate_seat_row(row: int, seat: int, flight, error_to_raise):
         for ticket_attr_value, ticket_attr_name, airplane_attr_name in [
@@ -176,8 +272,15 @@ class Ticket(models.Model):
                     }
                 )
 
+    @staticmethod
+    def validate_seat_free(row: int, seat: int, flight, error_to_raise):
+        if flight.get_seat_map().is_taken(row, seat):
+            raise error_to_raise({"seat": f"Seat {seat} in row {row} is already taken"})
+
     def clean(self):
         Ticket.validate_seat_row(self.row, self.seat, self.flight, ValidationError)
+        if self._state.adding:
+            Ticket.validate_seat_free(self.row, self.seat, self.flight, ValidationError)
 
     def save(
         self,
@@ -186,13 +289,35 @@ class Ticket(models.Model):
         using=None,
         update_fields=None,
     ):
-        self.full_clean()
+        # Seat occupancy is checked against the flight seat map in clean()
+        self.full_clean(validate_unique=False)
         super(Ticket, self).save(force_insert, force_update, using, update_fields)
 
     def __str__(self):
         return f"{str(self.flight)} (row: {self.row}, seat: {self.seat})"
 
 
+class SeatHold(models.Model):
+    row = models.IntegerField()
+    seat = models.IntegerField()
+    flight = models.ForeignKey(
+        Flight, on_delete=models.CASCADE, related_name="seat_holds"
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="seat_holds"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("flight", "row", "seat")
+        ordering = ("expires_at",)
+        indexes = [models.Index(fields=["expires_at"])]
+
+    def __str__(self):
+        return f"{str(self.flight)} (row: {self.row}, seat: {self.seat}, hold)"
+
+
 class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -202,3 +327,67 @@ class Order(models.Model):
 
     def __str__(self) -> str:
         return str(self.created_at)
+
+
+class ReferenceChange(models.Model):
+    """
+    Log of saved or deleted reference data, its latest id is the version
+    of the reference data bundle
+    """
+
+    kind = models.CharField(
+        max_length=20,
+        choices=[
+            ("countries", "countries"),
+            ("cities", "cities"),
+            ("airports", "airports"),
+            ("airplane_types", "airplane types"),
+            ("air_companies", "air companies"),
+        ],
+    )
+    object_id = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"{self.kind} {self.object_id} (version {self.pk})"
+
+
+class IdempotencyKey(models.Model):
+    key = models.CharField(max_length=255)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="idempotency_keys",
+    )
+    request_hash = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("user", "key")
+        indexes = [models.Index(fields=["expires_at"])]
+
+    def __str__(self) -> str:
+        return f"{self.key} ({self.user})"
+
+
+class ThrottleBucket(models.Model):
+    """
+    Requests counted for a throttle key in one fixed window, shared by all
+    workers. The current and previous windows give the sliding-window rate.
+    """
+
+    key = models.CharField(max_length=255)
+    # Start of the window in seconds since the epoch
+    window = models.PositiveBigIntegerField()
+    count = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("key", "window")
+        indexes = [models.Index(fields=["expires_at"])]
+
+    def __str__(self) -> str:
+        return f"{self.key} @ {self.window}: {self.count}"
@@ -0,0 +1,93 @@
+from collections import defaultdict
+
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+from service.holds import with_live_holds
+from service.models import Crew, Flight, Ticket
+from service.serializers import FlightListSerializer
+
+
+class OrderHistoryLoader:
+    """
+    Loads the tickets of a page of orders and their flights in three queries
+    (tickets, distinct flights, crew) whatever the number of orders.
+    Every flight is fetched and serialized once and shared by its tickets.
+    """
+
+    def __init__(self, orders):
+        self.orders = list(orders)
+        self.tickets = defaultdict(list)
+        self.flights = {}
+        self._load()
+
+    def _load(self):
+        tickets = (
+            # In the Ticket.Meta ordering, like the nested order serializers
+            Ticket.objects.filter(
+                order_id__in=[order.id for order in self.orders]
+            ).values("id", "order_id", "row", "seat", "flight_id")
+        )
+        for ticket in tickets:
+            self.tickets[ticket.pop("order_id")].append(ticket)
+
+        flight_ids = {
+            ticket["flight_id"]
+            for order_tickets in self.tickets.values()
+            for ticket in order_tickets
+        }
+        if flight_ids:
+            flights = self.get_flights(flight_ids)
+            self.flights = {
+                flight["id"]: flight
+                for flight in FlightListSerializer(flights, many=True).data
+            }
+
+    @staticmethod
+    def get_flights(flight_ids):
+        """Fetches exactly what FlightListSerializer reads"""
+        flights = (
+            Flight.objects.filter(id__in=flight_ids)
+            .select_related("airplane", "route__source", "route__destination")
+            .only(
+                "id",
+                "departure_time",
+                "arrival_time",
+                "airplane__name",
+                "airplane__rows",
+                "airplane__seats_in_row",
+                "route__source__name",
+                "route__destination__name",
+            )
+        )
+        return with_live_holds(flights).prefetch_related(
+            Prefetch("crew", queryset=Crew.objects.only("first_name", "last_name"))
+        )
+
+    def to_representation(self, sideload=False):
+        """
+        Orders shaped like OrderListSerializer. With sideload tickets
+        reference flights by id, see flights_representation.
+        """
+        created_at = serializers.DateTimeField()
+        return [
+            {
+                "id": order.id,
+                "tickets": [
+                    {
+                        "id": ticket["id"],
+                        "row": ticket["row"],
+                        "seat": ticket["seat"],
+                        "flight": ticket["flight_id"]
+                        if sideload
+                        else self.flights[ticket["flight_id"]],
+                    }
+                    for ticket in self.tickets[order.id]
+                ],
+                "created_at": created_at.to_representation(order.created_at),
+            }
+            for order in self.orders
+        ]
+
+    def flights_representation(self):
+        return list(self.flights.values())
@@ -0,0 +1,45 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination without COUNT(*) and with a client page size"""
+
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class FlightKeysetPagination(KeysetPagination):
+    ordering = ("departure_time", "id")
+
+
+class RouteKeysetPagination(KeysetPagination):
+    ordering = ("id",)
+
+
+class OrderKeysetPagination(KeysetPagination):
+    ordering = ("-created_at", "-id")
+
+
+class KeysetPaginationOptInMixin:
+    """
+    Uses keyset_pagination_class instead of the default pagination
+    when the client opts in with ?pagination=cursor (or follows a cursor link).
+    """
+
+    keyset_pagination_class = None
+
+    def uses_keyset_pagination(self):
+        request = getattr(self, "request", None)
+        if self.keyset_pagination_class is None or request is None:
+            return False
+        query_params = request.query_params
+        return (
+            query_params.get("pagination") == "cursor"
+            or self.keyset_pagination_class.cursor_query_param in query_params
+        )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator") and self.uses_keyset_pagination():
+            self._paginator = self.keyset_pagination_class()
+        return super().paginator
@@ -0,0 +1,182 @@
+import gzip
+import hashlib
+import json
+import threading
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+from country.models import City, Country
+from service.models import AirCompany, AirplaneType, Airport, ReferenceChange
+
+# Kinds of the bundle with their model and columns
+REFERENCE_DATA = {
+    "countries": (Country, ("id", "name")),
+    "cities": (City, ("id", "name", "country", "latitude", "longitude")),
+    "airports": (
+        Airport,
+        ("id", "name", "closest_big_city", "latitude", "longitude", "image"),
+    ),
+    "airplane_types": (AirplaneType, ("id", "name")),
+    "air_companies": (AirCompany, ("id", "name")),
+}
+KIND_BY_MODEL = {model: kind for kind, (model, _) in REFERENCE_DATA.items()}
+
+
+def record_change(model, object_id):
+    """
+    Bumps the bundle version, the object is sent in deltas from now on.
+    Recorded by signals, so QuerySet.update(), bulk_create() and raw SQL on
+    reference data must call it themselves or clients keep the old rows.
+    """
+    ReferenceChange.objects.create(kind=KIND_BY_MODEL[model], object_id=object_id)
+
+
+def record_set_null_changes(instance):
+    """
+    Records the reference rows whose foreign key to the deleted instance is
+    set to NULL, the database does it without sending them a signal
+    """
+    for relation in instance._meta.related_objects:
+        kind = KIND_BY_MODEL.get(relation.related_model)
+        if kind is None or relation.on_delete is not models.SET_NULL:
+            continue
+        ids = relation.related_model._base_manager.filter(
+            **{relation.field.name: instance}
+        ).values_list("pk", flat=True)
+        ReferenceChange.objects.bulk_create(
+            ReferenceChange(kind=kind, object_id=object_id) for object_id in ids
+        )
+
+
+def latest_change(settled=False):
+    """
+    (version, timestamp) of the last change, (0, None) before any. Change ids
+    are taken on insert but transactions can commit out of order, so
+    versions sent to clients only count settled changes, older than
+    REFERENCE_CHANGE_LAG, and no later commit can add one below them.
+    """
+    changes = ReferenceChange.objects.order_by("-id")
+    if settled:
+        settled_at = datetime.now() - settings.REFERENCE_CHANGE_LAG
+        changes = changes.filter(created_at__lte=settled_at)
+    return changes.values_list("id", "created_at").first() or (0, None)
+
+
+def purge_changes(batch_size=1000):
+    """
+    Deletes changes older than REFERENCE_CHANGE_RETENTION but the latest
+    settled one, returns how many were deleted. Clients on a purged version
+    fetch the whole bundle again.
+    """
+    version, _ = latest_change(settled=True)
+    expired = ReferenceChange.objects.filter(
+        id__lt=version,
+        created_at__lte=datetime.now() - settings.REFERENCE_CHANGE_RETENTION,
+    )
+    purged = 0
+    while True:
+        ids = list(expired.order_by("id").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return purged
+        purged += ReferenceChange.objects.filter(id__in=ids).delete()[0]
+        if len(ids) < batch_size:
+            return purged
+
+
+def _rows(kind, ids=None):
+    model, columns = REFERENCE_DATA[kind]
+    queryset = model.objects.order_by("id").values(*columns)
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+    rows = list(queryset)
+    if model is Airport:
+        storage = Airport._meta.get_field("image").storage
+        for row in rows:
+            row["image"] = storage.url(row["image"]) if row["image"] else None
+    return rows
+
+
+def _encode(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":")).encode()
+
+
+class ReferenceBundle:
+    """All reference data of one version, JSON encoded and gzipped once"""
+
+    def __init__(self, version, stamp, body):
+        self.version = version
+        self.stamp = stamp
+        self.body = body
+        self.compressed = gzip.compress(body, compresslevel=9, mtime=0)
+        self.etag = f'"{version}-{hashlib.sha256(body).hexdigest()[:16]}"'
+
+    @classmethod
+    def build(cls, version, stamp):
+        # Rows are read after the version, so they can only be newer than
+        # it and deltas since this version send them again, never miss them
+        data = {"version": version}
+        data.update({kind: _rows(kind) for kind in REFERENCE_DATA})
+        return cls(version, stamp, _encode(data))
+
+
+_bundle = None
+_bundle_lock = threading.Lock()
+
+
+def _cache_key(version, stamp):
+    return f"reference-data:{version}:{stamp.timestamp() if stamp else 0}"
+
+
+def get_bundle():
+    """
+    Bundle of the current version, from this process, then from the default
+    cache, built only when neither has it. The default cache is a per-process
+    LocMemCache, so each worker builds its own bundle unless it is pointed at
+    a shared backend.
+    """
+    global _bundle
+    version, stamp = latest_change(settled=True)
+    bundle = _bundle
+    if bundle is not None and (bundle.version, bundle.stamp) == (version, stamp):
+        return bundle
+    with _bundle_lock:
+        bundle = _bundle
+        if bundle is None or (bundle.version, bundle.stamp) != (version, stamp):
+            key = _cache_key(version, stamp)
+            bundle = cache.get(key)
+            if bundle is None:
+                bundle = ReferenceBundle.build(version, stamp)
+                cache.set(key, bundle, timeout=None)
+            _bundle = bundle
+    return bundle
+
+
+def get_delta(since):
+    """
+    JSON of the rows saved since a version and the ids of deleted ones by
+    kind, with the current version. None for a version newer than it or
+    older than the purged changes.
+    """
+    version, _ = latest_change(settled=True)
+    if since > version:
+        return None
+    if since and not ReferenceChange.objects.filter(id__lte=since).exists():
+        return None
+    changed = {}
+    changes = ReferenceChange.objects.filter(id__gt=since, id__lte=version)
+    for kind, object_id in changes.values_list("kind", "object_id").iterator():
+        changed.setdefault(kind, set()).add(object_id)
+
+    delta = {"version": version, "since": since}
+    for kind in REFERENCE_DATA:
+        ids = changed.get(kind, set())
+        rows = _rows(kind, ids) if ids else []
+        delta[kind] = {
+            "updated": rows,
+            "deleted": sorted(ids - {row["id"] for row in rows}),
+        }
+    return _encode(delta), version
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from rest_framework import serializers
+
+from service.connections import invalidate_graph
+from service.models import Crew, Route, Airplane, Flight
+
+MAX_SCHEDULE_ROWS = 10000
+
+
+def count_occurrences(rule):
+    """Number of flights expand_recurrence would make, without expanding"""
+    days = (rule["end_date"] - rule["start_date"]).days + 1
+    weeks, rest = divmod(days, 7)
+    weekdays = set(rule["weekdays"])
+    first = rule["start_date"].weekday()
+    return weeks * len(weekdays) + sum(
+        (first + offset) % 7 in weekdays for offset in range(rest)
+    )
+
+
+def expand_recurrence(rule):
+    """Expands a recurrence rule into flight rows, one per matching day"""
+    rows = []
+    day = rule["start_date"]
+    while day <= rule["end_date"]:
+        if day.weekday() in rule["weekdays"]:
+            departure_time = datetime.combine(day, rule["departure_time"])
+            rows.append(
+                {
+                    "route": rule["route"],
+                    "airplane": rule["airplane"],
+                    "departure_time": departure_time,
+                    "arrival_time": departure_time + rule["duration"],
+                    "crew": rule.get("crew", []),
+                }
+            )
+        day += timedelta(days=1)
+    return rows
+
+
+def _existing_ids(model, ids):
+    return set(model.objects.filter(id__in=ids).values_list("id", flat=True))
+
+
+def _does_not_exist(pk):
+    message = serializers.PrimaryKeyRelatedField.default_error_messages[
+        "does_not_exist"
+    ]
+    return [message.format(pk_value=pk)]
+
+
+def validate_schedule(rows):
+    """
+    Validates a batch of flight rows with one query per related model.
+    Returns a list of per-row error dicts, empty when the batch is valid.
+    """
+    routes = _existing_ids(Route, {row["route"] for row in rows})
+    airplanes = _existing_ids(Airplane, {row["airplane"] for row in rows})
+    crews = _existing_ids(Crew, {crew for row in rows for crew in row["crew"]})
+
+    errors = []
+    for index, row in enumerate(rows):
+        row_errors = {}
+        if row["route"] not in routes:
+            row_errors["route"] = _does_not_exist(row["route"])
+        if row["airplane"] not in airplanes:
+            row_errors["airplane"] = _does_not_exist(row["airplane"])
+        missing_crew = [crew for crew in row["crew"] if crew not in crews]
+        if missing_crew:
+            row_errors["crew"] = _does_not_exist(missing_crew[0])
+        try:
+            Flight.validate_departure_arrival_time(
+                row["departure_time"],
+                row["arrival_time"],
+                serializers.ValidationError,
+            )
+        except serializers.ValidationError as error:
+            row_errors.update(error.detail)
+
+        if row_errors:
+            errors.append(
+                {"row": index, "departure_time": row["departure_time"], **row_errors}
+            )
+    return errors
+
+
+@transaction.atomic
+def create_schedule(rows):
+    """Inserts validated flight rows and their crews with two bulk inserts"""
+    flights = Flight.objects.bulk_create(
+        [
+            Flight(
+                route_id=row["route"],
+                airplane_id=row["airplane"],
+                departure_time=row["departure_time"],
+                arrival_time=row["arrival_time"],
+            )
+            for row in rows
+        ]
+    )
+    FlightCrew = Flight.crew.through
+    FlightCrew.objects.bulk_create(
+        [
+            FlightCrew(flight_id=flight.id, crew_id=crew)
+            for flight, row in zip(flights, rows)
+            for crew in set(row["crew"])
+        ]
+    )
+    # bulk_create sends no post_save signals
+    transaction.on_commit(invalidate_graph)
+    return flights
@@ -0,0 +1,103 @@
+import base64
+
+PLACEMENT_ANY = "any"
+PLACEMENT_TOGETHER = "together"
+PLACEMENT_SAME_ROW = "same_row"
+
+
+class SeatMap:
+    """Packed bitset of taken seats, one bit per (row, seat) of an airplane"""
+
+    def __init__(self, rows: int, seats_in_row: int, data: bytes = b""):
+        self.rows = rows
+        self.seats_in_row = seats_in_row
+        size = (rows * seats_in_row + 7) // 8
+        self._bits = bytearray(bytes(data or b"")[:size]).ljust(size, b"\0")
+
+    def _position(self, row: int, seat: int) -> tuple[int, int]:
+        index = (row - 1) * self.seats_in_row + (seat - 1)
+        return index >> 3, 1 << (index & 7)
+
+    def is_taken(self, row: int, seat: int) -> bool:
+        byte, mask = self._position(row, seat)
+        return bool(self._bits[byte] & mask)
+
+    def take(self, row: int, seat: int) -> None:
+        byte, mask = self._position(row, seat)
+        self._bits[byte] |= mask
+
+    def release(self, row: int, seat: int) -> None:
+        byte, mask = self._position(row, seat)
+        self._bits[byte] &= ~mask
+
+    def count(self) -> int:
+        return int.from_bytes(self._bits, "little").bit_count()
+
+    def taken_seats(self):
+        """Yields (row, seat) pairs of taken seats in row-major order"""
+        for byte_index, byte in enumerate(self._bits):
+            while byte:
+                low_bit = byte & -byte
+                index = byte_index * 8 + low_bit.bit_length() - 1
+                yield index // self.seats_in_row + 1, index % self.seats_in_row + 1
+                byte ^= low_bit
+
+    def find_seats(
+        self, count: int, placement: str = PLACEMENT_ANY, blocked=frozenset()
+    ) -> list[tuple[int, int]] | None:
+        """
+        Picks count free seats in a single pass over the grid.
+        The tightest run of adjacent seats that fits wins, so bigger gaps are
+        kept for bigger groups. Unless placement is "together" it falls back to
+        the first row with enough free seats, and unless it is "same_row"
+        to the first free seats of the flight.
+        Returns None if the seats can't be placed.
+        """
+        best_run = None
+        row_fit = None
+        scattered = []
+        for row in range(1, self.rows + 1):
+            free = []
+            run_start = None
+            for seat in range(1, self.seats_in_row + 2):
+                if (
+                    seat <= self.seats_in_row
+                    and not self.is_taken(row, seat)
+                    and (row, seat) not in blocked
+                ):
+                    free.append(seat)
+                    if run_start is None:
+                        run_start = seat
+                    if len(scattered) < count:
+                        scattered.append((row, seat))
+                    continue
+                if run_start is not None:
+                    length = seat - run_start
+                    if length == count:
+                        return [(row, run_start + i) for i in range(count)]
+                    if length > count and (best_run is None or length < best_run[0]):
+                        best_run = (length, row, run_start)
+                    run_start = None
+            if row_fit is None and len(free) >= count:
+                row_fit = [(row, seat) for seat in free[:count]]
+
+        if best_run is not None:
+            _, row, start = best_run
+            return [(row, start + i) for i in range(count)]
+        if placement == PLACEMENT_TOGETHER:
+            return None
+        if row_fit is not None:
+            return row_fit
+        if placement == PLACEMENT_SAME_ROW or len(scattered) < count:
+            return None
+        return scattered
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._bits)
+
+    def to_representation(self) -> dict:
+        return {
+            "rows": self.rows,
+            "seats_in_row": self.seats_in_row,
+            "occupancy": base64.b64encode(self._bits).decode(),
+        }
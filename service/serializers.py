@@ -1,5 +1,7 @@
-from django.db import transaction
+from django.core.files.storage import default_storage
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
+from rest_framework.validators import UniqueTogetherValidator
 
 from country.models import City
 from country.serializers import CityDetailSerializer
@@ -13,16 +15,28 @@ from service.models import (
     Flight,
     Ticket,
     Order,
+    SeatHold,
 )
+from service.booking import BookingEngine
+from service.holds import hold_seats
+from service.geo import great_circle_distances, MAX_BULK_ROUTES
+from service.scheduling import (
+    count_occurrences,
+    expand_recurrence,
+    MAX_SCHEDULE_ROWS,
+)
+from service.snapshot import SnapshotNamesMixin
+from service.seat_map import PLACEMENT_ANY, PLACEMENT_TOGETHER, PLACEMENT_SAME_ROW
+from service.sparse import SparseFieldsetMixin
 
 
-class CrewSerializer(serializers.ModelSerializer):
+class CrewSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Crew
         fields = ["id", "first_name", "last_name"]
 
 
-class AirportSerializer(serializers.ModelSerializer):
+class AirportSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     closest_big_city = serializers.SlugRelatedField(
         slug_field="id", queryset=City.objects.select_related("country")
     )
@@ -33,6 +47,8 @@ class AirportSerializer(serializers.ModelSerializer):
             "id",
             "name",
             "closest_big_city",
+            "latitude",
+            "longitude",
         )
 
 
@@ -45,64 +61,175 @@ class AirportImageSerializer(serializers.ModelSerializer):
         )
 
 
-class AirportListSerializer(AirportSerializer):
+class ImageRenditionsField(serializers.ReadOnlyField):
+    """Renditions of an image with their sizes and URLs"""
+
+    def to_representation(self, value):
+        request = self.context.get("request")
+        renditions = {}
+        for rendition, data in (value or {}).items():
+            url = default_storage.url(data["name"])
+            renditions[rendition] = {
+                "url": request.build_absolute_uri(url) if request else url,
+                "width": data["width"],
+                "height": data["height"],
+                "format": data["format"],
+            }
+        return renditions
+
+
+class AirportListSerializer(SnapshotNamesMixin, AirportSerializer):
     closest_big_city = serializers.SlugRelatedField(
         many=False, read_only=True, slug_field="name"
     )
+    image_renditions = ImageRenditionsField()
 
     class Meta:
         model = Airport
-        fields = ("id", "name", "closest_big_city", "image")
+        fields = (
+            "id",
+            "name",
+            "closest_big_city",
+            "latitude",
+            "longitude",
+            "image",
+            "image_renditions",
+        )
         read_only_fields = ("id", "image")
+        expandable_fields = {"closest_big_city": CityDetailSerializer}
+        snapshot_names = {"closest_big_city": "cities"}
 
 
 class AirportDetailSerializer(AirportSerializer):
     closest_big_city = CityDetailSerializer(many=False, read_only=True)
+    image_renditions = ImageRenditionsField()
 
     class Meta:
         model = Airport
-        fields = ("id", "name", "closest_big_city", "image")
+        fields = (
+            "id",
+            "name",
+            "closest_big_city",
+            "latitude",
+            "longitude",
+            "image",
+            "image_renditions",
+        )
         read_only_fields = ("id", "image")
 
 
-class RouteSerializer(serializers.ModelSerializer):
+class NearestAirportsQuerySerializer(serializers.Serializer):
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lon = serializers.FloatField(min_value=-180, max_value=180)
+    k = serializers.IntegerField(min_value=1, max_value=100, default=5)
+    radius = serializers.FloatField(
+        min_value=0, required=False, help_text="Search radius in km"
+    )
+
+
+class NearestAirportSerializer(AirportListSerializer):
+    distance = serializers.FloatField(read_only=True, help_text="Distance in km")
+
+    class Meta:
+        model = Airport
+        fields = AirportListSerializer.Meta.fields + ("distance",)
+
+
+class AutocompleteQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=63)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+
+class AutocompleteSerializer(serializers.Serializer):
+    kind = serializers.ChoiceField(choices=("airport", "city", "country"))
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    city = serializers.CharField(allow_null=True)
+    country = serializers.CharField(allow_null=True)
+
+
+class ReferenceDataQuerySerializer(serializers.Serializer):
+    since = serializers.IntegerField(
+        min_value=0,
+        required=False,
+        help_text="Version the client has, only changes since it are returned",
+    )
+
+
+class RouteSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     source = serializers.SlugRelatedField(
         slug_field="id", queryset=Airport.objects.select_related("closest_big_city")
     )
     destination = serializers.SlugRelatedField(
         slug_field="id", queryset=Airport.objects.select_related("closest_big_city")
     )
+    distance = serializers.IntegerField(
+        required=False, help_text="Computed from airport coordinates if omitted"
+    )
 
     class Meta:
         model = Route
         fields = ("id", "source", "destination", "distance")
 
+    def validate(self, attrs):
+        data = super(RouteSerializer, self).validate(attrs)
+        if self.instance is None and "distance" not in attrs:
+            source, destination = attrs["source"], attrs["destination"]
+            if not (source.coordinates and destination.coordinates):
+                raise serializers.ValidationError(
+                    {"distance": "Airports have no coordinates, distance is required."}
+                )
+            (distance,) = great_circle_distances(
+                [source.coordinates], [destination.coordinates]
+            )
+            data["distance"] = round(distance)
+        return data
+
+
+class RouteBulkRowSerializer(serializers.Serializer):
+    source = serializers.IntegerField()
+    destination = serializers.IntegerField()
+    distance = serializers.IntegerField(required=False)
+
+
+class RouteBulkSerializer(serializers.Serializer):
+    routes = RouteBulkRowSerializer(
+        many=True, allow_empty=False, max_length=MAX_BULK_ROUTES
+    )
+
 
-class RouteListSerializer(RouteSerializer):
+class RouteListSerializer(SnapshotNamesMixin, RouteSerializer):
     source = serializers.SlugRelatedField(many=False, read_only=True, slug_field="name")
     destination = serializers.SlugRelatedField(
         many=False, read_only=True, slug_field="name"
     )
 
+    class Meta(RouteSerializer.Meta):
+        expandable_fields = {
+            "source": AirportListSerializer,
+            "destination": AirportListSerializer,
+        }
+        snapshot_names = {"source": "airports", "destination": "airports"}
+
 
 class RouteDetailSerializer(RouteSerializer):
     source = AirportDetailSerializer(many=False, read_only=True)
     destination = AirportDetailSerializer(many=False, read_only=True)
 
 
-class AirplaneTypeSerializer(serializers.ModelSerializer):
+class AirplaneTypeSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = AirplaneType
         fields = ("id", "name")
 
 
-class AirCompanySerializer(serializers.ModelSerializer):
+class AirCompanySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = AirCompany
         fields = ("id", "name")
 
 
-class AirplaneSerializer(serializers.ModelSerializer):
+class AirplaneSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Airplane
         fields = (
@@ -114,9 +241,11 @@ class AirplaneSerializer(serializers.ModelSerializer):
             "airplane_type",
             "air_company",
         )
+        # Columns of properties, for querysets loading only rendered fields
+        sparse_sources = {"capacity": ("rows", "seats_in_row")}
 
 
-class AirplaneListSerializer(AirplaneSerializer):
+class AirplaneListSerializer(SnapshotNamesMixin, AirplaneSerializer):
     airplane_type = serializers.SlugRelatedField(
         many=False, read_only=True, slug_field="name"
     )
@@ -124,13 +253,23 @@ class AirplaneListSerializer(AirplaneSerializer):
         many=False, read_only=True, slug_field="name"
     )
 
+    class Meta(AirplaneSerializer.Meta):
+        expandable_fields = {
+            "airplane_type": AirplaneTypeSerializer,
+            "air_company": AirCompanySerializer,
+        }
+        snapshot_names = {
+            "airplane_type": "airplane_types",
+            "air_company": "air_companies",
+        }
+
 
 class AirplaneDetailSerializer(AirplaneSerializer):
     airplane_type = AirplaneTypeSerializer(many=False, read_only=True)
     air_company = AirCompanySerializer(many=False, read_only=True)
 
 
-class FlightSerializer(serializers.ModelSerializer):
+class FlightSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     route = serializers.SlugRelatedField(
         slug_field="id", queryset=Route.objects.select_related("source", "destination")
     )
@@ -172,7 +311,140 @@ class FlightListSerializer(FlightSerializer):
         )
 
 
-class TicketSerializer(serializers.ModelSerializer):
+class FlightScheduleRowSerializer(serializers.Serializer):
+    route = serializers.IntegerField()
+    airplane = serializers.IntegerField()
+    departure_time = serializers.DateTimeField()
+    arrival_time = serializers.DateTimeField()
+    crew = serializers.ListField(child=serializers.IntegerField(), default=list)
+
+
+class FlightRecurrenceSerializer(serializers.Serializer):
+    route = serializers.IntegerField()
+    airplane = serializers.IntegerField()
+    weekdays = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=6),
+        allow_empty=False,
+        help_text="Days of week, 0 is Monday",
+    )
+    departure_time = serializers.TimeField()
+    duration = serializers.DurationField()
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    crew = serializers.ListField(child=serializers.IntegerField(), default=list)
+
+    def validate(self, attrs):
+        data = super(FlightRecurrenceSerializer, self).validate(attrs)
+        if attrs["end_date"] < attrs["start_date"]:
+            raise serializers.ValidationError(
+                {"end_date": "End date can't be earlier than start date"}
+            )
+        return data
+
+
+class FlightScheduleSerializer(serializers.Serializer):
+    flights = FlightScheduleRowSerializer(many=True, required=False)
+    recurrence = FlightRecurrenceSerializer(required=False)
+
+    def validate(self, attrs):
+        data = super(FlightScheduleSerializer, self).validate(attrs)
+        rows = list(attrs.get("flights", []))
+        size = len(rows)
+        if "recurrence" in attrs:
+            # Counted first, an arbitrary date range isn't expanded
+            size += count_occurrences(attrs["recurrence"])
+        if not size:
+            raise serializers.ValidationError("Schedule doesn't contain any flights")
+        if size > MAX_SCHEDULE_ROWS:
+            raise serializers.ValidationError(
+                f"Schedule can't contain more than {MAX_SCHEDULE_ROWS} flights"
+            )
+        if "recurrence" in attrs:
+            rows += expand_recurrence(attrs["recurrence"])
+        data["rows"] = rows
+        return data
+
+
+class ConnectionSearchSerializer(serializers.Serializer):
+    source = serializers.IntegerField(help_text="Source airport id")
+    destination = serializers.IntegerField(help_text="Destination airport id")
+    departure = serializers.DateField(help_text="Departure date of the first leg")
+    max_legs = serializers.IntegerField(min_value=1, max_value=4, default=2)
+    min_connection = serializers.IntegerField(
+        min_value=0, default=60, help_text="Minimum connection time in minutes"
+    )
+    seats = serializers.IntegerField(min_value=1, default=1)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+
+class ConnectionLegSerializer(serializers.Serializer):
+    flight_id = serializers.IntegerField()
+    source_id = serializers.IntegerField()
+    source = serializers.CharField()
+    destination_id = serializers.IntegerField()
+    destination = serializers.CharField()
+    departure_time = serializers.DateTimeField()
+    arrival_time = serializers.DateTimeField()
+    distance = serializers.IntegerField()
+
+
+class ItinerarySerializer(serializers.Serializer):
+    legs = ConnectionLegSerializer(many=True)
+    departure_time = serializers.DateTimeField()
+    arrival_time = serializers.DateTimeField()
+    duration = serializers.DurationField()
+    distance = serializers.IntegerField()
+    seats_available = serializers.IntegerField()
+
+
+class PrefetchedFlightField(serializers.PrimaryKeyRelatedField):
+    """Resolves flights from the batch loaded once by TicketBatchSerializer"""
+
+    def to_internal_value(self, data):
+        batch = getattr(self.parent.parent, "flights", None)
+        if batch is None or isinstance(data, bool):
+            return super().to_internal_value(data)
+        try:
+            return batch[int(data)]
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+
+
+class TicketBatchSerializer(serializers.ListSerializer):
+    """Validates the tickets of an order against one fetch of their flights"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            flight_ids = set()
+            for ticket in data:
+                try:
+                    flight_ids.add(int(ticket["flight"]))
+                except (KeyError, TypeError, ValueError):
+                    continue
+            self.flights = Flight.objects.select_related("airplane").in_bulk(flight_ids)
+        tickets = super().to_internal_value(data)
+
+        # Seats repeated within the order get the per-ticket error of the
+        # UniqueTogetherValidator this replaces
+        message = UniqueTogetherValidator.message.format(
+            field_names=", ".join(Ticket._meta.unique_together[0])
+        )
+        seats = set()
+        errors = []
+        for ticket in tickets:
+            seat = (ticket["flight"].id, ticket["row"], ticket["seat"])
+            errors.append({"non_field_errors": [message]} if seat in seats else {})
+            seats.add(seat)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return tickets
+
+
+class TicketSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    flight = PrefetchedFlightField(queryset=Flight.objects.select_related("airplane"))
+
     def validate(self, attrs):
         data = super(TicketSerializer, self).validate(attrs)
         Ticket.validate_seat_row(
@@ -183,19 +455,32 @@ class TicketSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ticket
         fields = ("id", "row", "seat", "flight")
+        list_serializer_class = TicketBatchSerializer
+        # Seats are checked by TicketBatchSerializer within the order and by
+        # BookingEngine against other orders, under the flight row lock
+        validators = []
 
 
-class TicketSeatsSerializer(TicketSerializer):
-    class Meta:
-        model = Ticket
-        fields = ("row", "seat")
+class SeatSerializer(serializers.Serializer):
+    row = serializers.IntegerField()
+    seat = serializers.IntegerField()
+
+
+class SeatMapSerializer(serializers.Serializer):
+    rows = serializers.IntegerField()
+    seats_in_row = serializers.IntegerField()
+    occupancy = serializers.CharField(
+        help_text="Base64 bitset of taken seats, bit (row - 1) * seats_in_row "
+        "+ (seat - 1) counted from the lowest bit of the first byte"
+    )
 
 
 class FlightDetailSerializer(FlightSerializer):
     route = RouteDetailSerializer(many=False, read_only=True)
     crew = CrewSerializer(many=True, read_only=True)
     airplane = AirplaneDetailSerializer(many=False, read_only=True)
-    taken_seats = TicketSeatsSerializer(source="tickets", many=True, read_only=True)
+    taken_seats = serializers.SerializerMethodField()
+    seat_map = serializers.SerializerMethodField()
 
     class Meta:
         model = Flight
@@ -204,30 +489,111 @@ class FlightDetailSerializer(FlightSerializer):
             "route",
             "airplane",
             "taken_seats",
+            "seat_map",
             "departure_time",
             "arrival_time",
             "crew",
         )
 
+    @extend_schema_field(SeatSerializer(many=True))
+    def get_taken_seats(self, obj):
+        seats = set(obj.get_seat_map().taken_seats())
+        seats.update((hold.row, hold.seat) for hold in obj.seat_holds.all())
+        return [{"row": row, "seat": seat} for row, seat in sorted(seats)]
+
+    @extend_schema_field(SeatMapSerializer)
+    def get_seat_map(self, obj):
+        return obj.get_seat_map().to_representation()
+
+
+class SeatHoldSerializer(serializers.Serializer):
+    flight = serializers.PrimaryKeyRelatedField(
+        queryset=Flight.objects.select_related("airplane")
+    )
+    seats = SeatSerializer(many=True, allow_empty=False)
+    expires_at = serializers.DateTimeField(read_only=True)
+
+    def validate(self, attrs):
+        data = super(SeatHoldSerializer, self).validate(attrs)
+        seats = set()
+        for seat in attrs["seats"]:
+            Ticket.validate_seat_row(
+                seat["row"], seat["seat"], attrs["flight"], serializers.ValidationError
+            )
+            if (seat["row"], seat["seat"]) in seats:
+                raise serializers.ValidationError(
+                    {"seats": f"Seat {seat['seat']} in row {seat['row']} is repeated"}
+                )
+            seats.add((seat["row"], seat["seat"]))
+        return data
+
+    def create(self, validated_data):
+        seats = [(seat["row"], seat["seat"]) for seat in validated_data["seats"]]
+        expires_at = hold_seats(validated_data["user"], validated_data["flight"], seats)
+        return {**validated_data, "expires_at": expires_at}
+
+
+class SeatHoldListSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SeatHold
+        fields = ("id", "flight", "row", "seat", "expires_at")
+
 
 class TicketListSerializer(TicketSerializer):
     flight = FlightListSerializer(many=False, read_only=True)
 
 
-class OrderSerializer(serializers.ModelSerializer):
-    tickets = TicketSerializer(many=True, read_only=False, allow_empty=False)
+class SeatRequestSerializer(serializers.Serializer):
+    flight = serializers.PrimaryKeyRelatedField(
+        queryset=Flight.objects.select_related("airplane")
+    )
+    count = serializers.IntegerField(min_value=1)
+    placement = serializers.ChoiceField(
+        choices=(PLACEMENT_ANY, PLACEMENT_TOGETHER, PLACEMENT_SAME_ROW),
+        default=PLACEMENT_ANY,
+    )
+
+    def validate(self, attrs):
+        data = super(SeatRequestSerializer, self).validate(attrs)
+        airplane = attrs["flight"].airplane
+        if attrs["count"] > airplane.capacity:
+            raise serializers.ValidationError(
+                {"count": f"Airplane has only {airplane.capacity} seats"}
+            )
+        if (
+            attrs["placement"] != PLACEMENT_ANY
+            and attrs["count"] > airplane.seats_in_row
+        ):
+            raise serializers.ValidationError(
+                {"count": f"A row has only {airplane.seats_in_row} seats"}
+            )
+        return data
+
+
+class OrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    tickets = TicketSerializer(
+        many=True, read_only=False, allow_empty=False, required=False
+    )
+    seat_requests = SeatRequestSerializer(
+        many=True, allow_empty=False, required=False, write_only=True
+    )
 
     class Meta:
         model = Order
-        fields = ("id", "tickets", "created_at")
+        fields = ("id", "tickets", "seat_requests", "created_at")
+
+    def validate(self, attrs):
+        data = super(OrderSerializer, self).validate(attrs)
+        if not attrs.get("tickets") and not attrs.get("seat_requests"):
+            raise serializers.ValidationError(
+                {"tickets": "Choose tickets or request seats to be assigned"}
+            )
+        return data
 
-    @transaction.atomic
     def create(self, validated_data):
-        tickets_data = validated_data.pop("tickets")
-        order = Order.objects.create(**validated_data)
-        for ticket_data in tickets_data:
-            Ticket.objects.create(order=order, **ticket_data)
-        return order
+        tickets_data = validated_data.pop("tickets", [])
+        seat_requests = validated_data.pop("seat_requests", [])
+        return BookingEngine().book(validated_data, tickets_data, seat_requests)
 
 
 class OrderListSerializer(OrderSerializer):
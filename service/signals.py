@@ -0,0 +1,175 @@
+from django.db import transaction
+from django.db.models.signals import (
+    post_init,
+    pre_save,
+    post_save,
+    pre_delete,
+    post_delete,
+    m2m_changed,
+)
+from django.dispatch import receiver
+
+from country.models import Country, City
+from service.autocomplete import invalidate_index
+from service.cache import invalidate_flight, invalidate_all_flights
+from service.connections import invalidate_graph
+from service.geo import update_airports, update_city_airports
+from service.reference_data import record_change, record_set_null_changes
+from service.snapshot import refresh_snapshot
+from service.storage import acquire_blob, release_blob
+from service.inventory import rebuild_seat_inventory, update_seat_inventory
+from service.models import (
+    Crew,
+    Airport,
+    Route,
+    AirplaneType,
+    AirCompany,
+    Airplane,
+    Flight,
+    Ticket,
+)
+
+
+@receiver(post_save, sender=Ticket)
+def take_ticket_seat(sender, instance, created, **kwargs):
+    """Keep the flight seat map and seats_sold in step with new and edited tickets"""
+    seat = (instance.flight_id, instance.row, instance.seat)
+    loaded, instance._loaded_seat = getattr(instance, "_loaded_seat", None), seat
+    if created:
+        update_seat_inventory(instance.flight_id, taken=[(instance.row, instance.seat)])
+    elif loaded != seat:
+        # Unknown when the ticket wasn't loaded, the flight is rebuilt then too
+        flight_ids = {loaded[0] if loaded else None, instance.flight_id} - {None}
+        for flight_id in sorted(flight_ids):
+            rebuild_seat_inventory(flight_id)
+
+
+@receiver(post_delete, sender=Ticket)
+def release_ticket_seat(sender, instance, **kwargs):
+    """Release the seat of a deleted ticket"""
+    update_seat_inventory(instance.flight_id, released=[(instance.row, instance.seat)])
+
+
+@receiver([post_save, post_delete], sender=Airport)
+@receiver([post_save, post_delete], sender=Route)
+@receiver([post_save, post_delete], sender=Flight)
+def invalidate_connection_graph(sender, **kwargs):
+    """Drop the cached connection graph once the change is committed"""
+    transaction.on_commit(invalidate_graph)
+
+
+@receiver([post_save, post_delete], sender=Country)
+@receiver([post_save, post_delete], sender=City)
+@receiver([post_save, post_delete], sender=Airport)
+def invalidate_autocomplete_index(sender, **kwargs):
+    """Rebuild the name index on next lookup once the change is committed"""
+    transaction.on_commit(invalidate_index)
+
+
+def _file_name(value):
+    return getattr(value, "name", value) or ""
+
+
+@receiver([post_save, post_delete], sender=Country)
+@receiver([post_save, post_delete], sender=City)
+@receiver([post_save, post_delete], sender=Airport)
+@receiver([post_save, post_delete], sender=AirplaneType)
+@receiver([post_save, post_delete], sender=AirCompany)
+def record_reference_change(sender, instance, **kwargs):
+    """New reference data bundle version, clients fetch the row in deltas"""
+    record_change(sender, instance.pk)
+    transaction.on_commit(refresh_snapshot)
+
+
+@receiver(pre_delete, sender=Country)
+@receiver(pre_delete, sender=City)
+def record_reference_set_null(sender, instance, **kwargs):
+    """Rows losing their country or closest city are sent in deltas too"""
+    record_set_null_changes(instance)
+
+
+@receiver(post_init, sender=Airport)
+def remember_airport_image(sender, instance, **kwargs):
+    """Keep the stored image name, None when the field was deferred"""
+    if "image" in instance.__dict__:
+        instance._saved_image = _file_name(instance.__dict__["image"])
+    else:
+        instance._saved_image = None
+
+
+@receiver(pre_save, sender=Airport)
+def load_deferred_airport_image(sender, instance, **kwargs):
+    if instance._saved_image is None and instance.pk:
+        stored = Airport.objects.filter(pk=instance.pk).values_list("image", flat=True)
+        instance._saved_image = stored.first() or ""
+
+
+@receiver(post_save, sender=Airport)
+def count_airport_image_references(sender, instance, **kwargs):
+    """Move the reference from the previous content-addressed image to the new one"""
+    previous, current = instance._saved_image or "", _file_name(instance.image)
+    if previous != current:
+        acquire_blob(current)
+        release_blob(previous)
+    instance._saved_image = current
+
+
+@receiver(post_delete, sender=Airport)
+def release_airport_image(sender, instance, **kwargs):
+    release_blob(_file_name(instance.image))
+
+
+@receiver([post_save, post_delete], sender=Airport)
+def update_airport_geo_index(sender, instance, **kwargs):
+    """Move the airport in the nearest-airport index once committed"""
+    # The pk of a deleted instance is cleared before the commit
+    airport_id = instance.pk
+    transaction.on_commit(lambda: update_airports([airport_id]))
+
+
+@receiver(post_save, sender=City)
+def update_city_airports_geo_index(sender, instance, **kwargs):
+    """Airports without coordinates are placed at their city"""
+    transaction.on_commit(lambda: update_city_airports(instance.pk))
+
+
+@receiver([post_save, post_delete], sender=Flight)
+def invalidate_cached_flight(sender, instance, **kwargs):
+    invalidate_flight(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Ticket)
+def invalidate_cached_ticket_flight(sender, instance, **kwargs):
+    invalidate_flight(instance.flight_id)
+
+
+@receiver(m2m_changed, sender=Flight.crew.through)
+def invalidate_cached_flight_crew(sender, instance, reverse, **kwargs):
+    if reverse:
+        invalidate_all_flights()
+    else:
+        invalidate_flight(instance.pk)
+
+
+@receiver(post_save, sender=Airplane)
+def rebuild_airplane_seat_maps(sender, instance, created, **kwargs):
+    """Seat maps are laid out by rows and seats_in_row, redo them for a new layout"""
+    layout = (instance.rows, instance.seats_in_row)
+    loaded = getattr(instance, "_loaded_layout", None)
+    instance._loaded_layout = layout
+    if not created and loaded != layout:
+        for flight_id in instance.flights.order_by("id").values_list("id", flat=True):
+            rebuild_seat_inventory(flight_id)
+
+
+@receiver([post_save, post_delete], sender=Country)
+@receiver([post_save, post_delete], sender=City)
+@receiver([post_save, post_delete], sender=Airport)
+@receiver([post_save, post_delete], sender=Route)
+@receiver([post_save, post_delete], sender=AirplaneType)
+@receiver([post_save, post_delete], sender=AirCompany)
+@receiver([post_save, post_delete], sender=Airplane)
+@receiver([post_save, post_delete], sender=Crew)
+def invalidate_cached_flights(sender, **kwargs):
+    """Related objects are nested in many flights, so drop all of them"""
+    invalidate_all_flights()
@@ -0,0 +1,330 @@
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, SlugRelatedField
+
+from country.models import City, Country
+from service.models import AirCompany, AirplaneType, Airport
+from service.reference_data import latest_change
+
+MAGIC = b"AIRREF\x00\x01"
+
+# Tables in file order. Records are sorted by id, names point into the
+# string table, children are (first, count) slices of an index table.
+TABLES = (
+    "countries",
+    "cities",
+    "airports",
+    "airplane_types",
+    "air_companies",
+    "country_cities",
+    "city_airports",
+    "strings",
+)
+HEADER = struct.Struct("<8sQ" + "QQ" * len(TABLES))
+RECORDS = {
+    # id, name offset, name length, first and count of its cities
+    "countries": struct.Struct("<QIIII"),
+    # id, country id (0 for none), name, first and count of its airports
+    "cities": struct.Struct("<QQIIII"),
+    # id, city id (0 for none), name
+    "airports": struct.Struct("<QQII"),
+    "airplane_types": struct.Struct("<QII"),
+    "air_companies": struct.Struct("<QII"),
+    # record numbers in "cities" and "airports"
+    "country_cities": struct.Struct("<I"),
+    "city_airports": struct.Struct("<I"),
+}
+CHILDREN = {"country_cities": "cities", "city_airports": "airports"}
+# Position of the name offset in the records
+NAME_AT = {"countries": 1, "cities": 2, "airports": 2}
+ID = struct.Struct("<Q")
+CHECK_INTERVAL = 1.0
+
+
+class SnapshotWriter:
+    """Encodes reference data into the snapshot format"""
+
+    def __init__(self):
+        self.strings = bytearray()
+        self.string_offsets = {}
+
+    def string(self, value):
+        data = (value or "").encode()
+        if data not in self.string_offsets:
+            self.string_offsets[data] = len(self.strings)
+            self.strings += data
+        return self.string_offsets[data], len(data)
+
+    def build(self, version):
+        countries = list(Country.objects.order_by("id").values_list("id", "name"))
+        cities = list(
+            City.objects.order_by("id").values_list("id", "country_id", "name")
+        )
+        airports = list(
+            Airport.objects.order_by("id").values_list(
+                "id", "closest_big_city_id", "name"
+            )
+        )
+        named = {
+            "airplane_types": AirplaneType.objects.order_by("id"),
+            "air_companies": AirCompany.objects.order_by("id"),
+        }
+
+        country_cities = {}
+        for number, (_, country_id, _) in enumerate(cities):
+            country_cities.setdefault(country_id, []).append(number)
+        city_airports = {}
+        # Airports of a city in the order of Airport.Meta.ordering
+        for number in sorted(
+            range(len(airports)), key=lambda n: (airports[n][2], airports[n][0])
+        ):
+            city_airports.setdefault(airports[number][1], []).append(number)
+
+        tables = {name: bytearray() for name in TABLES}
+
+        def children(table, numbers):
+            first = len(tables[table]) // RECORDS[table].size
+            for number in numbers:
+                tables[table] += RECORDS[table].pack(number)
+            return first, len(numbers)
+
+        for country_id, name in countries:
+            tables["countries"] += RECORDS["countries"].pack(
+                country_id,
+                *self.string(name),
+                *children("country_cities", country_cities.get(country_id, [])),
+            )
+        for city_id, country_id, name in cities:
+            tables["cities"] += RECORDS["cities"].pack(
+                city_id,
+                country_id or 0,
+                *self.string(name),
+                *children("city_airports", city_airports.get(city_id, [])),
+            )
+        for airport_id, city_id, name in airports:
+            tables["airports"] += RECORDS["airports"].pack(
+                airport_id, city_id or 0, *self.string(name)
+            )
+        for table, queryset in named.items():
+            for object_id, name in queryset.values_list("id", "name"):
+                tables[table] += RECORDS[table].pack(object_id, *self.string(name))
+        tables["strings"] = self.strings
+
+        directory, offset = [], HEADER.size
+        for name in TABLES:
+            size = len(tables[name])
+            count = size // RECORDS[name].size if name in RECORDS else size
+            directory += [offset, count]
+            offset += size
+        header = HEADER.pack(MAGIC, version, *directory)
+        return header + b"".join(bytes(tables[name]) for name in TABLES)
+
+
+def write_snapshot(path):
+    """Writes a snapshot of the current version next to path and swaps it in"""
+    version, _ = latest_change()
+    data = SnapshotWriter().build(version)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        # Readers keep the mapping of the file they opened
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return version, len(data)
+
+
+class ReferenceSnapshot:
+    """
+    Read-only memory mapping of a snapshot file. Every worker mapping the
+    same file shares its pages, lookups are binary searches over the ids.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.inode = os.fstat(file.fileno()).st_ino
+        magic, self.version, *directory = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a reference data snapshot")
+        self._tables = {
+            name: (directory[2 * index], directory[2 * index + 1])
+            for index, name in enumerate(TABLES)
+        }
+        self._ids = {
+            name: _IdColumn(self._mmap, *self._tables[name], RECORDS[name])
+            for name in TABLES
+            if name not in CHILDREN and name != "strings"
+        }
+
+    def _record(self, table, number):
+        offset, _ = self._tables[table]
+        record = RECORDS[table]
+        return record.unpack_from(self._mmap, offset + number * record.size)
+
+    def _name(self, table, number):
+        record = self._record(table, number)
+        offset, length = record[NAME_AT.get(table, 1) :][:2]
+        start = self._tables["strings"][0] + offset
+        return self._mmap[start : start + length].decode()
+
+    def _find(self, table, object_id):
+        column = self._ids[table]
+        number = bisect_left(column, object_id)
+        if number < len(column) and column[number] == object_id:
+            return number
+        return None
+
+    def name(self, table, object_id):
+        """Name of a country, city, airport, airplane type or air company"""
+        number = self._find(table, object_id)
+        if number is None:
+            return None
+        return self._name(table, number)
+
+    def names(self, table, object_id):
+        """Names of the cities of a country or the airports of a city"""
+        parent = "countries" if table == "country_cities" else "cities"
+        number = self._find(parent, object_id)
+        if number is None:
+            return None
+        first, count = self._record(parent, number)[-2:]
+        child = CHILDREN[table]
+        return [
+            self._name(child, self._record(table, index)[0])
+            for index in range(first, first + count)
+        ]
+
+
+class _IdColumn:
+    """Sequence view of the ids of a table for bisect"""
+
+    def __init__(self, buffer, offset, count, record):
+        self.buffer, self.offset, self.count = buffer, offset, count
+        self.size = record.size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, number):
+        offset = self.offset + number * self.size
+        return ID.unpack_from(self.buffer, offset)[0]
+
+
+_snapshot = None
+_checked_at = 0.0
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot():
+    """
+    Snapshot at REFERENCE_SNAPSHOT_PATH, reopened when the file was
+    replaced (checked once per CHECK_INTERVAL). None without one.
+    """
+    global _snapshot, _checked_at
+    path = settings.REFERENCE_SNAPSHOT_PATH
+    if not path:
+        return None
+    if time.monotonic() - _checked_at < CHECK_INTERVAL:
+        return _snapshot
+    with _snapshot_lock:
+        if time.monotonic() - _checked_at >= CHECK_INTERVAL:
+            try:
+                inode = os.stat(path).st_ino
+            except FileNotFoundError:
+                _snapshot = None
+            else:
+                if _snapshot is None or _snapshot.inode != inode:
+                    _snapshot = ReferenceSnapshot(path)
+            _checked_at = time.monotonic()
+    return _snapshot
+
+
+def invalidate_snapshot():
+    global _snapshot, _checked_at
+    _snapshot, _checked_at = None, 0.0
+
+
+def refresh_snapshot():
+    """Regenerates the snapshot unless it already has the latest version"""
+    path = settings.REFERENCE_SNAPSHOT_PATH
+    if not path:
+        return
+    snapshot = get_snapshot()
+    if snapshot is None or snapshot.version != latest_change()[0]:
+        write_snapshot(path)
+        invalidate_snapshot()
+
+
+class SnapshotNameField(serializers.Field):
+    """
+    Name (or, for country_cities and city_airports, names) of a related
+    object read from the snapshot by the id in source. Objects newer than
+    the snapshot are read from the database.
+    """
+
+    def __init__(self, table, model, **kwargs):
+        self.table = table
+        self.model = model
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        snapshot = get_snapshot()
+        many = self.table in CHILDREN
+        found = None
+        if snapshot is not None:
+            found = (snapshot.names if many else snapshot.name)(self.table, value)
+        if found is not None:
+            return found
+        if many:
+            related = self.model._meta.get_field(
+                "country" if self.table == "country_cities" else "closest_big_city"
+            )
+            return list(
+                self.model.objects.filter(**{related.attname: value}).values_list(
+                    "name", flat=True
+                )
+            )
+        return (
+            self.model.objects.filter(pk=value).values_list("name", flat=True).first()
+        )
+
+
+class SnapshotNamesMixin:
+    """
+    With a snapshot, related fields named in Meta.snapshot_names
+    ({field: table}) render names from it, so the queryset needs no joins
+    or prefetches for them.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if get_snapshot() is None:
+            return fields
+        for name, table in getattr(self.Meta, "snapshot_names", {}).items():
+            field = fields.get(name)
+            if isinstance(field, ManyRelatedField):
+                model = Airport if table == "city_airports" else City
+                fields[name] = SnapshotNameField(table, model, source="id")
+            elif isinstance(field, SlugRelatedField):
+                related = self.Meta.model._meta.get_field(field.source or name)
+                fields[name] = SnapshotNameField(
+                    table, related.related_model, source=related.attname
+                )
+        return fields
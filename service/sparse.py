@@ -0,0 +1,267 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from django.utils.module_loading import import_string
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import serializers
+from rest_framework.relations import (
+    ManyRelatedField,
+    PrimaryKeyRelatedField,
+    SlugRelatedField,
+)
+
+SPARSE_FIELDSET_PARAMETERS = [
+    OpenApiParameter(
+        "fields",
+        type={"type": "string"},
+        description="Only return these fields, nested ones with a dot "
+        "(ex. ?fields=id,name,closest_big_city.name)",
+    ),
+    OpenApiParameter(
+        "expand",
+        type={"type": "string"},
+        description="Return these related objects in full instead of by name "
+        "(ex. ?expand=closest_big_city)",
+    ),
+]
+
+
+def parse_field_tree(value):
+    """Converts "id,city.name" into {"id": {}, "city": {"name": {}}}"""
+    tree = {}
+    for path in value.split(","):
+        node = tree
+        for name in filter(None, path.strip().split(".")):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def requested_fieldset(request):
+    """Keyword arguments of a SparseFieldsetMixin serializer from the query"""
+    params = request.query_params
+    return {
+        option: parse_field_tree(params[option])
+        for option in ("fields", "expand")
+        if option in params
+    }
+
+
+def _nested(field):
+    return field.child if isinstance(field, serializers.ListSerializer) else field
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer that renders only the requested fields, a tree as returned
+    by parse_field_tree, and expands the related fields named in
+    Meta.expandable_fields into nested serializers.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sparse_fields = fields
+        self.sparse_expand = expand or {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expandable = getattr(self.Meta, "expandable_fields", {})
+        for name, subtree in self.sparse_expand.items():
+            if name in expandable and name in fields:
+                fields[name] = self.expand_field(fields[name], expandable[name])
+            elif not isinstance(_nested(fields.get(name)), SparseFieldsetMixin):
+                raise serializers.ValidationError(
+                    {"expand": f"Field '{name}' can't be expanded"}
+                )
+
+        if self.sparse_fields is not None:
+            unknown = set(self.sparse_fields) - set(fields)
+            if unknown:
+                raise serializers.ValidationError(
+                    {"fields": f"Unknown fields: {', '.join(sorted(unknown))}"}
+                )
+            fields = {
+                name: field
+                for name, field in fields.items()
+                if name in self.sparse_fields
+            }
+
+        for name, field in fields.items():
+            nested = _nested(field)
+            if isinstance(nested, SparseFieldsetMixin):
+                nested.sparse_fields = (self.sparse_fields or {}).get(name) or None
+                nested.sparse_expand = self.sparse_expand.get(name, {})
+        return fields
+
+    @staticmethod
+    def expand_field(field, serializer_class):
+        if isinstance(serializer_class, str):
+            serializer_class = import_string(serializer_class)
+        kwargs = {"many": isinstance(field, ManyRelatedField), "read_only": True}
+        if field.source != field.field_name:
+            kwargs["source"] = field.source
+        return serializer_class(**kwargs)
+
+
+def _model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def _apply_plan(queryset, select, only, prefetch):
+    queryset = queryset.select_related(None).prefetch_related(None)
+    if select:
+        queryset = queryset.select_related(*sorted(select))
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if only is not None:
+        queryset = queryset.only(*sorted(only))
+    return queryset
+
+
+def _related_queryset(field, model_field):
+    """Queryset prefetching a reverse or many-to-many relation for field"""
+    model = model_field.related_model
+    queryset = model._default_manager.all()
+    nested = _nested(field)
+    if isinstance(nested, serializers.ModelSerializer):
+        select, only, prefetch = _plan(nested, model, "")
+    else:
+        child = getattr(field, "child_relation", None)
+        select, prefetch = set(), []
+        only = {model._meta.pk.name}
+        if isinstance(child, SlugRelatedField):
+            only.add(child.slug_field)
+        elif not isinstance(child, PrimaryKeyRelatedField):
+            only = None
+    if only is not None and model_field.one_to_many:
+        # Prefetched rows are matched to their owner by the foreign key
+        only.add(model_field.field.name)
+    return _apply_plan(queryset, select, only, prefetch)
+
+
+def _plan(serializer, model, prefix):
+    """
+    Joins, prefetches and columns (None for all) the rendered fields of a
+    model serializer read, with field names prefixed for nested ones.
+    """
+    select, only, prefetch = set(), {prefix + model._meta.pk.name}, []
+    sources = getattr(serializer.Meta, "sparse_sources", {})
+    complete = True
+    for name, field in serializer.fields.items():
+        if name in sources:
+            only.update(prefix + source for source in sources[name])
+            continue
+        current, path = model, prefix
+        attrs = field.source_attrs if field.source != "*" else []
+        for attr in attrs[:-1]:
+            model_field = _model_field(current, attr)
+            if model_field is None or not model_field.many_to_one:
+                current = None
+                break
+            select.add(path + attr)
+            only.add(path + attr)
+            current, path = model_field.related_model, f"{path}{attr}__"
+        model_field = _model_field(current, attrs[-1]) if current and attrs else None
+        if model_field is None:
+            complete = False
+            continue
+
+        if attrs[-1] == getattr(model_field, "attname", None) != model_field.name:
+            # Foreign key read by its id column
+            only.add(path + model_field.name)
+            continue
+
+        path += attrs[-1]
+        nested = _nested(field)
+        if not model_field.is_relation:
+            only.add(path)
+        elif model_field.concrete and (
+            model_field.many_to_one or model_field.one_to_one
+        ):
+            only.add(path)
+            if isinstance(nested, PrimaryKeyRelatedField):
+                continue
+            if isinstance(nested, SlugRelatedField):
+                if nested.slug_field != model_field.target_field.name:
+                    select.add(path)
+                    only.add(f"{path}__{nested.slug_field}")
+                continue
+            select.add(path)
+            if isinstance(nested, serializers.ModelSerializer):
+                nested_select, nested_only, nested_prefetch = _plan(
+                    nested, model_field.related_model, f"{path}__"
+                )
+                select |= nested_select
+                prefetch += nested_prefetch
+                only |= nested_only or set()
+        else:
+            prefetch.append(Prefetch(path, _related_queryset(field, model_field)))
+    return select, only if complete else None, prefetch
+
+
+def optimize_queryset(queryset, serializer):
+    """
+    Replaces the joins and prefetches of queryset with the ones the
+    serializer reads and loads only the columns it renders.
+    """
+    return _apply_plan(queryset, *_plan(serializer, queryset.model, ""))
+
+
+def prune_representation(data, fields):
+    """Keeps the fields of already rendered data, a dict or a list of them"""
+    if fields is None:
+        return data
+    if isinstance(data, list):
+        return [prune_representation(item, fields) for item in data]
+    if not isinstance(data, dict):
+        return data
+    return {
+        name: prune_representation(value, fields[name] or None)
+        for name, value in data.items()
+        if name in fields
+    }
+
+
+def _check_fieldset(serializer):
+    """Raises ValidationError for requested fields serializer doesn't have"""
+    for field in serializer.fields.values():
+        nested = _nested(field)
+        if isinstance(nested, SparseFieldsetMixin):
+            _check_fieldset(nested)
+
+
+def requested_fields(request, serializer_class):
+    """
+    ?fields= for data rendered in full (cached), checked against
+    serializer_class so unknown fields are rejected as in other views
+    """
+    fieldset = requested_fieldset(request)
+    _check_fieldset(serializer_class(**fieldset))
+    return fieldset.get("fields")
+
+
+class SparseFieldsetViewMixin:
+    """
+    Honours ?fields= and ?expand= in read actions, the queryset only joins,
+    prefetches and loads what the requested fields need.
+    """
+
+    sparse_actions = ("list", "retrieve")
+
+    def sparse_fieldset(self):
+        if self.action not in self.sparse_actions:
+            return {}
+        return requested_fieldset(self.request)
+
+    def get_serializer(self, *args, **kwargs):
+        return super().get_serializer(*args, **{**self.sparse_fieldset(), **kwargs})
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action in self.sparse_actions:
+            serializer = self.get_serializer_class()(
+                context=self.get_serializer_context(), **self.sparse_fieldset()
+            )
+            queryset = optimize_queryset(queryset, serializer)
+        return queryset
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import transaction
+from django.db.models import F
+
+BLOBS_DIR = "uploads/blobs/"
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores every file under the SHA-256 of its content, so the same image
+    uploaded twice is kept once and keeps its URL. Files are shared, their
+    references are counted in MediaBlob.
+    """
+
+    @staticmethod
+    def blob_name(digest, extension):
+        return f"{BLOBS_DIR}{digest[:2]}/{digest}{extension.lower()}"
+
+    @staticmethod
+    def is_blob(name):
+        return bool(name) and name.startswith(BLOBS_DIR)
+
+    @staticmethod
+    def digest(name):
+        """SHA-256 a blob name was derived from"""
+        return os.path.splitext(os.path.basename(name))[0]
+
+    def get_available_name(self, name, max_length=None):
+        # The final name only depends on the content, see _save
+        return name
+
+    def _save(self, name, content):
+        extension = os.path.splitext(name)[1]
+        directory = self.path(BLOBS_DIR)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        try:
+            hasher = hashlib.sha256()
+            with os.fdopen(fd, "wb") as temp_file:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    hasher.update(chunk)
+                    temp_file.write(chunk)
+            name = self.blob_name(hasher.hexdigest(), extension)
+            full_path = self.path(name)
+            if os.path.exists(full_path):
+                os.unlink(temp_path)
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                if self.file_permissions_mode is not None:
+                    os.chmod(temp_path, self.file_permissions_mode)
+                # Atomic, a concurrent upload of the same content writes the same bytes
+                os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return name
+
+    def delete(self, name):
+        """Keeps blobs that other records still reference"""
+        from service.models import MediaBlob
+
+        if MediaBlob.objects.filter(name=name, refcount__gt=1).exists():
+            return
+        super().delete(name)
+
+
+content_addressed_storage = ContentAddressedStorage()
+
+
+def airport_image_storage():
+    if settings.CONTENT_ADDRESSED_MEDIA:
+        return content_addressed_storage
+    return default_storage
+
+
+@transaction.atomic
+def acquire_blob(name):
+    """Counts a new reference to a content-addressed file"""
+    from service.models import MediaBlob
+
+    if not ContentAddressedStorage.is_blob(name):
+        return
+    blob, created = MediaBlob.objects.select_for_update().get_or_create(
+        name=name,
+        defaults={
+            "sha256": ContentAddressedStorage.digest(name),
+            "size": content_addressed_storage.size(name),
+            "refcount": 1,
+        },
+    )
+    if not created:
+        MediaBlob.objects.filter(pk=blob.pk).update(refcount=F("refcount") + 1)
+
+
+@transaction.atomic
+def release_blob(name):
+    """Drops a reference, the file and its renditions go with the last one"""
+    from service.images import rendition_names
+    from service.models import MediaBlob
+
+    if not ContentAddressedStorage.is_blob(name):
+        return
+    blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+    if blob is None:
+        return
+    if blob.refcount > 1:
+        MediaBlob.objects.filter(pk=blob.pk).update(refcount=F("refcount") - 1)
+        return
+    blob.delete()
+
+    def delete_unreferenced():
+        # Unless the same content was uploaded again in the meantime
+        if not MediaBlob.objects.filter(name=name).exists():
+            content_addressed_storage.delete(name)
+            for rendition in rendition_names(name):
+                default_storage.delete(rendition)
+
+    transaction.on_commit(delete_unreferenced)
@@ -1,17 +1,35 @@
+import hashlib
 import os
 import tempfile
+from io import BytesIO, StringIO
 
 from PIL import Image
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from service.models import Airport
-from service.tests.test_flight_api import sample_city, sample_airport
+from app.media import serve_media
+from service.autocomplete import invalidate_index
+from service.cache import SharedVersion
+from service.geo import invalidate_index as invalidate_geo_index
+from service.models import Airport, MediaBlob
+from service.storage import BLOBS_DIR
+from service.tests.test_flight_api import (
+    THROTTLE_IN_CACHE,
+    sample_country,
+    sample_city,
+    sample_airport,
+    use_temporary_flight_cache,
+)
 
 AIRPORT_URL = reverse("service:airport-list")
+AUTOCOMPLETE_URL = reverse("service:airport-autocomplete")
+NEAREST_URL = reverse("service:airport-nearest")
 
 
 def image_upload_url(airport_id):
@@ -98,3 +116,385 @@ class AirportImageUploadTests(TestCase):
         res = self.client.get(AIRPORT_URL)
 
         self.assertIn("image", res.data["results"][0].keys())
+
+    def upload_image(self, size=(1000, 500), render=True):
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as ntf:
+            Image.new("RGB", size).save(ntf, format="JPEG")
+            ntf.seek(0)
+            with self.captureOnCommitCallbacks(execute=render):
+                res = self.client.post(
+                    image_upload_url(self.airport.id),
+                    {"image": ntf},
+                    format="multipart",
+                )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.airport.refresh_from_db()
+        self.addCleanup(self.delete_renditions, dict(self.airport.image_renditions))
+
+    @staticmethod
+    def delete_renditions(renditions):
+        for rendition in renditions.values():
+            default_storage.delete(rendition["name"])
+
+    @override_settings(IMAGE_PIPELINE_WORKERS=0)
+    def test_upload_image_generates_renditions(self):
+        self.upload_image()
+
+        renditions = self.client.get(detail_url(self.airport.id)).data[
+            "image_renditions"
+        ]
+        self.assertEqual(
+            {
+                name: (rendition["width"], rendition["height"], rendition["format"])
+                for name, rendition in renditions.items()
+            },
+            {"thumbnail": (160, 80, "webp"), "medium": (800, 400, "webp")},
+        )
+        self.assertTrue(renditions["medium"]["url"].endswith("-medium.webp"))
+        listed = self.client.get(AIRPORT_URL).data["results"][0]
+        self.assertEqual(listed["image_renditions"], renditions)
+
+    @override_settings(IMAGE_PIPELINE_WORKERS=0)
+    def test_new_image_replaces_renditions(self):
+        self.upload_image()
+        old_renditions = self.airport.image_renditions
+        self.upload_image(size=(100, 100))
+
+        self.assertEqual(self.airport.image_renditions["medium"]["width"], 100)
+        for rendition in old_renditions.values():
+            self.assertFalse(default_storage.exists(rendition["name"]))
+
+    def test_backfill_image_renditions(self):
+        self.upload_image(size=(300, 600), render=False)
+        self.assertEqual(self.airport.image_renditions, {})
+
+        call_command("backfill_image_renditions", workers=1, stdout=StringIO())
+
+        self.airport.refresh_from_db()
+        self.addCleanup(self.delete_renditions, dict(self.airport.image_renditions))
+        self.assertEqual(self.airport.image_renditions["thumbnail"]["width"], 80)
+
+
+@override_settings(IMAGE_PIPELINE_WORKERS=0)
+class ContentAddressedImageTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_superuser(
+            "admin@myproject.com", "password"
+        )
+        self.client.force_authenticate(self.user)
+        self.airports = [
+            sample_airport(name="First"),
+            sample_airport(name="Second"),
+        ]
+
+    def upload(self, airport, color="red"):
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as ntf:
+            Image.new("RGB", (10, 10), color).save(ntf, format="JPEG")
+            ntf.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    image_upload_url(airport.id), {"image": ntf}, format="multipart"
+                )
+        airport.refresh_from_db()
+        self.addCleanup(self.delete_media, airport.image.name)
+        for rendition in airport.image_renditions.values():
+            self.addCleanup(self.delete_media, rendition["name"])
+        return airport.image.name
+
+    @staticmethod
+    def delete_media(name):
+        if os.path.exists(default_storage.path(name)):
+            os.remove(default_storage.path(name))
+
+    def test_same_image_stored_once(self):
+        first, second = (self.upload(airport) for airport in self.airports)
+
+        self.assertEqual(first, second)
+        self.assertTrue(first.startswith(BLOBS_DIR))
+        self.assertEqual(MediaBlob.objects.get(name=first).refcount, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload(self.airports[0], color="blue")
+            self.airports[1].delete()
+
+        self.assertFalse(MediaBlob.objects.filter(name=first).exists())
+        self.assertFalse(default_storage.exists(first))
+
+    def test_renditions_deleted_with_last_reference(self):
+        self.upload(self.airports[0])
+        renditions = [
+            rendition["name"]
+            for rendition in self.airports[0].image_renditions.values()
+        ]
+        self.assertTrue(all(default_storage.exists(name) for name in renditions))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.airports[0].delete()
+
+        self.assertFalse(any(default_storage.exists(name) for name in renditions))
+
+    def test_blob_served_as_immutable(self):
+        name = self.upload(self.airports[0])
+        request = RequestFactory().get(f"/media/{name}")
+
+        response = serve_media(request, name)
+        etag = response["ETag"]
+        cached = serve_media(
+            RequestFactory().get(f"/media/{name}", HTTP_IF_NONE_MATCH=etag), name
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(
+            etag, f'"{hashlib.sha256(default_storage.open(name).read()).hexdigest()}"'
+        )
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_dedupe_airport_images(self):
+        buffer = BytesIO()
+        Image.new("RGB", (10, 10), "green").save(buffer, format="JPEG")
+        for airport in self.airports:
+            name = default_storage.save(
+                f"uploads/airports/{airport.name}.jpg", ContentFile(buffer.getvalue())
+            )
+            Airport.objects.filter(pk=airport.pk).update(image=name)
+
+        call_command("dedupe_airport_images", stdout=StringIO())
+
+        names = set(Airport.objects.values_list("image", flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 2)
+        self.assertFalse(default_storage.exists("uploads/airports/First.jpg"))
+        self.addCleanup(self.delete_media, name)
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.name = default_storage.save(
+            "uploads/airports/serving.jpg", ContentFile(bytes(range(256)) * 4)
+        )
+        self.addCleanup(default_storage.delete, self.name)
+
+    def get(self, **headers):
+        response = serve_media(self.factory.get("/", **headers), self.name)
+        if response.streaming:
+            body = b"".join(response.streaming_content)
+        else:
+            body = response.content
+        response.close()
+        return response, body
+
+    def test_conditional_get(self):
+        response, body = self.get()
+        by_etag, _ = self.get(HTTP_IF_NONE_MATCH=response["ETag"])
+        by_date, _ = self.get(HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(body), 1024)
+        self.assertEqual(by_etag.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(by_etag["ETag"], response["ETag"])
+        self.assertEqual(by_date.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_byte_ranges(self):
+        response, body = self.get(HTTP_RANGE="bytes=256-511")
+        suffix, suffix_body = self.get(HTTP_RANGE="bytes=-10")
+        unsatisfiable, _ = self.get(HTTP_RANGE="bytes=2048-")
+        inverted, inverted_body = self.get(HTTP_RANGE="bytes=500-100")
+        stale, stale_body = self.get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"old"')
+
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response["Content-Range"], "bytes 256-511/1024")
+        self.assertEqual(response["Content-Length"], "256")
+        self.assertEqual(body, bytes(range(256)))
+        self.assertEqual(suffix_body, bytes(range(246, 256)))
+        self.assertEqual(
+            unsatisfiable.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+        )
+        self.assertEqual(unsatisfiable["Content-Range"], "bytes */1024")
+        self.assertEqual(inverted.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(inverted_body), 1024)
+        self.assertEqual(stale.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(stale_body), 1024)
+
+    @override_settings(MEDIA_OFFLOAD_HEADER="X-Accel-Redirect")
+    def test_offload_to_proxy(self):
+        response, body = self.get()
+
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.name}")
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(body, b"")
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_superuser(
+            "admin@myproject.com", "password"
+        )
+        self.client.force_authenticate(self.user)
+        country = sample_country(name="France")
+        self.city = sample_city(name="Paris", country=country)
+        self.airport = sample_airport(name="Orly", closest_big_city=self.city)
+
+    @THROTTLE_IN_CACHE
+    def test_fields_skip_joins(self):
+        with self.assertNumQueries(2):
+            res = self.client.get(AIRPORT_URL, {"fields": "id,name"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"], [{"id": self.airport.id, "name": "Orly"}])
+
+    def test_expand_and_nested_fields(self):
+        res = self.client.get(
+            AIRPORT_URL,
+            {"expand": "closest_big_city", "fields": "name,closest_big_city.country"},
+        )
+        detail = self.client.get(
+            detail_url(self.airport.id), {"fields": "closest_big_city.name"}
+        )
+
+        self.assertEqual(
+            res.data["results"],
+            [{"name": "Orly", "closest_big_city": {"country": "France"}}],
+        )
+        self.assertEqual(detail.data, {"closest_big_city": {"name": "Paris"}})
+
+    def test_country_cities_expanded(self):
+        res = self.client.get(
+            reverse("country:country-list"),
+            {"expand": "cities", "fields": "name,cities.name"},
+        )
+        names = self.client.get(reverse("country:country-list"), {"fields": "name"})
+
+        self.assertIn(
+            {"name": "France", "cities": [{"name": "Paris"}]}, res.data["results"]
+        )
+        self.assertIn({"name": "France"}, names.data["results"])
+
+    def test_unknown_fields_rejected(self):
+        unknown = self.client.get(AIRPORT_URL, {"fields": "id,runways"})
+        not_expandable = self.client.get(AIRPORT_URL, {"expand": "name"})
+
+        self.assertEqual(unknown.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(not_expandable.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AirportAutocompleteTests(TestCase):
+    def setUp(self):
+        use_temporary_flight_cache(self)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "testunique@tests.com", "unique_password"
+        )
+        self.client.force_authenticate(self.user)
+        country = sample_country(name="United Kingdom")
+        london = sample_city(name="London", country=country)
+        self.heathrow = sample_airport(name="London Heathrow", closest_big_city=london)
+        sample_airport(name="Gatwick (London)", closest_big_city=london)
+        sample_airport(name="John F. Kennedy", closest_big_city=sample_city())
+        invalidate_index()
+
+    def suggest(self, query, **params):
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": query, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [(item["kind"], item["name"]) for item in res.data]
+
+    def test_autocomplete_ranks_prefix_matches(self):
+        self.assertEqual(
+            self.suggest("lond"),
+            [
+                ("airport", "London Heathrow"),
+                ("city", "London"),
+                ("airport", "Gatwick (London)"),
+            ],
+        )
+        self.assertEqual(self.suggest("kenn"), [("airport", "John F. Kennedy")])
+        self.assertEqual(self.suggest("united k"), [("country", "United Kingdom")])
+
+    def test_autocomplete_fuzzy_matches(self):
+        self.assertEqual(self.suggest("heatrow"), [("airport", "London Heathrow")])
+        self.assertEqual(self.suggest("twick"), [("airport", "Gatwick (London)")])
+        self.assertEqual(self.suggest("zurich"), [])
+
+    def test_autocomplete_index_refreshed_on_change(self):
+        self.suggest("lond")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.heathrow.name = "Heathrow"
+            self.heathrow.save()
+
+        self.assertEqual(self.suggest("heath"), [("airport", "Heathrow")])
+
+    def test_autocomplete_index_refreshed_after_change_in_another_worker(self):
+        self.suggest("lond")
+        Airport.objects.filter(pk=self.heathrow.pk).update(name="Heathrow")
+
+        SharedVersion("autocomplete-index").bump()
+
+        self.assertEqual(self.suggest("heath"), [("airport", "Heathrow")])
+
+    @override_settings(AUTOCOMPLETE_BACKEND="database")
+    def test_autocomplete_database_backend(self):
+        self.assertEqual(
+            self.suggest("london"),
+            [("airport", "London Heathrow"), ("city", "London")],
+        )
+
+
+class NearestAirportTests(TestCase):
+    def setUp(self):
+        use_temporary_flight_cache(self)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "testunique@tests.com", "unique_password"
+        )
+        self.client.force_authenticate(self.user)
+        self.heathrow = sample_airport(
+            name="Heathrow", latitude=51.47, longitude=-0.4543
+        )
+        sample_airport(name="CDG", latitude=49.0097, longitude=2.5479)
+        sample_airport(name="JFK", latitude=40.6413, longitude=-73.7781)
+        sample_airport(name="Nowhere")
+        invalidate_geo_index()
+
+    def nearest(self, **params):
+        res = self.client.get(NEAREST_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [(airport["name"], round(airport["distance"])) for airport in res.data]
+
+    def test_nearest_airports(self):
+        london = {"lat": 51.5072, "lon": -0.1276}
+
+        self.assertEqual(self.nearest(**london, k=2), [("Heathrow", 23), ("CDG", 336)])
+        self.assertEqual(self.nearest(**london, radius=100), [("Heathrow", 23)])
+
+    def test_nearest_airports_follow_changes(self):
+        self.nearest(lat=0, lon=0)
+        city = sample_city(name="Sydney", latitude=-33.8688, longitude=151.2093)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.heathrow.latitude = self.heathrow.longitude = None
+            self.heathrow.closest_big_city = city
+            self.heathrow.save()
+
+        self.assertEqual(self.nearest(lat=-33.9, lon=151.2, k=1), [("Heathrow", 4)])
+
+    def test_nearest_airports_rebuilt_after_change_in_another_worker(self):
+        self.nearest(lat=0, lon=0)
+        Airport.objects.filter(name="Nowhere").update(latitude=-33.9, longitude=151.2)
+
+        SharedVersion("airport-geo").bump()
+
+        self.assertEqual(self.nearest(lat=-33.9, lon=151.2, k=1), [("Nowhere", 0)])
+
+    def test_deleted_airport_removed_from_nearest(self):
+        self.nearest(lat=0, lon=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.heathrow.delete()
+
+        self.assertEqual(self.nearest(lat=51.47, lon=-0.4543, k=1)[0][0], "CDG")
+
+    def test_nearest_airports_invalid_point(self):
+        res = self.client.get(NEAREST_URL, {"lat": 91, "lon": 0})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
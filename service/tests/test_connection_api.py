@@ -0,0 +1,146 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from service.cache import SharedVersion
+from service.connections import get_graph, invalidate_graph
+from service.models import Flight
+from service.tests.test_flight_api import (
+    sample_airport,
+    sample_route,
+    sample_flight,
+    use_temporary_flight_cache,
+)
+
+CONNECTIONS_URL = reverse("service:flight-connections")
+
+
+class ConnectionSearchApiTests(TestCase):
+    def setUp(self):
+        use_temporary_flight_cache(self)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "testunique@tests.com", "unique_password"
+        )
+        self.client.force_authenticate(self.user)
+
+        self.kyiv = sample_airport(name="Kyiv")
+        self.warsaw = sample_airport(name="Warsaw")
+        self.paris = sample_airport(name="Paris")
+        self.day = datetime.date.today() + datetime.timedelta(days=1)
+
+        kyiv_paris = sample_route(
+            source=self.kyiv, destination=self.paris, distance=2000
+        )
+        kyiv_warsaw = sample_route(
+            source=self.kyiv, destination=self.warsaw, distance=700
+        )
+        warsaw_paris = sample_route(
+            source=self.warsaw, destination=self.paris, distance=1400
+        )
+        self.direct = self.sample_flight(kyiv_paris, "10:00", "20:00")
+        self.first_leg = self.sample_flight(kyiv_warsaw, "08:00", "10:00")
+        self.second_leg = self.sample_flight(warsaw_paris, "11:30", "13:00")
+        self.tight_leg = self.sample_flight(warsaw_paris, "10:30", "12:00")
+
+        invalidate_graph()
+
+    @property
+    def whole_day(self):
+        start = datetime.datetime.combine(self.day, datetime.time.min)
+        return start, start + datetime.timedelta(days=1)
+
+    def sample_flight(self, route, departure, arrival):
+        return sample_flight(
+            route=route,
+            departure_time=datetime.datetime.combine(
+                self.day, datetime.time.fromisoformat(departure)
+            ),
+            arrival_time=datetime.datetime.combine(
+                self.day, datetime.time.fromisoformat(arrival)
+            ),
+        )
+
+    def search(self, **params):
+        defaults = {
+            "source": self.kyiv.id,
+            "destination": self.paris.id,
+            "departure": self.day.isoformat(),
+        }
+        defaults.update(params)
+        return self.client.get(CONNECTIONS_URL, defaults)
+
+    def test_itineraries_ranked_by_travel_time(self):
+        res = self.search()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [[leg["flight_id"] for leg in itinerary["legs"]] for itinerary in res.data],
+            [[self.first_leg.id, self.second_leg.id], [self.direct.id]],
+        )
+        self.assertEqual(res.data[0]["distance"], 2100)
+
+    def test_direct_only_with_single_leg(self):
+        res = self.search(max_legs=1)
+
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]["legs"][0]["flight_id"], self.direct.id)
+
+    def test_min_connection_time(self):
+        res = self.search(min_connection=20)
+
+        self.assertEqual(
+            res.data[0]["legs"][1]["flight_id"],
+            self.tight_leg.id,
+        )
+
+    def test_itineraries_without_seats_skipped(self):
+        Flight.objects.filter(pk=self.second_leg.pk).update(
+            seats_sold=self.second_leg.airplane.capacity
+        )
+
+        res = self.search()
+
+        self.assertEqual(len(res.data), 1)
+        self.assertEqual(res.data[0]["legs"][0]["flight_id"], self.direct.id)
+
+    def test_departed_flights_left_out_of_graph(self):
+        Flight.objects.filter(pk=self.direct.pk).update(
+            departure_time=datetime.datetime.now() - datetime.timedelta(hours=1)
+        )
+        invalidate_graph()
+
+        graph = get_graph()
+
+        self.assertEqual(
+            [leg.flight_id for leg in graph.departures(self.kyiv.id, *self.whole_day)],
+            [self.first_leg.id],
+        )
+
+    def test_search_bounded_by_paths_explored(self):
+        paths = get_graph().itineraries(
+            self.kyiv.id, self.paris.id, *self.whole_day, max_paths=2
+        )
+
+        self.assertEqual(
+            [[leg.flight_id for leg in path] for path in paths],
+            [[self.direct.id]],
+        )
+
+    def test_graph_rebuilt_after_change_in_another_worker(self):
+        get_graph()
+        self.sample_flight(self.direct.route, "07:00", "12:00")
+
+        SharedVersion("connection-graph").bump()
+        res = self.search(max_legs=1)
+
+        self.assertEqual(len(res.data), 2)
+
+    def test_search_params_validated(self):
+        res = self.search(max_legs=10)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,13 +1,19 @@
 import datetime
+import os
+import tempfile
 from unittest.mock import patch
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from country.models import Country, City
+from service.cache import FLIGHT_CACHE_ALIAS
 from service.models import (
     Airport,
     Route,
@@ -20,6 +26,28 @@ from service.models import (
 from service.serializers import FlightListSerializer, FlightDetailSerializer
 
 FLIGHT_URL = reverse("service:flight-list")
+FLIGHT_BULK_URL = reverse("service:flight-bulk")
+# Throttle counters in the cache, out of the queries the tests count
+THROTTLE_IN_CACHE = override_settings(THROTTLE_CACHE="default")
+
+
+def use_temporary_flight_cache(test):
+    """
+    Points the flights cache at an empty directory for the test, so nothing
+    cached by other tests or runs is read. Returns it as the CACHE_DIR.
+    """
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    flights = dict(
+        settings.CACHES[FLIGHT_CACHE_ALIAS],
+        LOCATION=os.path.join(directory.name, "flights"),
+    )
+    caches_setting = override_settings(
+        CACHES={**settings.CACHES, FLIGHT_CACHE_ALIAS: flights}
+    )
+    caches_setting.enable()
+    test.addCleanup(caches_setting.disable)
+    return directory.name
 
 
 def sample_country(**params):
@@ -131,6 +159,7 @@ class UnauthenticatedFlightApiTests(TestCase):
 
 class AuthenticatedFlightApiTests(TestCase):
     def setUp(self) -> None:
+        use_temporary_flight_cache(self)
         self.client = APIClient()
         self.user = get_user_model().objects.create_user(
             "testunique@tests.com", "unique_password"
@@ -229,6 +258,89 @@ class AuthenticatedFlightApiTests(TestCase):
             self.assertNotIn(serializer2.data, res.data["results"])
             self.assertNotIn(serializer3.data, res.data["results"])
 
+    def test_list_flight_cursor_pagination(self):
+        for days in range(1, 4):
+            departure_time = datetime.datetime.now() + datetime.timedelta(days=days)
+            sample_flight(
+                departure_time=departure_time,
+                arrival_time=departure_time + datetime.timedelta(hours=10),
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(FLIGHT_URL, {"pagination": "cursor", "page_size": 2})
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", res.data)
+        self.assertEquals(len(res.data["results"]), 2)
+        # Held seats are counted per flight, but the page isn't
+        self.assertFalse(
+            any(
+                "COUNT(*)" in query["sql"].upper() for query in queries.captured_queries
+            )
+        )
+
+        res = self.client.get(res.data["next"])
+
+        self.assertEquals(len(res.data["results"]), 1)
+        self.assertIsNone(res.data["next"])
+        self.assertIsNotNone(res.data["previous"])
+
+    def test_filter_flight_by_departure_window(self):
+        departure_time = datetime.datetime.now() + datetime.timedelta(days=1)
+        flights = [
+            sample_flight(
+                departure_time=departure_time + datetime.timedelta(days=days),
+                arrival_time=departure_time + datetime.timedelta(days=days, hours=3),
+            )
+            for days in range(4)
+        ]
+        window_start = flights[1].departure_time.date()
+
+        res = self.client.get(
+            FLIGHT_URL,
+            {
+                "departure_from": window_start.isoformat(),
+                "departure_to": (window_start + datetime.timedelta(days=1)).isoformat(),
+            },
+        )
+
+        self.assertEquals(res.status_code, status.HTTP_200_OK)
+        self.assertEquals(
+            [flight["id"] for flight in res.data["results"]],
+            [flights[1].id, flights[2].id],
+        )
+
+        res = self.client.get(
+            FLIGHT_URL, {"departure_to": flights[1].departure_time.isoformat()}
+        )
+
+        self.assertEquals(
+            [flight["id"] for flight in res.data["results"]], [flights[0].id]
+        )
+
+    def test_filter_flight_by_invalid_window(self):
+        res = self.client.get(FLIGHT_URL, {"arrival_from": "tomorrow"})
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_route_departure_window_uses_index_range_scan(self):
+        route = sample_route()
+        day = datetime.datetime.now() + datetime.timedelta(days=1)
+        queryset = Flight.objects.filter(
+            route=route,
+            departure_time__gte=day,
+            departure_time__lt=day + datetime.timedelta(days=1),
+        ).order_by()
+
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            plan = queryset.explain()
+
+        self.assertIn("flight_route_departure_idx", plan)
+        if connection.vendor == "sqlite":
+            self.assertIn("departure_time>? AND departure_time<?", plan)
+
     def test_retrieve_flight_detail(self):
         flight = sample_flight()
 
@@ -240,6 +352,21 @@ class AuthenticatedFlightApiTests(TestCase):
         self.assertEquals(res.status_code, status.HTTP_200_OK)
         self.assertEquals(res.data, serializer.data)
 
+    def test_flight_sparse_fields(self):
+        flight = sample_flight()
+
+        res = self.client.get(FLIGHT_URL, {"fields": "id,airplane"})
+        detail = self.client.get(detail_url(flight.id), {"fields": "id,route.distance"})
+        unknown = self.client.get(FLIGHT_URL, {"fields": "id,pilot"})
+
+        self.assertEqual(
+            res.data["results"], [{"id": flight.id, "airplane": flight.airplane.name}]
+        )
+        self.assertEqual(
+            detail.data, {"id": flight.id, "route": {"distance": flight.route.distance}}
+        )
+        self.assertEqual(unknown.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_create_flight_forbidden(self):
         route = sample_route()
         airplane = sample_airplane()
@@ -282,6 +409,7 @@ class AuthenticatedFlightApiTests(TestCase):
 
 class AdminFlightApiTests(TestCase):
     def setUp(self) -> None:
+        use_temporary_flight_cache(self)
         self.client = APIClient()
         self.user = get_user_model().objects.create_user(
             "admin@admin.com", "testpass", is_staff=True
@@ -343,3 +471,115 @@ class AdminFlightApiTests(TestCase):
         res = self.client.delete(url)
 
         self.assertEquals(res.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_bulk_create_recurring_schedule(self):
+        route = sample_route()
+        airplane = sample_airplane()
+        crew = sample_crew()
+        start_date = datetime.date.today() + datetime.timedelta(days=1)
+        payload = {
+            "recurrence": {
+                "route": route.id,
+                "airplane": airplane.id,
+                "weekdays": [0, 2, 4],
+                "departure_time": "08:30",
+                "duration": "02:15:00",
+                "start_date": start_date.isoformat(),
+                "end_date": (start_date + datetime.timedelta(days=13)).isoformat(),
+                "crew": [crew.id],
+            }
+        }
+
+        res = self.client.post(FLIGHT_BULK_URL, payload, format="json")
+
+        self.assertEquals(res.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(res.data["created"], 6)
+        flights = Flight.objects.filter(id__in=res.data["ids"])
+        self.assertEquals(flights.count(), 6)
+        for flight in flights:
+            self.assertIn(flight.departure_time.weekday(), (0, 2, 4))
+            self.assertEquals(
+                flight.arrival_time - flight.departure_time,
+                datetime.timedelta(hours=2, minutes=15),
+            )
+            self.assertEquals(list(flight.crew.all()), [crew])
+
+    def test_bulk_recurrence_too_long_rejected_before_expanding(self):
+        payload = {
+            "recurrence": {
+                "route": sample_route().id,
+                "airplane": sample_airplane().id,
+                "weekdays": list(range(7)),
+                "departure_time": "08:30",
+                "duration": "02:15:00",
+                "start_date": "2030-01-01",
+                "end_date": "9999-12-31",
+            }
+        }
+
+        with patch("service.serializers.expand_recurrence") as expand:
+            res = self.client.post(FLIGHT_BULK_URL, payload, format="json")
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        expand.assert_not_called()
+
+    @THROTTLE_IN_CACHE
+    def test_bulk_create_query_count_is_constant(self):
+        route = sample_route()
+        airplane = sample_airplane()
+        crew = sample_crew()
+        departure_time = datetime.datetime.now() + datetime.timedelta(days=1)
+
+        def payload(size):
+            return {
+                "flights": [
+                    {
+                        "route": route.id,
+                        "airplane": airplane.id,
+                        "departure_time": departure_time
+                        + datetime.timedelta(hours=hours),
+                        "arrival_time": departure_time
+                        + datetime.timedelta(hours=hours + 1),
+                        "crew": [crew.id],
+                    }
+                    for hours in range(size)
+                ]
+            }
+
+        with CaptureQueriesContext(connection) as small_batch:
+            self.client.post(FLIGHT_BULK_URL, payload(2), format="json")
+        with CaptureQueriesContext(connection) as large_batch:
+            res = self.client.post(FLIGHT_BULK_URL, payload(50), format="json")
+
+        self.assertEquals(res.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(len(small_batch), len(large_batch))
+
+    def test_bulk_create_reports_errors_per_row(self):
+        route = sample_route()
+        airplane = sample_airplane()
+        departure_time = datetime.datetime.now() + datetime.timedelta(days=1)
+        payload = {
+            "flights": [
+                {
+                    "route": route.id,
+                    "airplane": airplane.id,
+                    "departure_time": departure_time,
+                    "arrival_time": departure_time + datetime.timedelta(hours=1),
+                },
+                {
+                    "route": 0,
+                    "airplane": airplane.id,
+                    "departure_time": departure_time,
+                    "arrival_time": departure_time - datetime.timedelta(hours=1),
+                },
+            ]
+        }
+
+        res = self.client.post(FLIGHT_BULK_URL, payload, format="json")
+
+        self.assertEquals(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(len(res.data["errors"]), 1)
+        self.assertEquals(res.data["errors"][0]["row"], 1)
+        self.assertIn("route", res.data["errors"][0])
+        self.assertIn("arrival_time", res.data["errors"][0])
+        self.assertFalse(Flight.objects.exists())
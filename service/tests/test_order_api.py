@@ -1,18 +1,39 @@
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, IntegrityError, OperationalError
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status, serializers
 from rest_framework.test import APIClient
 
-from service.models import Order, Ticket
-from service.tests.test_flight_api import sample_flight, detail_url
+from service.booking import BookingEngine
+from service.cache import flight_cache
+from service.inventory import find_drifted_flights
+from service.models import Order, Ticket, Flight, IdempotencyKey
+from service.tests.test_flight_api import (
+    THROTTLE_IN_CACHE,
+    use_temporary_flight_cache,
+    sample_airplane,
+    sample_flight,
+    detail_url,
+)
 
 ORDER_URL = reverse("service:order-list")
 FLIGHT_URL = reverse("service:flight-list")
+SEAT_HOLD_URL = reverse("service:seathold-list")
 
 
 class OrderApiTests(TestCase):
     def setUp(self):
+        self.cache_dir = use_temporary_flight_cache(self)
         self.client = APIClient()
 
         self.flight = sample_flight()
@@ -60,3 +81,368 @@ class OrderApiTests(TestCase):
             response.data["results"][0]["tickets_available"],
             self.flight.airplane.capacity - 1,
         )
+
+    def test_flight_seats_sold_follows_ticket_writes(self):
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_sold, 1)
+
+        Ticket.objects.create(flight=self.flight, row=3, seat=1, order=self.order)
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_sold, 2)
+
+        self.order.delete()
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_sold, 0)
+
+    def test_reconcile_seat_counters_fixes_drift(self):
+        Flight.objects.filter(pk=self.flight.pk).update(seats_sold=42)
+
+        call_command("reconcile_seat_counters", stdout=StringIO())
+
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_sold, 1)
+
+    def test_saving_stale_flight_keeps_seat_inventory(self):
+        self.flight.save()
+
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_sold, 1)
+        self.assertEqual(list(self.flight.get_seat_map().taken_seats()), [(2, 5)])
+
+    def test_changing_airplane_rebuilds_seat_map(self):
+        self.flight.airplane = sample_airplane(name="Narrow", seats_in_row=5)
+        self.flight.save()
+
+        self.flight.refresh_from_db()
+        self.assertEqual(list(self.flight.get_seat_map().taken_seats()), [(2, 5)])
+
+    def test_editing_ticket_seat_moves_it_in_seat_map(self):
+        ticket = Ticket.objects.get(pk=self.ticket.pk)
+        ticket.row, ticket.seat = 3, 1
+        ticket.save()
+
+        self.flight.refresh_from_db()
+        self.assertEqual(list(self.flight.get_seat_map().taken_seats()), [(3, 1)])
+        self.assertEqual(self.flight.seats_sold, 1)
+
+    def test_changing_airplane_layout_rebuilds_seat_maps(self):
+        airplane = self.flight.airplane
+        airplane.seats_in_row = 8
+        airplane.save()
+
+        self.flight.refresh_from_db()
+        self.assertEqual(list(self.flight.get_seat_map().taken_seats()), [(2, 5)])
+        self.assertEqual(self.flight.seats_sold, 1)
+
+    def test_out_of_range_ticket_isnt_drift(self):
+        Ticket.objects.bulk_create(
+            [Ticket(flight=self.flight, row=999, seat=1, order=self.order)]
+        )
+        call_command("reconcile_seat_counters", stdout=StringIO())
+
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_sold, 1)
+        self.assertEqual(list(find_drifted_flights()), [])
+
+    def test_flight_detail_seat_map(self):
+        response = self.client.get(detail_url(self.flight.id))
+
+        seat_map = response.data["seat_map"]
+        self.assertEqual(seat_map["rows"], self.flight.airplane.rows)
+        self.assertEqual(seat_map["seats_in_row"], self.flight.airplane.seats_in_row)
+        self.flight.refresh_from_db()
+        self.assertTrue(self.flight.get_seat_map().is_taken(2, 5))
+        self.assertFalse(self.flight.get_seat_map().is_taken(5, 2))
+
+    def test_order_taken_seat_rejected(self):
+        payload = {"tickets": [{"row": 2, "seat": 5, "flight": self.flight.id}]}
+
+        response = self.client.post(ORDER_URL, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            response.data["taken_seats"],
+            [{"flight": self.flight.id, "row": 2, "seat": 5}],
+        )
+        self.assertEqual(Ticket.objects.count(), 1)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_create_order_retries_deadlocks(self):
+        payload = {"tickets": [{"row": 1, "seat": 1, "flight": self.flight.id}]}
+        deadlock = OperationalError("database table is locked")
+
+        with patch.object(
+            BookingEngine, "_book", side_effect=[deadlock, self.order]
+        ) as book, patch("service.booking.time.sleep"):
+            response = self.client.post(ORDER_URL, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(book.call_count, 2)
+
+    def test_create_order_retries_only_seat_integrity_errors(self):
+        payload = {"tickets": [{"row": 1, "seat": 1, "flight": self.flight.id}]}
+        seat_taken = IntegrityError(
+            "UNIQUE constraint failed: service_ticket.flight_id, "
+            "service_ticket.row, service_ticket.seat"
+        )
+        cases = [
+            (seat_taken, 4, status.HTTP_409_CONFLICT),
+            (
+                IntegrityError("FOREIGN KEY constraint failed"),
+                1,
+                status.HTTP_409_CONFLICT,
+            ),
+            (
+                IntegrityError("NOT NULL constraint failed: service_order.user_id"),
+                1,
+                status.HTTP_400_BAD_REQUEST,
+            ),
+        ]
+        for error, attempts, status_code in cases:
+            with patch.object(BookingEngine, "_book", side_effect=error) as book, patch(
+                "service.booking.time.sleep"
+            ):
+                response = self.client.post(ORDER_URL, payload, format="json")
+
+            self.assertEqual(response.status_code, status_code)
+            self.assertEqual(book.call_count, attempts)
+
+    def test_flight_detail_cache_invalidated_by_booking(self):
+        url = detail_url(self.flight.id)
+        self.client.get(url)
+        hits = flight_cache.hits
+
+        response = self.client.get(url)
+
+        self.assertEqual(flight_cache.hits, hits + 1)
+        self.assertEqual(len(response.data["taken_seats"]), 1)
+
+        Ticket.objects.create(flight=self.flight, row=1, seat=1, order=self.order)
+        response = self.client.get(url)
+
+        self.assertEqual(flight_cache.hits, hits + 1)
+        self.assertEqual(len(response.data["taken_seats"]), 2)
+
+    def test_flight_cache_version_bumped_by_another_process(self):
+        url = detail_url(self.flight.id)
+        self.client.get(url)
+        # Not seen by the signals, only the other process bumps the version
+        Flight.objects.filter(pk=self.flight.pk).update(seat_map=b"")
+        self.assertEqual(len(self.client.get(url).data["taken_seats"]), 1)
+
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import django; django.setup(); "
+                "from service.cache import flight_cache; "
+                f"flight_cache.bump_flight({self.flight.id})",
+            ],
+            check=True,
+            env={**os.environ, "CACHE_DIR": self.cache_dir},
+        )
+        response = self.client.get(url)
+
+        self.assertEqual(response.data["taken_seats"], [])
+
+    @THROTTLE_IN_CACHE
+    def test_create_order_query_count_is_constant(self):
+        def payload(seats):
+            return {
+                "tickets": [
+                    {"row": row, "seat": seat, "flight": self.flight.id}
+                    for row, seat in seats
+                ]
+            }
+
+        with CaptureQueriesContext(connection) as one_ticket:
+            response = self.client.post(ORDER_URL, payload([(1, 1)]), format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        family = [(row, seat) for row in (4, 5, 6) for seat in (1, 2, 3)]
+        with CaptureQueriesContext(connection) as nine_tickets:
+            response = self.client.post(ORDER_URL, payload(family), format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(one_ticket), len(nine_tickets))
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_sold, 11)
+        self.assertTrue(self.flight.get_seat_map().is_taken(6, 3))
+
+    def test_create_order_validation_errors(self):
+        cases = [
+            ({"row": 7, "seat": 1, "flight": self.flight.id}, "row"),
+            ({"row": 1, "seat": 11, "flight": self.flight.id}, "seat"),
+            ({"row": 1, "seat": 1, "flight": 0}, "flight"),
+        ]
+        for ticket, field in cases:
+            response = self.client.post(ORDER_URL, {"tickets": [ticket]}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(field, response.data["tickets"][0])
+
+        response = self.client.post(
+            ORDER_URL, {"tickets": [cases[0][0] | {"row": 1}] * 2}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data["tickets"],
+            [
+                {},
+                {
+                    "non_field_errors": [
+                        "The fields flight, row, seat must make a unique set."
+                    ]
+                },
+            ],
+        )
+        self.assertEqual(Ticket.objects.count(), 1)
+
+    def post_order(self, key, seat=1):
+        return self.client.post(
+            ORDER_URL,
+            {"tickets": [{"row": 1, "seat": seat, "flight": self.flight.id}]},
+            format="json",
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_create_order_idempotency_key_replays_response(self):
+        first = self.post_order("retry-1")
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.post_order("retry-1")
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        sql = " ".join(query["sql"] for query in queries.captured_queries)
+        self.assertNotIn('"service_ticket"', sql)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_create_order_idempotency_key_reused_for_other_request(self):
+        self.post_order("retry-1")
+
+        res = self.post_order("retry-1", seat=2)
+
+        self.assertEqual(res.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertFalse(Ticket.objects.filter(row=1, seat=2).exists())
+
+    def test_create_order_idempotency_key_released_on_error(self):
+        res = self.post_order("retry-1", seat=100)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_purge_idempotency_keys(self):
+        self.post_order("retry-1")
+        self.post_order("retry-2", seat=2)
+        IdempotencyKey.objects.filter(key="retry-1").update(
+            expires_at=datetime.now() - timedelta(seconds=1)
+        )
+
+        call_command("purge_idempotency_keys", stdout=StringIO())
+
+        self.assertEqual(
+            list(IdempotencyKey.objects.values_list("key", flat=True)), ["retry-2"]
+        )
+
+    def request_seats(self, count, placement):
+        return self.client.post(
+            ORDER_URL,
+            {
+                "seat_requests": [
+                    {"flight": self.flight.id, "count": count, "placement": placement}
+                ]
+            },
+            format="json",
+        )
+
+    def test_create_order_assigns_tightest_block(self):
+        res = self.request_seats(3, "together")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        seats = [(ticket["row"], ticket["seat"]) for ticket in res.data["tickets"]]
+        self.assertEqual(sorted(seats), [(2, 1), (2, 2), (2, 3)])
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_sold, 4)
+
+    def test_create_order_seat_request_placements(self):
+        order = Order.objects.create(user=self.user)
+        for row in range(1, 7):
+            for seat in range(2, 11, 2):
+                if (row, seat) != (2, 5):
+                    Ticket.objects.create(
+                        flight=self.flight, row=row, seat=seat, order=order
+                    )
+        self.client.post(
+            SEAT_HOLD_URL,
+            {"flight": self.flight.id, "seats": [{"row": 1, "seat": 1}]},
+            format="json",
+        )
+        self.client.force_authenticate(
+            get_user_model().objects.create_user("other@tests.com", "password")
+        )
+
+        together = self.request_seats(2, "together")
+        same_row = self.request_seats(2, "same_row")
+        scattered = self.request_seats(6, "any")
+
+        self.assertEqual(together.status_code, status.HTTP_409_CONFLICT)
+        seats = [(ticket["row"], ticket["seat"]) for ticket in same_row.data["tickets"]]
+        self.assertEqual(sorted(seats), [(1, 3), (1, 5)])
+        self.assertEqual(scattered.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(scattered.data["tickets"]), 6)
+
+    def test_create_order_requires_tickets_or_seat_requests(self):
+        res = self.client.post(ORDER_URL, {}, format="json")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.request_seats(11, "same_row")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @THROTTLE_IN_CACHE
+    def test_order_history_query_count_is_constant(self):
+        def list_orders():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(ORDER_URL, {"limit": 50})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return response, len(queries)
+
+        _, one_order = list_orders()
+        flights = [self.flight] + [sample_flight() for _ in range(3)]
+        for index in range(12):
+            order = Order.objects.create(user=self.user)
+            for flight in flights:
+                Ticket.objects.create(
+                    flight=flight, row=index // 10 + 3, seat=index % 10 + 1, order=order
+                )
+        response, many_orders = list_orders()
+
+        self.assertEqual(one_order, many_orders)
+        self.assertEqual(response.data["count"], 13)
+        flight = response.data["results"][-1]["tickets"][0]["flight"]
+        self.assertEqual(flight["tickets_available"], 59 - 12)
+
+    def test_order_history_keeps_ticket_ordering(self):
+        Ticket.objects.create(flight=self.flight, row=1, seat=1, order=self.order)
+
+        response = self.client.get(ORDER_URL, {"flights": "sideload"})
+
+        tickets = response.data["results"][0]["tickets"]
+        self.assertEqual(
+            [(ticket["row"], ticket["seat"]) for ticket in tickets], [(1, 1), (2, 5)]
+        )
+
+    def test_order_history_sideloads_flights(self):
+        order = Order.objects.create(user=self.user)
+        Ticket.objects.create(flight=self.flight, row=3, seat=1, order=order)
+
+        response = self.client.get(ORDER_URL, {"flights": "sideload"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        tickets = [
+            ticket for order in response.data["results"] for ticket in order["tickets"]
+        ]
+        self.assertEqual([ticket["flight"] for ticket in tickets], [self.flight.id] * 2)
+        self.assertEqual(len(response.data["flights"]), 1)
+        self.assertEqual(
+            response.data["flights"][0]["route"], "test_source - test_destination"
+        )
@@ -0,0 +1,180 @@
+import gzip
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from service.models import AirCompany, ReferenceChange
+from service.snapshot import get_snapshot, invalidate_snapshot
+from service.tests.test_flight_api import (
+    THROTTLE_IN_CACHE,
+    sample_airport,
+    sample_city,
+    sample_country,
+)
+
+REFERENCE_DATA_URL = reverse("service:reference-data-list")
+
+
+@override_settings(REFERENCE_CHANGE_LAG=timedelta(0))
+class ReferenceDataApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com", "testpassword"
+        )
+        self.client.force_authenticate(self.user)
+        self.airport = sample_airport(name="Gatwick")
+
+    def get(self, **params):
+        response = self.client.get(REFERENCE_DATA_URL, params)
+        return response, json.loads(response.content) if response.content else None
+
+    @THROTTLE_IN_CACHE
+    def test_bundle_is_compressed_and_cached(self):
+        response = self.client.get(REFERENCE_DATA_URL, HTTP_ACCEPT_ENCODING="gzip")
+        data = json.loads(gzip.decompress(response.content))
+        with self.assertNumQueries(1):
+            cached = self.client.get(
+                REFERENCE_DATA_URL, HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual([airport["name"] for airport in data["airports"]], ["Gatwick"])
+        self.assertEqual(data["countries"][0]["name"], sample_country().name)
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_bundle_rebuilt_after_change(self):
+        response, data = self.get()
+        AirCompany.objects.create(name="Skyways")
+        changed, changed_data = self.get()
+
+        self.assertNotEqual(changed["ETag"], response["ETag"])
+        self.assertGreater(changed_data["version"], data["version"])
+        self.assertEqual(changed_data["air_companies"][0]["name"], "Skyways")
+
+    def test_delta_since_version(self):
+        _, data = self.get()
+        city = sample_city(name="Brighton")
+        self.airport.name = "London Gatwick"
+        self.airport.save()
+
+        _, delta = self.get(since=data["version"])
+
+        self.assertEqual(delta["since"], data["version"])
+        self.assertEqual(delta["cities"]["updated"][0]["id"], city.id)
+        self.assertEqual(delta["airports"]["updated"][0]["name"], "London Gatwick")
+        self.assertEqual(delta["countries"], {"updated": [], "deleted": []})
+
+    def test_delta_lists_deleted_rows(self):
+        company = AirCompany.objects.create(name="Gone")
+        _, data = self.get()
+        company_id = company.id
+        company.delete()
+
+        _, delta = self.get(since=data["version"])
+        response, _ = self.get(since=delta["version"] + 1)
+
+        self.assertEqual(delta["air_companies"]["deleted"], [company_id])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_delta_lists_rows_set_null_by_delete(self):
+        city = sample_city(name="Bristol")
+        airport = sample_airport(name="Bristol", closest_big_city=city)
+        _, data = self.get()
+        city.delete()
+
+        _, delta = self.get(since=data["version"])
+
+        updated = {row["id"]: row for row in delta["airports"]["updated"]}
+        self.assertIsNone(updated[airport.id]["closest_big_city"])
+
+    @override_settings(REFERENCE_CHANGE_LAG=timedelta(hours=1))
+    def test_changes_served_after_lag(self):
+        _, data = self.get()
+        AirCompany.objects.create(name="Skyways")
+
+        _, delta = self.get(since=data["version"])
+
+        self.assertEqual(data["version"], 0)
+        self.assertEqual(delta["version"], 0)
+        self.assertEqual(delta["air_companies"]["updated"], [])
+
+    def test_purged_versions_unknown(self):
+        old_version = ReferenceChange.objects.latest("id").id
+        AirCompany.objects.create(name="Skyways")
+        ReferenceChange.objects.update(created_at=datetime.now() - timedelta(days=60))
+        _, data = self.get()
+
+        call_command("purge_reference_changes", stdout=StringIO())
+        purged, _ = self.get(since=old_version)
+        current, delta = self.get(since=data["version"])
+
+        self.assertEqual(ReferenceChange.objects.get().id, data["version"])
+        self.assertEqual(purged.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(current.status_code, status.HTTP_200_OK)
+        self.assertEqual(delta["version"], data["version"])
+
+
+class ReferenceSnapshotTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com", "testpassword"
+        )
+        self.client.force_authenticate(self.user)
+        self.city = sample_city(name="Lyon")
+        sample_airport(name="Saint-Exupery", closest_big_city=self.city)
+        sample_airport(name="Bron", closest_big_city=self.city)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(
+            REFERENCE_SNAPSHOT_PATH=os.path.join(directory.name, "reference.snap")
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(invalidate_snapshot)
+        call_command("build_reference_snapshot", stdout=StringIO())
+        invalidate_snapshot()
+
+    @THROTTLE_IN_CACHE
+    def test_names_resolved_without_joins(self):
+        with self.assertNumQueries(1):
+            res = self.client.get(reverse("country:city-detail", args=[self.city.id]))
+        cities = self.client.get(reverse("country:city-list"), {"limit": 50})
+
+        self.assertEqual(res.data["country"], self.city.country.name)
+        lyon = next(city for city in cities.data["results"] if city["name"] == "Lyon")
+        self.assertEqual(lyon["airports"], ["Bron", "Saint-Exupery"])
+
+    def test_snapshot_swapped_after_change(self):
+        version = get_snapshot().version
+        with self.captureOnCommitCallbacks(execute=True):
+            self.city.name = "Lyon Metropole"
+            self.city.save()
+
+        res = self.client.get(reverse("service:airport-list"), {"limit": 50})
+
+        self.assertGreater(get_snapshot().version, version)
+        self.assertEqual(
+            {airport["closest_big_city"] for airport in res.data["results"]},
+            {"Lyon Metropole"},
+        )
+
+    def test_objects_newer_than_snapshot_read_from_database(self):
+        sample_airport(name="Grenoble", closest_big_city=sample_city())
+
+        res = self.client.get(reverse("service:airport-list"), {"limit": 50})
+
+        names = {a["name"]: a["closest_big_city"] for a in res.data["results"]}
+        self.assertEqual(names["Grenoble"], sample_city().name)
@@ -6,9 +6,15 @@ from rest_framework.test import APIClient
 
 from service.models import Route
 from service.serializers import RouteListSerializer, RouteDetailSerializer
-from service.tests.test_flight_api import sample_route, sample_airport
+from service.tests.test_flight_api import (
+    THROTTLE_IN_CACHE,
+    sample_route,
+    sample_airport,
+    sample_city,
+)
 
 ROUTE_URL = reverse("service:route-list")
+ROUTE_BULK_URL = reverse("service:route-bulk")
 
 
 def detail_url(route_id):
@@ -166,3 +172,45 @@ class AdminRouteApiTests(TestCase):
         res = self.client.delete(url)
 
         self.assertEquals(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_create_route_distance_from_coordinates(self):
+        heathrow = sample_airport(name="Heathrow", latitude=51.47, longitude=-0.4543)
+        city = sample_city(name="New York", latitude=40.7128, longitude=-74.006)
+        jfk = sample_airport(name="JFK", closest_big_city=city)
+
+        res = self.client.post(
+            ROUTE_URL, {"source": heathrow.id, "destination": jfk.id}
+        )
+        no_coordinates = self.client.post(
+            ROUTE_URL, {"source": self.route.source.id, "destination": jfk.id}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertAlmostEqual(res.data["distance"], 5540, delta=10)
+        self.assertEqual(no_coordinates.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("distance", no_coordinates.data)
+
+    @THROTTLE_IN_CACHE
+    def test_bulk_create_routes(self):
+        heathrow = sample_airport(name="Heathrow", latitude=51.47, longitude=-0.4543)
+        paris = sample_airport(name="CDG", latitude=49.0097, longitude=2.5479)
+        routes = [
+            {"source": heathrow.id, "destination": paris.id},
+            {"source": paris.id, "destination": heathrow.id, "distance": 350},
+        ]
+
+        # Airports, the insert and the savepoint around it
+        with self.assertNumQueries(4):
+            res = self.client.post(ROUTE_BULK_URL, {"routes": routes}, format="json")
+        invalid = self.client.post(
+            ROUTE_BULK_URL,
+            {"routes": routes + [{"source": self.route.source.id, "destination": 0}]},
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["created"], 2)
+        distances = Route.objects.filter(id__in=res.data["ids"]).order_by("id")
+        self.assertEqual([route.distance for route in distances], [347, 350])
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(invalid.data["errors"][0]["row"], 2)
@@ -0,0 +1,155 @@
+import datetime
+import time
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from service.models import SeatHold, Ticket
+from service.tests.test_flight_api import (
+    sample_flight,
+    detail_url,
+    use_temporary_flight_cache,
+)
+
+SEAT_HOLD_URL = reverse("service:seathold-list")
+ORDER_URL = reverse("service:order-list")
+FLIGHT_URL = reverse("service:flight-list")
+
+
+class SeatHoldApiTests(TestCase):
+    def setUp(self):
+        use_temporary_flight_cache(self)
+        self.client = APIClient()
+        self.flight = sample_flight()
+        self.user = get_user_model().objects.create_user(
+            "testunique@tests.com", "unique_password"
+        )
+        self.other_user = get_user_model().objects.create_user(
+            "other@tests.com", "unique_password"
+        )
+        self.client.force_authenticate(self.user)
+
+    def hold(self, *seats):
+        return self.client.post(
+            SEAT_HOLD_URL,
+            {
+                "flight": self.flight.id,
+                "seats": [{"row": row, "seat": seat} for row, seat in seats],
+            },
+            format="json",
+        )
+
+    def test_held_seats_are_unavailable(self):
+        res = self.hold((1, 1), (1, 2))
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertIn("expires_at", res.data)
+        detail = self.client.get(detail_url(self.flight.id)).data
+        self.assertEqual(
+            detail["taken_seats"], [{"row": 1, "seat": 1}, {"row": 1, "seat": 2}]
+        )
+        flights = self.client.get(FLIGHT_URL).data["results"]
+        self.assertEqual(
+            flights[0]["tickets_available"], self.flight.airplane.capacity - 2
+        )
+
+    def test_seat_held_by_other_user_conflicts(self):
+        self.hold((1, 1))
+        self.client.force_authenticate(self.other_user)
+
+        res = self.hold((1, 1))
+        order = self.client.post(
+            ORDER_URL,
+            {"tickets": [{"row": 1, "seat": 1, "flight": self.flight.id}]},
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(order.status_code, status.HTTP_409_CONFLICT)
+
+    def test_order_converts_own_holds_into_tickets(self):
+        self.hold((1, 1))
+
+        res = self.client.post(
+            ORDER_URL,
+            {"tickets": [{"row": 1, "seat": 1, "flight": self.flight.id}]},
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(SeatHold.objects.exists())
+        self.assertTrue(Ticket.objects.filter(row=1, seat=1).exists())
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_sold, 1)
+
+    def test_expired_holds_swept_lazily(self):
+        self.hold((1, 1))
+        SeatHold.objects.update(
+            expires_at=datetime.datetime.now() - datetime.timedelta(seconds=1)
+        )
+        self.client.force_authenticate(self.other_user)
+
+        res = self.hold((1, 1))
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(SeatHold.objects.get().user, self.other_user)
+
+    def test_expired_unswept_holds_are_available(self):
+        self.hold((1, 1))
+        SeatHold.objects.update(
+            expires_at=datetime.datetime.now() - datetime.timedelta(seconds=1)
+        )
+
+        detail = self.client.get(detail_url(self.flight.id)).data
+        flights = self.client.get(FLIGHT_URL).data["results"]
+
+        self.assertEqual(detail["taken_seats"], [])
+        self.assertEqual(flights[0]["tickets_available"], self.flight.airplane.capacity)
+
+    def test_cached_flight_expires_with_its_holds(self):
+        with patch(
+            "service.holds.settings.SEAT_HOLD_TTL", datetime.timedelta(seconds=1)
+        ):
+            self.hold((1, 1))
+        self.client.get(detail_url(self.flight.id))
+
+        time.sleep(1.1)
+        detail = self.client.get(detail_url(self.flight.id)).data
+
+        self.assertEqual(detail["taken_seats"], [])
+
+    @override_settings(MAX_HOLDS_PER_USER=2)
+    def test_holds_per_user_limited(self):
+        self.assertEqual(self.hold((1, 1), (1, 2)).status_code, status.HTTP_201_CREATED)
+        # Renewing own holds stays within the limit
+        self.assertEqual(self.hold((1, 1)).status_code, status.HTTP_201_CREATED)
+
+        res = self.hold((1, 3))
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(SeatHold.objects.count(), 2)
+
+    def test_sweep_seat_holds_command(self):
+        self.hold((1, 1), (2, 2))
+        SeatHold.objects.filter(row=1).update(
+            expires_at=datetime.datetime.now() - datetime.timedelta(seconds=1)
+        )
+
+        call_command("sweep_seat_holds", stdout=StringIO())
+
+        self.assertEqual(list(SeatHold.objects.values_list("row", flat=True)), [2])
+
+    def test_release_hold(self):
+        self.hold((1, 1))
+        hold = self.client.get(SEAT_HOLD_URL).data["results"][0]
+
+        res = self.client.delete(reverse("service:seathold-detail", args=[hold["id"]]))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(SeatHold.objects.exists())
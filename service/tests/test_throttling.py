@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from service.checks import throttle_cache_check
+from service.models import ThrottleBucket
+from service.tests.test_flight_api import sample_flight
+from service.throttling import ScopedSlidingWindowThrottle
+
+RATES = {"test": "4/min", "orders": "1/min", "closed": "0/min"}
+
+
+@patch.object(ScopedSlidingWindowThrottle, "THROTTLE_RATES", RATES)
+class SlidingWindowThrottleTests(TestCase):
+    def setUp(self):
+        self.request = RequestFactory().get("/")
+        self.request.user = get_user_model().objects.create_user(
+            "test@test.com", "testpassword"
+        )
+        self.view = SimpleNamespace(throttle_scope="test")
+        cache.clear()
+
+    def hit(self, now):
+        """A request at now, seconds since the epoch, as a new worker would"""
+        throttle = ScopedSlidingWindowThrottle()
+        throttle.timer = lambda: now
+        allowed = throttle.allow_request(self.request, self.view)
+        return allowed, None if allowed else throttle.wait()
+
+    def check_sliding_window(self):
+        self.assertEqual([self.hit(60)[0] for _ in range(4)], [True] * 4)
+        self.assertEqual(self.hit(60), (False, 75))
+        # Half way through the next window, half of its 4 requests count
+        self.assertEqual([self.hit(150)[0] for _ in range(2)], [True, True])
+        self.assertEqual(self.hit(150), (False, 15))
+        self.assertEqual(self.hit(165), (True, None))
+
+    def test_sliding_window_in_database(self):
+        self.check_sliding_window()
+
+        self.assertEqual(
+            list(ThrottleBucket.objects.order_by("window").values_list("count")),
+            [(4,), (3,)],
+        )
+
+    @override_settings(THROTTLE_CACHE="default")
+    def test_sliding_window_in_cache(self):
+        self.check_sliding_window()
+
+        self.assertFalse(ThrottleBucket.objects.exists())
+
+    def test_view_scope_by_action(self):
+        client = APIClient()
+        client.force_authenticate(self.request.user)
+        flight = sample_flight()
+        order = {"tickets": [{"row": 1, "seat": 1, "flight": flight.id}]}
+
+        created = client.post(reverse("service:order-list"), order, format="json")
+        throttled = client.post(reverse("service:order-list"), order, format="json")
+        listed = client.get(reverse("service:order-list"))
+
+        self.assertEqual(created.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(throttled.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertTrue(1 <= int(throttled["Retry-After"]) <= 120)
+        self.assertEqual(listed.status_code, status.HTTP_200_OK)
+
+    def test_zero_rate_waits_a_window(self):
+        self.view.throttle_scope = "closed"
+
+        self.assertEqual(self.hit(60), (False, 60))
+
+    @override_settings(THROTTLE_CACHE=None, THROTTLE_DATABASE_FALLBACK=False)
+    def test_throttle_cache_required_without_fallback(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.hit(60)
+        self.assertEqual(
+            [error.id for error in throttle_cache_check(None)], ["service.E001"]
+        )
+
+    def test_purge_expired_buckets(self):
+        now = datetime.now()
+        for key, expires_at in [("old", now), ("new", now + timedelta(minutes=1))]:
+            ThrottleBucket.objects.create(key=key, window=0, expires_at=expires_at)
+
+        call_command("purge_throttle_buckets", stdout=StringIO())
+
+        self.assertEqual(
+            list(ThrottleBucket.objects.values_list("key", flat=True)), ["new"]
+        )
@@ -0,0 +1,169 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction, IntegrityError
+from django.db.models import F
+from rest_framework.throttling import (
+    AnonRateThrottle,
+    ScopedRateThrottle,
+    SimpleRateThrottle,
+    UserRateThrottle,
+)
+
+from service.models import ThrottleBucket
+
+
+class DatabaseBuckets:
+    """
+    Buckets in the ThrottleBucket table, a write per request, so only a
+    fallback for development and tests (THROTTLE_DATABASE_FALLBACK)
+    """
+
+    def hit(self, key, window, duration):
+        """
+        Counts a request for key in the window starting at window, returns
+        the counts of that window and of the previous one
+        """
+        buckets = ThrottleBucket.objects.filter(key=key)
+        if not buckets.filter(window=window).update(count=F("count") + 1):
+            try:
+                with transaction.atomic():
+                    ThrottleBucket.objects.create(
+                        key=key,
+                        window=window,
+                        count=1,
+                        expires_at=datetime.fromtimestamp(window + 2 * duration),
+                    )
+            except IntegrityError:
+                buckets.filter(window=window).update(count=F("count") + 1)
+        counts = dict(
+            buckets.filter(window__in=[window - duration, window]).values_list(
+                "window", "count"
+            )
+        )
+        return counts.get(window, 0), counts.get(window - duration, 0)
+
+    def release(self, key, window):
+        """Uncounts a request that was rejected"""
+        ThrottleBucket.objects.filter(key=key, window=window, count__gt=0).update(
+            count=F("count") - 1
+        )
+
+
+class CacheBuckets:
+    """Buckets as counters of a cache with atomic incr, ex. Redis or Memcached"""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def hit(self, key, window, duration):
+        name = f"{key}:{window}"
+        self.cache.add(name, 0, timeout=2 * duration)
+        try:
+            current = self.cache.incr(name)
+        except ValueError:
+            # Evicted between add and incr
+            self.cache.set(name, 1, timeout=2 * duration)
+            current = 1
+        return current, self.cache.get(f"{key}:{window - duration}", 0)
+
+    def release(self, key, window):
+        try:
+            self.cache.decr(f"{key}:{window}")
+        except ValueError:
+            pass
+
+
+def get_buckets():
+    """Store of the buckets, the THROTTLE_CACHE cache or the database"""
+    if settings.THROTTLE_CACHE:
+        return CacheBuckets(caches[settings.THROTTLE_CACHE])
+    if not settings.THROTTLE_DATABASE_FALLBACK:
+        raise ImproperlyConfigured("THROTTLE_CACHE must be set in production.")
+    return DatabaseBuckets()
+
+
+def purge_expired_buckets(batch_size=1000):
+    """Deletes buckets no window reads anymore, returns how many were deleted"""
+    expired = ThrottleBucket.objects.filter(expires_at__lte=datetime.now())
+    purged = 0
+    while True:
+        ids = list(expired.order_by("id").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return purged
+        purged += ThrottleBucket.objects.filter(id__in=ids).delete()[0]
+        if len(ids) < batch_size:
+            return purged
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """
+    SimpleRateThrottle counting requests in fixed-window buckets shared by
+    all workers (see get_buckets) instead of a per-process history list. The rate
+    over the last duration is the count of the current window plus the
+    previous one weighted by how much of it the sliding window still covers.
+    """
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        self.window = int(self.now // self.duration) * self.duration
+        buckets = get_buckets()
+        self.current, self.previous = buckets.hit(self.key, self.window, self.duration)
+        if self.estimate(self.current) <= self.num_requests:
+            return True
+        buckets.release(self.key, self.window)
+        self.current -= 1
+        return False
+
+    def estimate(self, current):
+        elapsed = (self.now - self.window) / self.duration
+        return self.previous * (1 - elapsed) + current
+
+    def wait(self):
+        """Seconds until a request fits in the limit again"""
+        if not self.num_requests:
+            # Nothing ever fits a zero rate, retry after a whole window
+            return self.duration
+        elapsed = (self.now - self.window) / self.duration
+        if self.current < self.num_requests:
+            # Enough of the previous window has to slide out
+            needed = 1 - (self.num_requests - self.current - 1) / self.previous
+            return max(needed - elapsed, 0) * self.duration
+        # Only in the next window, where the current one is the previous
+        needed = 1 - max(self.num_requests - 1, 0) / self.current
+        return (1 - elapsed + needed) * self.duration
+
+
+class AnonSlidingWindowThrottle(SlidingWindowThrottle, AnonRateThrottle):
+    pass
+
+
+class UserSlidingWindowThrottle(SlidingWindowThrottle, UserRateThrottle):
+    pass
+
+
+class ScopedSlidingWindowThrottle(ScopedRateThrottle, SlidingWindowThrottle):
+    """
+    Limits views by the scope of the action in their throttle_scopes
+    ({action: scope}), or by their throttle_scope. Views without one
+    aren't limited.
+    """
+
+    def allow_request(self, request, view):
+        scopes = getattr(view, "throttle_scopes", {})
+        self.scope = scopes.get(
+            getattr(view, "action", None), getattr(view, self.scope_attr, None)
+        )
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return SlidingWindowThrottle.allow_request(self, request, view)
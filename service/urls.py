@@ -10,6 +10,8 @@ from service.views import (
     AirplaneViewSet,
     FlightViewSet,
     OrderViewSet,
+    ReferenceDataViewSet,
+    SeatHoldViewSet,
 )
 
 router = routers.DefaultRouter()
@@ -21,6 +23,8 @@ router.register("air-companies", AirCompanyViewSet)
 router.register("airplanes", AirplaneViewSet)
 router.register("flights", FlightViewSet)
 router.register("orders", OrderViewSet)
+router.register("seat-holds", SeatHoldViewSet)
+router.register("reference-data", ReferenceDataViewSet, basename="reference-data")
 
 urlpatterns = [path("", include(router.urls))]
 
@@ -1,11 +1,24 @@
-from django.db.models import Prefetch, F, Count
+import gzip
+import re
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.dateparse import parse_date, parse_datetime
 from drf_spectacular.types import OpenApiTypes
-from drf_spectacular.utils import extend_schema, OpenApiParameter
-from rest_framework import viewsets, status, mixins
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
+from rest_framework import viewsets, status, mixins, serializers
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 
+from service.idempotency import (
+    IDEMPOTENCY_HEADER,
+    claim_key,
+    hash_request,
+    store_response,
+)
 from service.models import (
     Crew,
     Airport,
@@ -14,8 +27,15 @@ from service.models import (
     AirCompany,
     Airplane,
     Flight,
-    Ticket,
     Order,
+    SeatHold,
+)
+from service.order_history import OrderHistoryLoader
+from service.pagination import (
+    KeysetPaginationOptInMixin,
+    FlightKeysetPagination,
+    RouteKeysetPagination,
+    OrderKeysetPagination,
 )
 from service.serializers import (
     CrewSerializer,
@@ -28,6 +48,12 @@ from service.serializers import (
     OrderSerializer,
     OrderListSerializer,
     AirportListSerializer,
+    AutocompleteQuerySerializer,
+    AutocompleteSerializer,
+    NearestAirportsQuerySerializer,
+    NearestAirportSerializer,
+    ReferenceDataQuerySerializer,
+    RouteBulkSerializer,
     AirportImageSerializer,
     RouteListSerializer,
     AirportDetailSerializer,
@@ -36,7 +62,27 @@ from service.serializers import (
     AirplaneDetailSerializer,
     FlightListSerializer,
     FlightDetailSerializer,
+    ConnectionSearchSerializer,
+    ItinerarySerializer,
+    FlightScheduleSerializer,
+    SeatHoldSerializer,
+    SeatHoldListSerializer,
+)
+from service.holds import release_holds, with_live_holds, prefetch_live_holds
+from service.reference_data import get_bundle, get_delta
+from service.sparse import (
+    SPARSE_FIELDSET_PARAMETERS,
+    SparseFieldsetViewMixin,
+    prune_representation,
+    requested_fields,
 )
+from service.scheduling import validate_schedule, create_schedule
+from service.cache import flight_cache
+from service.connections import search_connections
+from service.autocomplete import autocomplete
+from service.images import schedule_renditions
+from service.geo import get_index as get_geo_index, validate_routes, create_routes
+from user.authentication import StatelessJWTAuthentication
 
 
 def _params_to_ints(qs):
@@ -44,7 +90,69 @@ def _params_to_ints(qs):
     return [int(str_id) for str_id in qs.split(",")]
 
 
+def _parse_window_bound(value, param, is_end=False):
+    """
+    Converts a date or datetime query param into a range bound.
+    A date as the end bound includes the whole day.
+    """
+    day = parse_date(value)
+    if day:
+        bound = datetime.combine(day, time.min)
+        return bound + timedelta(days=1) if is_end else bound
+    try:
+        bound = parse_datetime(value)
+    except ValueError:
+        bound = None
+    if bound is None:
+        raise serializers.ValidationError(
+            {param: "Enter a date (YYYY-MM-DD) or a datetime (YYYY-MM-DDThh:mm)."}
+        )
+    return bound
+
+
+def _time_window_filters(params, param, field):
+    """
+    Compiles ?<param>=, ?<param>_from= and ?<param>_to= into half-open
+    [from, to) range lookups, which can use the index on the column
+    """
+    filters = []
+    for name, lookup, is_end in [
+        (param, "gte", False),
+        (param, "lt", True),
+        (f"{param}_from", "gte", False),
+        (f"{param}_to", "lt", True),
+    ]:
+        value = params.get(name)
+        if value:
+            bound = _parse_window_bound(value, name, is_end)
+            filters.append({f"{field}__{lookup}": bound})
+    return filters
+
+
+ACCEPTS_GZIP_RE = re.compile(r"\bgzip\b")
+
+
+KEYSET_PAGINATION_PARAMETERS = [
+    OpenApiParameter(
+        "pagination",
+        type={"type": "string", "enum": ["cursor"]},
+        description="Opt into cursor pagination without total count "
+        "(ex. ?pagination=cursor)",
+    ),
+    OpenApiParameter(
+        "page_size",
+        type={"type": "number"},
+        description="Page size for cursor pagination, up to 100 (ex. ?page_size=50)",
+    ),
+]
+
+
+@extend_schema_view(
+    list=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS),
+    retrieve=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS),
+)
 class CrewViewSet(
+    SparseFieldsetViewMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
@@ -56,7 +164,12 @@ class CrewViewSet(
     permission_classes = (IsAdminUser,)
 
 
+@extend_schema_view(
+    list=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS),
+    retrieve=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS),
+)
 class AirportViewSet(
+    SparseFieldsetViewMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
@@ -66,12 +179,6 @@ class AirportViewSet(
     queryset = Airport.objects.all()
     serializer_class = AirportSerializer
 
-    def get_queryset(self):
-        queryset = self.queryset
-        if self.action == "list":
-            queryset = queryset.select_related("closest_big_city")
-        return queryset
-
     def get_serializer_class(self):
         if self.action == "list":
             return AirportListSerializer
@@ -79,8 +186,57 @@ class AirportViewSet(
             return AirportDetailSerializer
         if self.action == "upload_image":
             return AirportImageSerializer
+        if self.action == "autocomplete":
+            return AutocompleteSerializer
+        if self.action == "nearest":
+            return NearestAirportSerializer
         return AirportSerializer
 
+    @extend_schema(
+        parameters=[AutocompleteQuerySerializer],
+        responses=AutocompleteSerializer(many=True),
+    )
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="autocomplete",
+        authentication_classes=[StatelessJWTAuthentication],
+    )
+    def autocomplete(self, request):
+        """Endpoint for ranked airport, city and country name suggestions"""
+        params = AutocompleteQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        suggestions = autocomplete(
+            params.validated_data["q"], params.validated_data["limit"]
+        )
+        return Response(AutocompleteSerializer(suggestions, many=True).data)
+
+    @extend_schema(
+        parameters=[NearestAirportsQuerySerializer],
+        responses=NearestAirportSerializer(many=True),
+    )
+    @action(methods=["GET"], detail=False, url_path="nearest")
+    def nearest(self, request):
+        """Endpoint for the k nearest airports to a point, optionally within a radius"""
+        params = NearestAirportsQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        search = params.validated_data
+
+        nearest = get_geo_index().nearest(
+            search["lat"], search["lon"], k=search["k"], radius_km=search.get("radius")
+        )
+        airports = Airport.objects.select_related("closest_big_city").in_bulk(
+            [airport_id for airport_id, _ in nearest]
+        )
+        results = []
+        for airport_id, distance in nearest:
+            if airport_id in airports:
+                airport = airports[airport_id]
+                airport.distance = round(distance, 1)
+                results.append(airport)
+        serializer = self.get_serializer(results, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
     @action(
         methods=["POST"],
         detail=True,
@@ -93,10 +249,55 @@ class AirportViewSet(
         serializer = self.get_serializer(airport, data=request.data)
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        transaction.on_commit(lambda: schedule_renditions(airport))
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class ReferenceDataViewSet(viewsets.ViewSet):
+    authentication_classes = (StatelessJWTAuthentication,)
+
+    @extend_schema(
+        parameters=[ReferenceDataQuerySerializer], responses=OpenApiTypes.OBJECT
+    )
+    def list(self, request):
+        """
+        Endpoint for all countries, cities, airports, airplane types and
+        air companies in one gzipped bundle, or for the changes since a version
+        """
+        params = ReferenceDataQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        since = params.validated_data.get("since")
+
+        if since is None:
+            bundle = get_bundle()
+            body, compressed, etag = bundle.body, bundle.compressed, bundle.etag
+        else:
+            delta = get_delta(since)
+            if delta is None:
+                raise serializers.ValidationError(
+                    {"since": "Unknown version, fetch the whole bundle"}
+                )
+            body, version = delta
+            compressed, etag = None, f'"{version}-since-{since}"'
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content_type="application/json")
+            if ACCEPTS_GZIP_RE.search(request.headers.get("Accept-Encoding", "")):
+                response.content = compressed or gzip.compress(body)
+                response["Content-Encoding"] = "gzip"
+            else:
+                response.content = body
+        response["ETag"] = etag
+        response["Cache-Control"] = "no-cache"
+        patch_vary_headers(response, ["Accept-Encoding"])
+        return response
+
+
+@extend_schema_view(retrieve=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS))
 class RouteViewSet(
+    SparseFieldsetViewMixin,
+    KeysetPaginationOptInMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
@@ -105,13 +306,10 @@ class RouteViewSet(
 ):
     queryset = Route.objects.all()
     serializer_class = RouteSerializer
+    keyset_pagination_class = RouteKeysetPagination
 
     def get_queryset(self):
         queryset = self.queryset
-        if self.action == "list":
-            queryset = queryset.select_related(
-                "source__closest_big_city", "destination__closest_big_city"
-            )
 
         """Filtering by source and destination"""
 
@@ -129,8 +327,28 @@ class RouteViewSet(
             return RouteListSerializer
         if self.action == "retrieve":
             return RouteDetailSerializer
+        if self.action == "bulk":
+            return RouteBulkSerializer
         return RouteSerializer
 
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    @action(methods=["POST"], detail=False, url_path="bulk")
+    def bulk(self, request):
+        """Endpoint for creating a list of routes, distances default to great-circle"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        rows = serializer.validated_data["routes"]
+
+        errors = validate_routes(rows)
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        routes = create_routes(rows)
+        return Response(
+            {"created": len(routes), "ids": [route.id for route in routes]},
+            status=status.HTTP_201_CREATED,
+        )
+
     # Only for documentation purposes
     @extend_schema(
         parameters=[
@@ -144,13 +362,20 @@ class RouteViewSet(
                 type={"type": "string"},
                 description="Filter by destination  (ex. ?destination=pa)",
             ),
+            *KEYSET_PAGINATION_PARAMETERS,
+            *SPARSE_FIELDSET_PARAMETERS,
         ]
     )
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
 
+@extend_schema_view(
+    list=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS),
+    retrieve=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS),
+)
 class AirplaneTypeViewSet(
+    SparseFieldsetViewMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
@@ -162,7 +387,12 @@ class AirplaneTypeViewSet(
     permission_classes = (IsAdminUser,)
 
 
+@extend_schema_view(
+    list=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS),
+    retrieve=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS),
+)
 class AirCompanyViewSet(
+    SparseFieldsetViewMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
@@ -173,7 +403,12 @@ class AirCompanyViewSet(
     serializer_class = AirCompanySerializer
 
 
+@extend_schema_view(
+    list=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS),
+    retrieve=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS),
+)
 class AirplaneViewSet(
+    SparseFieldsetViewMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
@@ -183,12 +418,6 @@ class AirplaneViewSet(
     queryset = Airplane.objects.all()
     serializer_class = AirplaneSerializer
 
-    def get_queryset(self):
-        queryset = self.queryset
-        if self.action in ("list", "retrieve"):
-            queryset = queryset.select_related("airplane_type", "air_company")
-        return queryset
-
     def get_serializer_class(self):
         if self.action == "list":
             return AirplaneListSerializer
@@ -197,55 +426,88 @@ class AirplaneViewSet(
         return AirplaneSerializer
 
 
-class FlightViewSet(viewsets.ModelViewSet):
+class FlightViewSet(KeysetPaginationOptInMixin, viewsets.ModelViewSet):
     queryset = Flight.objects.all()
     serializer_class = FlightSerializer
+    keyset_pagination_class = FlightKeysetPagination
+    throttle_scopes = {"list": "flights", "retrieve": "flights"}
 
-    def get_queryset(self):
-        queryset = self.queryset
-
-        if self.action == "list":
-            queryset = (
-                queryset.select_related("airplane")
-                .annotate(
-                    tickets_available=F("airplane__rows") * F("airplane__seats_in_row")
-                                      - Count("tickets")
-                )
-                .order_by("id")
-                .prefetch_related("crew")
+    @staticmethod
+    def with_related(queryset):
+        """Joins everything the list and detail serializers read"""
+        return with_live_holds(
+            queryset.select_related(
+                "airplane__air_company",
+                "airplane__airplane_type",
+                "route__source__closest_big_city__country",
+                "route__destination__closest_big_city__country",
             )
+        ).prefetch_related("crew")
 
-        """Filtering by route, departure date, arrival date"""
+    def filter_flights(self, queryset):
+        """Filtering by route, departure and arrival time windows"""
 
         routes = self.request.query_params.get("routes")
-        departure_date = self.request.query_params.get("departure")
-        arrival_date = self.request.query_params.get("arrival")
         if routes:
             route_ids = _params_to_ints(routes)
             queryset = queryset.filter(route__id__in=route_ids)
-        if departure_date:
-            queryset = queryset.filter(departure_time__date=departure_date)
-        if arrival_date:
-            queryset = queryset.filter(arrival_time__date=arrival_date)
+        for param, field in [
+            ("departure", "departure_time"),
+            ("arrival", "arrival_time"),
+        ]:
+            for lookup in _time_window_filters(self.request.query_params, param, field):
+                queryset = queryset.filter(**lookup)
+        return queryset
 
-        return (
-            queryset.select_related(
-                "airplane__air_company",
-                "airplane__airplane_type",
-                "route__source__closest_big_city__country",
-                "route__destination__closest_big_city__country",
-            )
-            .prefetch_related("crew", "tickets")
-            .distinct()
-        )
+    def get_queryset(self):
+        queryset = self.queryset
+        if self.action == "list":
+            queryset = queryset.order_by("id")
+        if self.action == "retrieve":
+            queryset = queryset.prefetch_related(prefetch_live_holds())
+        return self.with_related(self.filter_flights(queryset))
 
     def get_serializer_class(self):
         if self.action == "list":
             return FlightListSerializer
         if self.action == "retrieve":
             return FlightDetailSerializer
+        if self.action == "connections":
+            return ItinerarySerializer
+        if self.action == "bulk":
+            return FlightScheduleSerializer
         return FlightSerializer
 
+    @extend_schema(
+        parameters=[ConnectionSearchSerializer],
+        responses=ItinerarySerializer(many=True),
+    )
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="connections",
+        authentication_classes=[StatelessJWTAuthentication],
+    )
+    def connections(self, request):
+        """Endpoint for searching itineraries of up to max_legs flights"""
+        params = ConnectionSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        search = params.validated_data
+        departure_from = datetime.combine(search["departure"], time.min)
+
+        itineraries = search_connections(
+            search["source"],
+            search["destination"],
+            departure_from,
+            departure_from + timedelta(days=1),
+            max_legs=search["max_legs"],
+            min_connection=timedelta(minutes=search["min_connection"]),
+            seats=search["seats"],
+            limit=search["limit"],
+        )
+        serializer = self.get_serializer(itineraries, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
     # Only for documentation purposes
     @extend_schema(
         parameters=[
@@ -266,30 +528,160 @@ class FlightViewSet(viewsets.ModelViewSet):
                 location=OpenApiParameter.QUERY,
                 description="Filter by arrival date (ex. ?arrival=2023-11-08)",
             ),
+            OpenApiParameter(
+                "departure_from",
+                type=OpenApiTypes.DATETIME,
+                location=OpenApiParameter.QUERY,
+                description="Departure at or after date/datetime "
+                "(ex. ?departure_from=2023-10-08T06:00)",
+            ),
+            OpenApiParameter(
+                "departure_to",
+                type=OpenApiTypes.DATETIME,
+                location=OpenApiParameter.QUERY,
+                description="Departure before datetime or on/before date "
+                "(ex. ?departure_to=2023-10-10)",
+            ),
+            OpenApiParameter(
+                "arrival_from",
+                type=OpenApiTypes.DATETIME,
+                location=OpenApiParameter.QUERY,
+                description="Arrival at or after date/datetime "
+                "(ex. ?arrival_from=2023-11-08)",
+            ),
+            OpenApiParameter(
+                "arrival_to",
+                type=OpenApiTypes.DATETIME,
+                location=OpenApiParameter.QUERY,
+                description="Arrival before datetime or on/before date "
+                "(ex. ?arrival_to=2023-11-08T18:00)",
+            ),
+            *KEYSET_PAGINATION_PARAMETERS,
+            SPARSE_FIELDSET_PARAMETERS[0],
         ]
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        fields = requested_fields(request, self.get_serializer_class())
+        # Pages through bare flight rows, only uncached flights are joined
+        queryset = self.filter_flights(
+            self.queryset.order_by("id").only("id", "departure_time")
+        )
+        page = self.paginate_queryset(queryset)
+        flight_ids = [flight.id for flight in (queryset if page is None else page)]
+
+        data = flight_cache.get_many(flight_ids, "list")
+        missing_ids = [flight_id for flight_id in flight_ids if flight_id not in data]
+        if missing_ids:
+            flights = list(self.with_related(Flight.objects.filter(id__in=missing_ids)))
+            serializer = self.get_serializer(flights, many=True)
+            fresh = {flight["id"]: flight for flight in serializer.data}
+            flight_cache.set_many(
+                fresh,
+                "list",
+                {flight.id: flight.holds_expire_at for flight in flights},
+            )
+            data.update(fresh)
+
+        results = [
+            prune_representation(data[flight_id], fields)
+            for flight_id in flight_ids
+            if flight_id in data
+        ]
+        if page is None:
+            return Response(results)
+        return self.get_paginated_response(results)
+
+    @extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS[:1])
+    def retrieve(self, request, *args, **kwargs):
+        fields = requested_fields(request, self.get_serializer_class())
+        try:
+            flight_id = int(kwargs[self.lookup_field])
+        except ValueError:
+            return super().retrieve(request, *args, **kwargs)
+
+        data = flight_cache.get_many([flight_id], "detail").get(flight_id)
+        if data is None:
+            flight = self.get_object()
+            data = self.get_serializer(flight).data
+            flight_cache.set_many(
+                {flight_id: data}, "detail", {flight_id: flight.holds_expire_at}
+            )
+        return Response(prune_representation(data, fields))
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    @action(methods=["POST"], detail=False, url_path="bulk")
+    def bulk(self, request):
+        """Endpoint for creating a list of flights or a recurring schedule at once"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        rows = serializer.validated_data["rows"]
+
+        errors = validate_schedule(rows)
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        flights = create_schedule(rows)
+        return Response(
+            {"created": len(flights), "ids": [flight.id for flight in flights]},
+            status=status.HTTP_201_CREATED,
+        )
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="cache-stats",
+        permission_classes=[IsAdminUser],
+    )
+    def cache_stats(self, request):
+        """Endpoint for hit/miss counters of this worker's flight cache"""
+        return Response(flight_cache.stats(), status=status.HTTP_200_OK)
+
+
+class SeatHoldViewSet(
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    queryset = SeatHold.objects.all()
+    serializer_class = SeatHoldSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return self.queryset.filter(
+            user=self.request.user, expires_at__gt=datetime.now()
+        )
+
+    def get_serializer_class(self):
+        if self.action == "create":
+            return SeatHoldSerializer
+        return SeatHoldListSerializer
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        release_holds([(instance.id, instance.flight_id)])
 
 
 class OrderViewSet(
-    mixins.ListModelMixin, mixins.CreateModelMixin, viewsets.GenericViewSet
+    KeysetPaginationOptInMixin,
+    mixins.ListModelMixin,
+    mixins.CreateModelMixin,
+    viewsets.GenericViewSet,
 ):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = (IsAuthenticated,)
+    keyset_pagination_class = OrderKeysetPagination
+    throttle_scopes = {"create": "orders"}
 
     def get_queryset(self):
         queryset = self.queryset.filter(user=self.request.user)
         if self.action == "list":
-            queryset = queryset.prefetch_related(
-                Prefetch(
-                    "tickets",
-                    queryset=Ticket.objects.select_related(
-                        "flight__route__destination", "flight__route__source"
-                    ).prefetch_related("flight__airplane", "flight__crew"),
-                )
-            )
+            # Tickets and flights are loaded by OrderHistoryLoader
+            queryset = queryset.only("id", "created_at")
         return queryset
 
     def get_serializer_class(self):
@@ -297,5 +689,65 @@ class OrderViewSet(
             return OrderListSerializer
         return OrderSerializer
 
+    @extend_schema(
+        parameters=KEYSET_PAGINATION_PARAMETERS
+        + [
+            OpenApiParameter(
+                "flights",
+                type={"type": "string", "enum": ["sideload"]},
+                description="Return flights once in 'flights' and reference "
+                "them by id from tickets",
+            ),
+            SPARSE_FIELDSET_PARAMETERS[0],
+        ]
+    )
+    def list(self, request, *args, **kwargs):
+        fields = requested_fields(request, self.get_serializer_class())
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        history = OrderHistoryLoader(queryset if page is None else page)
+        sideload = request.query_params.get("flights") == "sideload"
+        data = prune_representation(
+            history.to_representation(sideload=sideload), fields
+        )
+
+        if page is not None:
+            response = self.get_paginated_response(data)
+        elif sideload:
+            response = Response({"results": data})
+        else:
+            return Response(data)
+        if sideload:
+            response.data["flights"] = history.flights_representation()
+        return response
+
+    # Only for documentation purposes
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                IDEMPOTENCY_HEADER,
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.HEADER,
+                description="Retries with the same key replay the first response",
+            )
+        ]
+    )
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return super().create(request, *args, **kwargs)
+
+        with transaction.atomic():
+            record, replay = claim_key(request.user, key, hash_request(request))
+            if replay:
+                return Response(
+                    record.response_body,
+                    status=record.response_status,
+                    headers={"Idempotent-Replayed": "true"},
+                )
+            response = super().create(request, *args, **kwargs)
+            store_response(record, response)
+        return response
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import router
+from django.utils.translation import gettext as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+# Columns the permissions read, other fields are loaded on first access
+USER_STATE_FIELDS = ("id", "email", "is_active", "is_staff", "is_superuser")
+# Claim added to access tokens, see UserTokenObtainPairSerializer
+STAFF_CLAIM = "is_staff"
+
+
+class UserStateCache:
+    """
+    Size-bounded LRU of the USER_STATE_FIELDS of users by id, entries
+    expire after AUTH_USER_CACHE_TTL
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on invalidation, so a state read from the database before
+        # a change isn't stored after it
+        self.generation = 0
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, state = entry
+            if expires_at <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return state
+
+    def set(self, user_id, state, generation):
+        expires_at = time.monotonic() + settings.AUTH_USER_CACHE_TTL.total_seconds()
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[user_id] = (expires_at, state)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > settings.AUTH_USER_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            self.generation += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+user_cache = UserStateCache()
+
+
+def _user_id(validated_token):
+    try:
+        return validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken(_("Token contained no recognizable user identification"))
+
+
+def partial_user(model, state):
+    """
+    User instance with only the fields in state loaded, like one from
+    .only(), so it can be assigned to foreign keys and saved
+    """
+    names = [
+        field.attname for field in model._meta.concrete_fields if field.attname in state
+    ]
+    return model.from_db(
+        router.db_for_read(model), names, [state[name] for name in names]
+    )
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that reads the user state from user_cache and only
+    queries the database on a miss. Users are invalidated when saved.
+    """
+
+    def get_user(self, validated_token):
+        user_id = _user_id(validated_token)
+        state = user_cache.get(user_id)
+        if state is None:
+            generation = user_cache.generation
+            state = (
+                self.user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+                .values(*USER_STATE_FIELDS)
+                .first()
+            )
+            if state is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            user_cache.set(user_id, state, generation)
+
+        user = partial_user(self.user_model, state)
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+
+class StatelessJWTAuthentication(CachedJWTAuthentication):
+    """
+    Opt-in for read-only endpoints: safe requests get a user built from
+    the token claims without any lookup, so deactivation or a staff change
+    applies to them only once the access token expires. Other requests and
+    tokens without STAFF_CLAIM are authenticated as in the parent class.
+    """
+
+    def authenticate(self, request):
+        self.stateless = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if not self.stateless or STAFF_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        # Tokens are only issued to active users
+        return partial_user(
+            self.user_model,
+            {
+                "id": _user_id(validated_token),
+                "is_active": True,
+                "is_staff": validated_token[STAFF_CLAIM],
+            },
+        )
@@ -0,0 +1,53 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+class LoginOverloaded(Exception):
+    """LOGIN_MAX_PENDING logins are already queued or running"""
+
+
+class LoginPool:
+    """
+    Threads hashing and verifying passwords. At most max_pending jobs are
+    queued or running, more are rejected right away instead of waiting.
+    """
+
+    def __init__(self, workers, max_pending):
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="login")
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise LoginOverloaded()
+        try:
+            future = self._executor.submit(_run, fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+
+def _run(fn, *args, **kwargs):
+    # Pool threads keep their connections between jobs, like request threads
+    close_old_connections()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_login_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = LoginPool(settings.LOGIN_WORKERS, settings.LOGIN_MAX_PENDING)
+    return _pool
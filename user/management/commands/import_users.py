@@ -0,0 +1,58 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from user.provisioning import FORMATS, detect_format, import_users, read_rows
+
+
+class Command(BaseCommand):
+    """Django command that creates users in bulk from a CSV or JSON lines file"""
+
+    help = (
+        "Create users from a CSV file with a header or a file with a JSON "
+        "object per line (email, password, first_name, last_name, is_staff), "
+        "like POST /api/user/import/. Existing emails are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to the users file")
+        parser.add_argument(
+            "--format", choices=FORMATS, help="Defaults to the extension of the file"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Users looked up and inserted per query",
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        file_format = options["format"] or detect_format(options["path"])
+        if file_format not in FORMATS:
+            raise CommandError(f"Can't tell the format of {options['path']}")
+
+        reported = 0
+
+        def progress(report):
+            nonlocal reported
+            for error in report.errors[reported:]:
+                self.stderr.write(json.dumps(error))
+            reported = len(report.errors)
+            self.stdout.write(
+                f"Batch {report.batches}: {report.created} created, "
+                f"{report.skipped} skipped, {len(report.errors)} invalid"
+            )
+
+        with open(options["path"], newline="", encoding="utf-8-sig") as users_file:
+            report = import_users(
+                read_rows(users_file, file_format),
+                batch_size=options["batch_size"],
+                progress=progress,
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {report.created} user(s), skipped {report.skipped} "
+                f"existing, {len(report.errors)} invalid row(s)"
+            )
+        )
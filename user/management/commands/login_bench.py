@@ -0,0 +1,111 @@
+import asyncio
+import statistics
+import time
+from collections import Counter
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from rest_framework.views import APIView
+
+from user.login import LoginPool
+from user.serializers import UserTokenObtainPairSerializer
+
+EMAIL = "login-bench@example.com"
+PASSWORD = "login-bench-password"
+
+
+class Command(BaseCommand):
+    """Django command that measures logins against concurrent reads"""
+
+    help = (
+        "Send a burst of logins through the ASGI handler while other clients "
+        "list flights, with password hashing in the request thread and in "
+        "the login pool, and report login throughput and flight list latency"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=32)
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument(
+            "--reads", type=int, default=25, help="Flight lists per reader"
+        )
+        parser.add_argument("--workers", type=int, default=settings.LOGIN_WORKERS)
+        parser.add_argument(
+            "--max-pending", type=int, default=settings.LOGIN_MAX_PENDING
+        )
+
+    def handle(self, *args, **options):
+        """Handle the command"""
+        user, created = get_user_model().objects.get_or_create(email=EMAIL)
+        if created or not user.check_password(PASSWORD):
+            user.set_password(PASSWORD)
+            user.save()
+        token = UserTokenObtainPairSerializer.get_token(user).access_token
+
+        pool = LoginPool(options["workers"], options["max_pending"])
+        # Same middleware as under app/asgi.py
+        middleware = [
+            name
+            for name in settings.MIDDLEWARE
+            if getattr(import_string(name), "async_capable", False)
+        ]
+        scenarios = [
+            ("no logins", 0, 0),
+            ("request thread", options["logins"], 0),
+            ("login pool", options["logins"], options["workers"]),
+        ]
+        # Throttles would reject most of the burst
+        with patch.object(APIView, "throttle_classes", []), patch(
+            "user.views.get_login_pool", return_value=pool
+        ):
+            for label, logins, workers in scenarios:
+                with override_settings(
+                    LOGIN_WORKERS=workers,
+                    ALLOWED_HOSTS=["testserver"],
+                    MIDDLEWARE=middleware,
+                ):
+                    statuses, elapsed, latencies = asyncio.run(
+                        self.burst(logins, options, f"Bearer {token}")
+                    )
+                self.stdout.write(
+                    f"{label:>14}: {dict(statuses)} "
+                    f"{statuses[200] / elapsed:6.1f} logins/s, flight list "
+                    f"median {statistics.median(latencies) * 1000:7.1f} ms "
+                    f"max {max(latencies) * 1000:7.1f} ms"
+                )
+        self.stdout.write(self.style.SUCCESS("Done"))
+
+    @staticmethod
+    async def burst(logins, options, authorization):
+        statuses = Counter()
+        latencies = []
+
+        async def login():
+            response = await AsyncClient().post(
+                reverse("user:token_obtain_pair"),
+                {"email": EMAIL, "password": PASSWORD},
+                content_type="application/json",
+            )
+            statuses[response.status_code] += 1
+
+        async def read():
+            client = AsyncClient()
+            for _ in range(options["reads"]):
+                started = time.perf_counter()
+                await client.get(
+                    reverse("service:flight-list"),
+                    headers={"authorization": authorization},
+                )
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(login() for _ in range(logins)),
+            *(read() for _ in range(options["readers"])),
+        )
+        return statuses, time.perf_counter() - started, latencies
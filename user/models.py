@@ -48,3 +48,23 @@ class User(AbstractUser):
     REQUIRED_FIELDS = []
 
     objects = UserManager()
+
+
+class UserImport(models.Model):
+    """Users file uploaded for import, with its progress saved per batch"""
+
+    status = models.CharField(
+        max_length=10,
+        choices=[("running", "running"), ("done", "done"), ("failed", "failed")],
+        default="running",
+    )
+    file_name = models.CharField(max_length=255)
+    batches = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.file_name} ({self.status})"
@@ -0,0 +1,226 @@
+import csv
+import json
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import close_old_connections, transaction, IntegrityError
+from rest_framework import serializers
+
+from user.models import UserImport
+from user.serializers import UserImportSerializer
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "jsonl")
+
+
+def detect_format(name):
+    """Format of a users file by its extension, None if unknown"""
+    extension = os.path.splitext(name)[1].lstrip(".").lower()
+    return {"ndjson": "jsonl"}.get(extension, extension) if extension else None
+
+
+def read_rows(lines, file_format):
+    """
+    (line number, row) pairs of a CSV file with a header, or of a file with
+    a JSON object per line. Rows that aren't an object are None.
+    """
+    if file_format == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            # Empty cells are missing values, extra cells are dropped
+            yield reader.line_num, {
+                key: value for key, value in row.items() if key and value
+            }
+        return
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    max_workers=settings.USER_IMPORT_WORKERS
+                )
+    return _executor
+
+
+def hash_passwords(passwords):
+    """
+    Hashes of the passwords in the process pool, None gives an unusable
+    password. With USER_IMPORT_WORKERS = 0 they are hashed inline.
+    """
+    hashes = [make_password(None) for _ in passwords]
+    given = [index for index, password in enumerate(passwords) if password]
+    if not settings.USER_IMPORT_WORKERS:
+        hashed = [make_password(passwords[index]) for index in given]
+    else:
+        hashed = get_executor().map(
+            make_password, [passwords[index] for index in given], chunksize=8
+        )
+    for index, value in zip(given, hashed):
+        hashes[index] = value
+    return hashes
+
+
+class ImportReport:
+    """Progress of an import, errors are per-row dicts with their line"""
+
+    def __init__(self):
+        self.batches = 0
+        self.created = 0
+        self.skipped = 0
+        self.errors = []
+
+
+def import_users(rows, batch_size=1000, progress=None):
+    """
+    Creates users from (line number, row) pairs in batches of batch_size,
+    with one lookup of existing emails and one bulk insert per batch.
+    Invalid rows are reported and skipped, existing or repeated emails are
+    skipped. progress is called with the report after every batch.
+    """
+    report = ImportReport()
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        _import_batch(batch, report)
+        report.batches += 1
+        if progress:
+            progress(report)
+    return report
+
+
+def _import_batch(batch, report):
+    user_model = get_user_model()
+    # Fields are built once, not for every row
+    serializer = UserImportSerializer()
+    valid = {}
+    for line, row in batch:
+        if row is None:
+            report.errors.append({"line": line, "non_field_errors": ["Not an object."]})
+            continue
+        try:
+            data = dict(serializer.run_validation(row))
+        except serializers.ValidationError as error:
+            report.errors.append({"line": line, **error.detail})
+            continue
+        data["email"] = user_model.objects.normalize_email(data["email"])
+        if data["email"] in valid:
+            report.skipped += 1
+            continue
+        valid[data["email"]] = data
+
+    existing = user_model.objects.filter(email__in=list(valid)).values_list(
+        "email", flat=True
+    )
+    for email in existing:
+        del valid[email]
+        report.skipped += 1
+
+    rows = list(valid.values())
+    passwords = hash_passwords([row.pop("password", None) for row in rows])
+    users = [
+        user_model(password=password, **row) for row, password in zip(rows, passwords)
+    ]
+    while users:
+        try:
+            with transaction.atomic():
+                user_model.objects.bulk_create(users)
+            break
+        except IntegrityError:
+            # Some were created since the lookup, skip them and retry
+            existing = set(
+                user_model.objects.filter(
+                    email__in=[user.email for user in users]
+                ).values_list("email", flat=True)
+            )
+            if not existing:
+                raise
+            report.skipped += len(existing)
+            users = [user for user in users if user.email not in existing]
+    report.created += len(users)
+
+
+_import_executor = None
+
+
+def get_import_executor():
+    global _import_executor
+    if _import_executor is None:
+        with _executor_lock:
+            if _import_executor is None:
+                _import_executor = ThreadPoolExecutor(
+                    settings.USER_IMPORT_THREADS, thread_name_prefix="user-import"
+                )
+    return _import_executor
+
+
+def start_import(upload, file_format):
+    """
+    Saves an uploaded users file and imports it in the import threads,
+    returns its UserImport. With USER_IMPORT_THREADS = 0 it is imported
+    before returning.
+    """
+    job = UserImport.objects.create(file_name=upload.name)
+    with tempfile.NamedTemporaryFile(delete=False) as saved:
+        for chunk in upload.chunks():
+            saved.write(chunk)
+    if not settings.USER_IMPORT_THREADS:
+        run_import(job, saved.name, file_format)
+        return job
+
+    def run():
+        close_old_connections()
+        try:
+            run_import(job, saved.name, file_format)
+        finally:
+            close_old_connections()
+
+    get_import_executor().submit(run)
+    return job
+
+
+def run_import(job, path, file_format):
+    """Imports a saved users file, saving the report of job after every batch"""
+
+    def progress(report):
+        job.batches, job.created, job.skipped = (
+            report.batches,
+            report.created,
+            report.skipped,
+        )
+        job.errors = report.errors
+        job.save(
+            update_fields=["batches", "created", "skipped", "errors", "updated_at"]
+        )
+
+    job.status = "failed"
+    try:
+        with open(path, newline="", encoding="utf-8-sig") as users_file:
+            import_users(read_rows(users_file, file_format), progress=progress)
+        job.status = "done"
+    except Exception:
+        logger.exception("Import of %s failed", job.file_name)
+    finally:
+        os.remove(path)
+        job.save(update_fields=["status", "updated_at"])
@@ -0,0 +1,11 @@
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    """
+    drf-spectacular matches the simplejwt scheme on the exact class, so the
+    authentication classes of user.authentication are registered here
+    """
+
+    target_class = "user.authentication.CachedJWTAuthentication"
+    match_subclasses = True
@@ -1,6 +1,10 @@
-from django.contrib.auth import get_user_model, authenticate
-from django.utils.translation import gettext as _
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+
+from user.authentication import STAFF_CLAIM
+from user.models import UserImport
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -26,34 +30,54 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-class AuthTokenSerializer(serializers.Serializer):
-    email = serializers.CharField(label=_("Email"), write_only=True)
-    password = serializers.CharField(
-        label=_("Password"),
-        style={"input_type": "password"},
-        trim_whitespace=False,
-        write_only=True,
-    )
-    token = serializers.CharField(label=_("Token"), read_only=True)
+class UserImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = get_user_model()
+        fields = ["email", "password", "first_name", "last_name", "is_staff"]
+        extra_kwargs = {
+            # Existing emails are looked up once per batch
+            "email": {"validators": []},
+            "password": {"write_only": True, "required": False, "min_length": 5},
+        }
+
 
-    def validate(self, attrs):
-        email = attrs.get("email")
-        password = attrs.get("password")
+class UserImportUploadSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    format = serializers.ChoiceField(
+        choices=["csv", "jsonl"],
+        required=False,
+        help_text="Defaults to the extension of the file",
+    )
 
-        if email and password:
-            user = authenticate(
-                request=self.context.get("request"), email=email, password=password
+    def validate_file(self, upload):
+        if upload.size > settings.USER_IMPORT_MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError(
+                f"Files over {settings.USER_IMPORT_MAX_UPLOAD_SIZE} bytes are "
+                "imported with the import_users command."
             )
+        return upload
+
+
+class UserImportStatusSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserImport
+        fields = [
+            "id",
+            "status",
+            "file_name",
+            "batches",
+            "created",
+            "skipped",
+            "errors",
+            "started_at",
+            "updated_at",
+        ]
+
 
-            # The authenticate call simply returns None for is_active=False
-            # users. (Assuming the default ModelBackend authentication
-            # backend.)
-            if not user:
-                msg = _("Unable to log in with provided credentials.")
-                raise serializers.ValidationError(msg, code="authorization")
-        else:
-            msg = _('Must include "email" and "password".')
-            raise serializers.ValidationError(msg, code="authorization")
-
-        attrs["user"] = user
-        return attrs
+class UserTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        """Tokens carry the staff flag for StatelessJWTAuthentication"""
+        token = super().get_token(user)
+        token[STAFF_CLAIM] = user.is_staff
+        return token
@@ -0,0 +1,13 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from user.authentication import user_cache
+
+
+@receiver([post_save, post_delete], sender=get_user_model())
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Authentication reads the new state once the change is committed"""
+    user_id = instance.pk
+    transaction.on_commit(lambda: user_cache.invalidate(user_id))
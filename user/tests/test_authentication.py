@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from drf_spectacular.generators import SchemaGenerator
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from service.tests.test_flight_api import THROTTLE_IN_CACHE
+from user.authentication import user_cache
+
+TOKEN_URL = reverse("user:token_obtain_pair")
+MANAGE_URL = reverse("user:manage")
+REFERENCE_DATA_URL = reverse("service:reference-data-list")
+
+
+@override_settings(LOGIN_WORKERS=0)
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        user_cache.invalidate()
+        self.addCleanup(user_cache.invalidate)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com", "testpassword"
+        )
+        res = self.client.post(
+            TOKEN_URL, {"email": "test@test.com", "password": "testpassword"}
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {res.data['access']}")
+
+    @THROTTLE_IN_CACHE
+    def test_user_loaded_once(self):
+        with self.assertNumQueries(1):
+            first = self.client.get(MANAGE_URL)
+        with self.assertNumQueries(0):
+            second = self.client.get(MANAGE_URL)
+
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(second.data["email"], "test@test.com")
+
+    def test_cached_user_invalidated_on_save(self):
+        self.client.get(MANAGE_URL)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        res = self.client.get(MANAGE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_user_update_keeps_other_fields(self):
+        self.client.get(MANAGE_URL)
+        res = self.client.patch(MANAGE_URL, {"email": "new@test.com"})
+        self.user.refresh_from_db()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.user.email, "new@test.com")
+        self.assertTrue(self.user.check_password("testpassword"))
+
+    def test_stateless_endpoint_skips_user_lookup(self):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(REFERENCE_DATA_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(
+            any(get_user_model()._meta.db_table in q["sql"] for q in queries)
+        )
+
+
+class AuthenticationSchemaTests(TestCase):
+    def test_protected_endpoints_documented_with_jwt(self):
+        schema = SchemaGenerator().get_schema(request=None, public=True)
+
+        operations = [
+            operation
+            for path in schema["paths"].values()
+            for operation in path.values()
+        ]
+        self.assertIn("jwtAuth", schema["components"]["securitySchemes"])
+        self.assertTrue(
+            any(
+                {"jwtAuth": []} in operation.get("security", [])
+                for operation in operations
+            )
+        )
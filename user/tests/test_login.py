@@ -0,0 +1,75 @@
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from user.login import LoginOverloaded, LoginPool
+
+TOKEN_URL = reverse("user:token_obtain_pair")
+REGISTER_URL = reverse("user:create")
+
+
+@override_settings(LOGIN_WORKERS=0)
+class LoginViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com", "testpassword"
+        )
+
+    def login(self, password):
+        return self.client.post(
+            TOKEN_URL, {"email": "test@test.com", "password": password}
+        )
+
+    def test_login_returns_tokens(self):
+        res = self.login("testpassword")
+        wrong = self.login("wrongpassword")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("access", res.json())
+        self.assertEqual(wrong.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_outdated_hash_upgraded_on_login(self):
+        hasher = PBKDF2PasswordHasher()
+        self.user.password = hasher.encode(
+            "testpassword", hasher.salt(), iterations=1000
+        )
+        self.user.save()
+
+        res = self.login("testpassword")
+        self.user.refresh_from_db()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(
+            self.user.password.startswith(f"pbkdf2_sha256${hasher.iterations}$")
+        )
+        self.assertTrue(self.user.check_password("testpassword"))
+
+    @override_settings(LOGIN_WORKERS=1)
+    def test_full_pool_sheds_load(self):
+        pool = LoginPool(workers=1, max_pending=1)
+        release = threading.Event()
+        blocked = pool.submit(release.wait)
+
+        with patch("user.views.get_login_pool", return_value=pool):
+            res = self.login("testpassword")
+            register = self.client.post(
+                REGISTER_URL, {"email": "new@test.com", "password": "newpassword"}
+            )
+        with self.assertRaises(LoginOverloaded):
+            pool.submit(release.wait)
+        release.set()
+        blocked.result()
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res["Retry-After"], "1")
+        self.assertEqual(register.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertNotEqual(
+            pool.submit(threading.get_ident).result(), threading.get_ident()
+        )
@@ -0,0 +1,164 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from user.provisioning import hash_passwords, import_users
+
+IMPORT_URL = reverse("user:import")
+
+
+class ImportUsersCommandTests(TestCase):
+    def setUp(self):
+        get_user_model().objects.create_user("taken@test.com", "testpassword")
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "users.csv")
+
+    def call(self, content, **options):
+        with open(self.path, "w") as users_file:
+            users_file.write(content)
+        out, err = StringIO(), StringIO()
+        call_command("import_users", self.path, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_csv(self):
+        out, err = self.call(
+            "email,password,first_name,is_staff\n"
+            "anna@test.com,annapassword,Anna,\n"
+            "taken@test.com,,,\n"
+            "not-an-email,,,\n"
+            "bob@Test.com,,Bob,true\n"
+            "anna@test.com,,,\n",
+            batch_size=2,
+        )
+
+        anna = get_user_model().objects.get(email="anna@test.com")
+        bob = get_user_model().objects.get(email="bob@test.com")
+        self.assertTrue(anna.check_password("annapassword"))
+        self.assertEqual(anna.first_name, "Anna")
+        self.assertFalse(bob.has_usable_password())
+        self.assertTrue(bob.is_staff)
+        self.assertEqual(json.loads(err)["line"], 4)
+        self.assertIn("Batch 3: 2 created, 2 skipped, 1 invalid", out)
+
+    @override_settings(USER_IMPORT_WORKERS=2)
+    def test_passwords_hashed_in_process_pool(self):
+        rows = [
+            (line, {"email": f"user{line}@test.com", "password": f"password{line}"})
+            for line in range(3)
+        ]
+
+        report = import_users(rows)
+
+        self.assertEqual(report.created, 3)
+        user = get_user_model().objects.get(email="user2@test.com")
+        self.assertTrue(user.check_password("password2"))
+
+    @override_settings(USER_IMPORT_WORKERS=0)
+    def test_queries_per_batch_are_constant(self):
+        def queries(count, offset):
+            rows = [(line, {"email": f"user{line}@test.com"}) for line in range(count)]
+            with CaptureQueriesContext(connection) as captured:
+                import_users(rows[offset:])
+            return len(captured)
+
+        self.assertEqual(queries(2, 0), queries(50, 2))
+        self.assertEqual(get_user_model().objects.count(), 51)
+
+    @override_settings(USER_IMPORT_WORKERS=0)
+    def test_emails_created_during_batch_skipped(self):
+        rows = [(line, {"email": f"user{line}@test.com"}) for line in range(3)]
+
+        def hash_while_users_register(passwords):
+            get_user_model().objects.create_user("user0@test.com")
+            get_user_model().objects.create_user("user1@test.com")
+            return hash_passwords(passwords)
+
+        with patch(
+            "user.provisioning.hash_passwords", side_effect=hash_while_users_register
+        ):
+            report = import_users(rows)
+
+        self.assertEqual((report.created, report.skipped), (1, 2))
+        self.assertTrue(
+            get_user_model().objects.filter(email="user2@test.com").exists()
+        )
+
+
+@override_settings(USER_IMPORT_WORKERS=0, USER_IMPORT_THREADS=0)
+class ImportUsersApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = get_user_model().objects.create_superuser(
+            "admin@test.com", "testpassword"
+        )
+
+    def upload(self, content, name="users.jsonl"):
+        return self.client.post(
+            IMPORT_URL, {"file": SimpleUploadedFile(name, content)}, format="multipart"
+        )
+
+    def test_import_json_lines(self):
+        self.client.force_authenticate(self.admin)
+
+        res = self.upload(
+            b'{"email": "anna@test.com", "last_name": "Smith"}\n'
+            b'["not", "an", "object"]\n'
+            b'{"email": "admin@test.com"}\n'
+        )
+
+        progress = self.client.get(res["Location"])
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(progress.data, res.data)
+        self.assertEqual(res.data["status"], "done")
+        self.assertEqual(res.data["created"], 1)
+        self.assertEqual(res.data["skipped"], 1)
+        self.assertEqual(res.data["errors"][0]["line"], 2)
+        self.assertTrue(get_user_model().objects.filter(last_name="Smith").exists())
+
+    def test_undecodable_file_fails_import(self):
+        self.client.force_authenticate(self.admin)
+
+        with self.assertLogs("user.provisioning", level="ERROR"):
+            res = self.upload(b'{"email": "\xff@test.com"}\n')
+
+        self.assertEqual(res.data["status"], "failed")
+
+    @override_settings(USER_IMPORT_MAX_UPLOAD_SIZE=16)
+    def test_large_upload_rejected(self):
+        self.client.force_authenticate(self.admin)
+
+        res = self.upload(b'{"email": "anna@test.com"}\n')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(
+            get_user_model().objects.filter(email="anna@test.com").exists()
+        )
+
+    def test_unknown_format_rejected(self):
+        self.client.force_authenticate(self.admin)
+
+        res = self.upload(b"email\r\nanna@test.com\r\n", name="users.txt")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_requires_admin(self):
+        user = get_user_model().objects.create_user("test@test.com", "testpassword")
+        self.client.force_authenticate(user)
+
+        res = self.upload(b'{"email": "anna@test.com"}\n')
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
@@ -5,14 +5,22 @@ from rest_framework_simplejwt.views import (
     TokenVerifyView,
 )
 
-from user.views import CreateUserView, ManageUserView
+from user.views import (
+    CreateUserView,
+    ManageUserView,
+    ImportUsersView,
+    UserImportView,
+    pooled_view,
+)
 
 urlpatterns = [
-    path("register/", CreateUserView.as_view(), name="create"),
-    path("token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
+    path("register/", pooled_view(CreateUserView), name="create"),
+    path("token/", pooled_view(TokenObtainPairView), name="token_obtain_pair"),
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("token/verify/", TokenVerifyView.as_view(), name="token_verify"),
     path("me/", ManageUserView.as_view(), name="manage"),
+    path("import/", ImportUsersView.as_view(), name="import"),
+    path("import/<int:pk>/", UserImportView.as_view(), name="import-detail"),
 ]
 
 app_name = "user"
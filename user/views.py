@@ -1,9 +1,23 @@
-from rest_framework import generics
-from rest_framework.authtoken.views import ObtainAuthToken
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.settings import api_settings
+import asyncio
 
-from user.serializers import UserSerializer, AuthTokenSerializer
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from drf_spectacular.utils import extend_schema
+from rest_framework import generics, serializers, status
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+
+from user.login import LoginOverloaded, get_login_pool
+from user.models import UserImport
+from user.provisioning import FORMATS, detect_format, start_import
+from user.serializers import (
+    UserSerializer,
+    UserImportUploadSerializer,
+    UserImportStatusSerializer,
+)
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -11,14 +25,86 @@ class CreateUserView(generics.CreateAPIView):
     permission_classes = (AllowAny,)
 
 
-class CreateTokenView(ObtainAuthToken):
-    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
-    serializer_class = AuthTokenSerializer
-
-
 class ManageUserView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
     permission_classes = (IsAuthenticated,)
 
     def get_object(self):
         return self.request.user
+
+
+class ImportUsersView(generics.GenericAPIView):
+    serializer_class = UserImportUploadSerializer
+    permission_classes = (IsAdminUser,)
+    parser_classes = (MultiPartParser,)
+
+    @extend_schema(responses={202: UserImportStatusSerializer})
+    def post(self, request):
+        """
+        Endpoint for creating users from an uploaded CSV or JSON lines file
+        in the background, existing emails are skipped and invalid rows
+        reported by line. Its progress is at the Location of the response.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data["file"]
+        file_format = serializer.validated_data.get("format")
+        file_format = file_format or detect_format(upload.name)
+        if file_format not in FORMATS:
+            raise serializers.ValidationError(
+                {"format": f"Can't tell the format of {upload.name}."}
+            )
+
+        job = start_import(upload, file_format)
+        location = reverse("user:import-detail", args=[job.id], request=request)
+        return Response(
+            UserImportStatusSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={"Location": location},
+        )
+
+
+class UserImportView(generics.RetrieveAPIView):
+    """Progress and report of a user import"""
+
+    queryset = UserImport.objects.all()
+    serializer_class = UserImportStatusSerializer
+    permission_classes = (IsAdminUser,)
+
+
+def _render(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    response.render()
+    return response
+
+
+def pooled_view(view_class):
+    """
+    Async view running view_class, a DRF view that hashes passwords, in
+    the login pool, so neither the event loop nor a request thread waits
+    for the hasher. Responds 503 when LOGIN_MAX_PENDING jobs are pending.
+    With LOGIN_WORKERS = 0 the view runs in the request thread.
+    The whole view runs in the pool, not only the hasher: DRF views are
+    synchronous, and the rest of it would otherwise wait for the single
+    thread sync_to_async runs Django code in.
+    """
+    view = view_class.as_view()
+
+    async def pooled(request, *args, **kwargs):
+        if not settings.LOGIN_WORKERS:
+            return await sync_to_async(_render)(view, request, *args, **kwargs)
+        try:
+            future = get_login_pool().submit(_render, view, request, *args, **kwargs)
+        except LoginOverloaded:
+            response = JsonResponse(
+                {"detail": "Too many logins in progress, try again later."},
+                status=503,
+            )
+            response["Retry-After"] = "1"
+            return response
+        return await asyncio.wrap_future(future)
+
+    pooled.csrf_exempt = True
+    # Only for documentation purposes, the schema is the one of view_class
+    pooled.cls, pooled.initkwargs = view.cls, view.initkwargs
+    return pooled